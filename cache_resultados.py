@@ -0,0 +1,124 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+def huella_archivos(rutas):
+    """
+    Calcula una huella de los artefactos de índice a partir de la ruta, el tamaño y la fecha
+    de modificación de cada archivo (los directorios se recorren completos). Cambia cada vez
+    que se reconstruye o reemplaza el índice.
+
+    Parámetros:
+    - rutas: archivos o directorios de los artefactos cargados.
+
+    Retorna:
+    - Cadena hexadecimal.
+    """
+    archivos = []
+    for ruta in rutas:
+        if os.path.isdir(ruta):
+            for raiz, _, nombres in os.walk(ruta):
+                archivos.extend(os.path.join(raiz, nombre) for nombre in nombres)
+        elif os.path.exists(ruta):
+            archivos.append(ruta)
+    huella = hashlib.sha1()
+    for archivo in sorted(archivos):
+        estado = os.stat(archivo)
+        huella.update(f"{archivo}|{estado.st_size}|{estado.st_mtime_ns}\n".encode("utf-8"))
+    return huella.hexdigest()
+
+
+class CacheResultados:
+    """
+    Caché de resultados de búsqueda con desalojo LRU y vencimiento por tiempo (TTL).
+
+    La clave es (consulta preprocesada, métrica), así que distintas escrituras de una
+    consulta que se normalizan a los mismos términos comparten la entrada. Cada entrada
+    guarda el top-k más largo calculado: un pedido con un k menor se responde recortándolo
+    (método ``recortar(k)`` del resultado).
+
+    Todas las entradas pertenecen a una huella del índice; si la huella cambia (índice
+    reconstruido), la caché se vacía antes de responder.
+
+    Parámetros:
+    - capacidad: número máximo de entradas.
+    - ttl: segundos de vida de cada entrada (None = sin vencimiento).
+    """
+
+    def __init__(self, capacidad=10000, ttl=3600):
+        self.capacidad = capacidad
+        self.ttl = ttl
+        self.huella = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidaciones = 0
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _validar_huella(self, huella):
+        if huella != self.huella:
+            if self._entradas:
+                self.invalidaciones += 1
+            self._entradas.clear()
+            self.huella = huella
+
+    def obtener(self, query_preprocesada, metrica, k, huella):
+        """
+        Retorna el resultado guardado recortado a k, o None si no hay una entrada vigente
+        con al menos k documentos para esta huella de índice.
+        """
+        clave = (query_preprocesada, metrica)
+        with self._lock:
+            self._validar_huella(huella)
+            entrada = self._entradas.get(clave)
+            if entrada is not None and self.ttl is not None and time.monotonic() - entrada[0] > self.ttl:
+                del self._entradas[clave]
+                entrada = None
+            if entrada is None or entrada[1] < k:
+                self.misses += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.hits += 1
+            resultado = entrada[2]
+        return resultado if entrada[1] == k else resultado.recortar(k)
+
+    def guardar(self, query_preprocesada, metrica, k, resultado, huella):
+        """
+        Guarda el top-k de una consulta, salvo que ya haya uno vigente con un k mayor.
+        """
+        clave = (query_preprocesada, metrica)
+        with self._lock:
+            self._validar_huella(huella)
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada[1] > k:
+                return
+            self._entradas[clave] = (time.monotonic(), k, resultado)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.capacidad:
+                self._entradas.popitem(last=False)
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def estadisticas(self):
+        """
+        Retorna los contadores de la caché.
+
+        Retorna:
+        - dict con hits, misses, tasa_aciertos, invalidaciones, entradas y capacidad.
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "tasa_aciertos": self.hits / total if total else 0.0,
+            "invalidaciones": self.invalidaciones,
+            "entradas": len(self._entradas),
+            "capacidad": self.capacidad,
+        }
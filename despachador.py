@@ -0,0 +1,74 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+class ColaLlena(Exception):
+    """
+    Se lanza cuando ya hay max_pendientes consultas distintas en curso.
+    """
+
+class DespachadorConsultas:
+    """
+    Ejecuta las búsquedas (CPU) en un pool de hilos acotado desde código async.
+
+    - Las consultas idénticas que llegan mientras otra igual está en curso esperan el mismo
+      resultado en lugar de recalcularlo.
+    - Si ya hay ``max_pendientes`` consultas distintas en curso (en ejecución o esperando un
+      hilo), las nuevas se rechazan con ColaLlena para que el servidor responda 503 en lugar
+      de acumular latencia.
+
+    Parámetros:
+    - max_hilos: hilos del pool (por defecto os.cpu_count()).
+    - max_pendientes: consultas distintas en curso admitidas.
+    """
+
+    def __init__(self, max_hilos=None, max_pendientes=64):
+        self.max_hilos = max_hilos or os.cpu_count()
+        self.max_pendientes = max_pendientes
+        self.executor = ThreadPoolExecutor(max_workers=self.max_hilos, thread_name_prefix="sri")
+        self._en_curso = {}
+        self.ejecutadas = 0
+        self.coalescidas = 0
+        self.rechazadas = 0
+
+    async def ejecutar(self, clave, funcion, *args):
+        """
+        Ejecuta funcion(*args) en el pool, o espera la ejecución en curso con la misma clave.
+
+        Parámetros:
+        - clave: identifica consultas equivalentes (debe ser hashable).
+        - funcion: función a ejecutar en un hilo del pool.
+
+        Retorna:
+        - El resultado de funcion(*args); las consultas coalescidas reciben el mismo objeto.
+        """
+        futuro = self._en_curso.get(clave)
+        if futuro is not None:
+            self.coalescidas += 1
+        else:
+            if len(self._en_curso) >= self.max_pendientes:
+                self.rechazadas += 1
+                raise ColaLlena(f"Hay {len(self._en_curso)} consultas en curso (máximo {self.max_pendientes})")
+            futuro = asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(funcion, *args))
+            self._en_curso[clave] = futuro
+            futuro.add_done_callback(lambda _: self._en_curso.pop(clave, None))
+            self.ejecutadas += 1
+        # shield: si un cliente se desconecta, la ejecución sigue para los demás que esperan.
+        return await asyncio.shield(futuro)
+
+    def estadisticas(self):
+        """
+        Retorna los contadores del despachador.
+        """
+        return {
+            "en_curso": len(self._en_curso),
+            "max_pendientes": self.max_pendientes,
+            "max_hilos": self.max_hilos,
+            "ejecutadas": self.ejecutadas,
+            "coalescidas": self.coalescidas,
+            "rechazadas": self.rechazadas,
+        }
+
+    def cerrar(self):
+        self.executor.shutdown(wait=False)
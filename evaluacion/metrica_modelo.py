@@ -1,6 +1,9 @@
+import logging
 import pandas as pd
 import numpy as np
 
+logger = logging.getLogger(__name__)
+
 class Metrica_modelo ():
   """
     Clase para evaluar un modelo de recuperación de información usando métricas
@@ -103,12 +106,8 @@ class Metrica_modelo ():
     fp = docs_recuperados.size - tp
     fn = docs_relevantes.size - tp
 
-    print(query_id)
-    print(docs_relevantes)
-    print(docs_recuperados)
-    print(f"tp:{tp}")
-    print(f"fp:{fp}")
-    print(f"fn:{fn}")
+    logger.debug("%s relevantes=%s recuperados=%s tp=%d fp=%d fn=%d",
+                 query_id, docs_relevantes, docs_recuperados, tp, fp, fn)
 
     precision = tp/(tp + fp)
     recall = tp/(tp+fn)
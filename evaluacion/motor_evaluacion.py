@@ -0,0 +1,254 @@
+import os
+import pandas as pd
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+# Modelo cargado una sola vez en cada proceso de la evaluación paralela.
+_modelo_worker = None
+
+def _iniciar_worker(clase_modelo, model_name):
+  """
+   Carga el modelo en el proceso trabajador desde sus archivos guardados, con los
+   arreglos mapeados en memoria (mmap_mode="r") para compartir páginas entre procesos.
+  """
+  global _modelo_worker
+  _modelo_worker = clase_modelo(modelName=model_name, mmap_mode="r")
+
+def _recuperar_lote(queries, k):
+  """
+   Recupera los k documentos de un lote de consultas con el modelo del proceso.
+  """
+  indices, _ = _modelo_worker.obtener_docs_relevantes_batch(queries, k)
+  return indices
+
+class Motor_evaluacion ():
+  """
+    Evalúa un modelo de recuperación recuperando una sola vez cada consulta (al mayor corte)
+    y calculando todas las métricas a partir de ese único ranking.
+
+    A diferencia de Metrica_modelo, los juicios de relevancia se agrupan una sola vez por
+    consulta y las métricas se calculan de forma vectorizada sobre una matriz
+    (consultas x posiciones) de aciertos.
+
+    Parámetros
+    ----------
+    modelo : objeto
+        Objeto con el método 'obtener_docs_relevantes_batch(queries, k)' que devuelve las
+        posiciones en el corpus de los k documentos recuperados por consulta (Tfidf o Bm25).
+    corpus_df : pandas.DataFrame
+        DataFrame que contiene los documentos del corpus.
+    queries_df : pandas.DataFrame
+        DataFrame con las consultas a evaluar.
+    qrels_df : pandas.DataFrame
+        DataFrame con los juicios de relevancia. Si tiene la columna 'relevance' se usa
+        como ganancia para nDCG; si no, la ganancia es 1.
+    key_doc_id : str
+        Nombre de la columna que identifica a los documentos (por defecto "doc_id").
+    key_query : str
+        Nombre de la columna que contiene la versión procesada de las consultas.
+    key_query_id : str
+        Nombre de la columna que identifica a las consultas (por defecto "query_id").
+    cortes : tuple of int
+        Valores de k para los que se calculan las métricas.
+  """
+
+  def __init__(self, modelo, corpus_df, queries_df, qrels_df, key_doc_id="doc_id", key_query="text_preprocessed", key_query_id="query_id", cortes=(5, 10, 20, 50)):
+    """
+        Inicializa el motor y agrupa los juicios de relevancia por consulta.
+    """
+    self.modelo = modelo
+    self.corpus_df = corpus_df
+    self.queries_df = queries_df
+    self.qrels_df = qrels_df
+    self.key_doc_id = key_doc_id
+    self.key_query = key_query
+    self.key_query_id = key_query_id
+    self.cortes = tuple(sorted(cortes))
+    self.agrupar_relevantes()
+
+  def agrupar_relevantes(self):
+    """
+     Traduce los juicios de relevancia a pares (fila de consulta, posición en el corpus)
+     codificados como enteros, y calcula por consulta el número de relevantes y las
+     ganancias ideales ordenadas (para nDCG). Se hace una sola vez.
+    """
+    n_docs = len(self.corpus_df)
+    n_queries = len(self.queries_df)
+    posiciones_doc = pd.Index(self.corpus_df[self.key_doc_id].values)
+
+    qrels = self.qrels_df.drop_duplicates([self.key_query_id, self.key_doc_id])
+    ganancia = qrels['relevance'].values if 'relevance' in qrels.columns else np.ones(len(qrels))
+    qrels = pd.DataFrame({
+        self.key_query_id: qrels[self.key_query_id].values,
+        'posicion': posiciones_doc.get_indexer(qrels[self.key_doc_id].values),
+        'ganancia': ganancia.astype(np.float64),
+    })
+    filas_consulta = pd.DataFrame({self.key_query_id: self.queries_df[self.key_query_id].values, 'fila': np.arange(n_queries)})
+    qrels = filas_consulta.merge(qrels[qrels['ganancia'] > 0], on=self.key_query_id)
+
+    # Los relevantes que no están en el corpus cuentan para el recall pero no pueden recuperarse.
+    self.n_relevantes = np.bincount(qrels['fila'].values, minlength=n_queries)
+    en_corpus = qrels[qrels['posicion'] >= 0]
+    self.claves_relevantes = en_corpus['fila'].values.astype(np.int64) * n_docs + en_corpus['posicion'].values
+    self.ganancias = pd.Series(en_corpus['ganancia'].values, index=self.claves_relevantes)
+
+    k_max = self.cortes[-1]
+    ideales = qrels.sort_values(['fila', 'ganancia'], ascending=[True, False])
+    rango = ideales.groupby('fila').cumcount().values
+    ideales = ideales[rango < k_max]
+    self.ganancias_ideales = np.zeros((n_queries, k_max))
+    self.ganancias_ideales[ideales['fila'].values, rango[rango < k_max]] = ideales['ganancia'].values
+
+  def recuperar(self, k=None):
+    """
+    Recupera una sola vez los k documentos de todas las consultas.
+
+        Parámetros
+        ----------
+        k : int
+            Número de documentos a recuperar (por defecto el mayor corte).
+
+        Retorna
+        -------
+        np.ndarray
+            Matriz (n_consultas x k) de posiciones de documento en el corpus.
+    """
+    k = k or self.cortes[-1]
+    indices, _ = self.modelo.obtener_docs_relevantes_batch(list(self.queries_df[self.key_query].values), k)
+    return indices
+
+  def matriz_ganancias(self, indices, filas=None):
+    """
+     Construye la matriz (consultas x posiciones) con la ganancia de cada documento
+     recuperado (0 si no es relevante).
+
+        Parámetros
+        ----------
+        indices : np.ndarray
+            Matriz de posiciones recuperadas.
+        filas : np.ndarray, opcional
+            Fila (en queries_df) de cada fila de ``indices``; por defecto todas en orden.
+    """
+    if filas is None:
+      filas = np.arange(len(indices))
+    claves = np.asarray(filas, dtype=np.int64)[:, None] * len(self.corpus_df) + indices
+    return self.ganancias.reindex(claves.ravel(), fill_value=0.0).values.reshape(claves.shape)
+
+  def metricas_por_consulta(self, indices, filas=None):
+    """
+     Calcula precision@k, recall@k, AP@k, nDCG@k y RR@k de cada consulta para todos los
+     cortes a partir de un único ranking.
+
+     La AP sigue la definición de Metrica_modelo.obtener_MAP_query: la suma de la
+     precisión en cada acierto dividida por el número de aciertos.
+
+        Parámetros
+        ----------
+        indices : np.ndarray
+            Matriz (n_consultas x k) de posiciones recuperadas, con k >= mayor corte.
+        filas : np.ndarray, opcional
+            Fila (en queries_df) de cada fila de ``indices``; por defecto todas en orden.
+
+        Retorna
+        -------
+        pandas.DataFrame
+            Una fila por consulta y columnas con MultiIndex (métrica, k).
+    """
+    if filas is None:
+      filas = np.arange(len(indices))
+    ganancias = self.matriz_ganancias(indices, filas)
+    aciertos = ganancias > 0
+    posiciones = np.arange(1, aciertos.shape[1] + 1)
+    aciertos_acumulados = np.cumsum(aciertos, axis=1)
+    precision_en_acierto = np.cumsum(np.where(aciertos, aciertos_acumulados / posiciones, 0), axis=1)
+    dcg = np.cumsum(ganancias / np.log2(posiciones + 1), axis=1)
+    idcg = np.cumsum(self.ganancias_ideales[filas] / np.log2(np.arange(2, self.cortes[-1] + 2)), axis=1)
+    primer_acierto = np.where(aciertos.any(axis=1), aciertos.argmax(axis=1) + 1, 0)
+    n_relevantes = self.n_relevantes[filas]
+
+    columnas = {}
+    for k in self.cortes:
+      k_efectivo = min(k, aciertos.shape[1])
+      tp = aciertos_acumulados[:, k_efectivo - 1]
+      columnas[('precision', k)] = tp / k_efectivo
+      columnas[('recall', k)] = np.divide(tp, n_relevantes, out=np.zeros(len(tp)), where=n_relevantes > 0)
+      columnas[('ap', k)] = np.divide(precision_en_acierto[:, k_efectivo - 1], tp, out=np.zeros(len(tp)), where=tp > 0)
+      ideal = idcg[:, k - 1]
+      columnas[('ndcg', k)] = np.divide(dcg[:, k_efectivo - 1], ideal, out=np.zeros(len(tp)), where=ideal > 0)
+      columnas[('rr', k)] = np.divide(1.0, primer_acierto, out=np.zeros(len(tp)), where=(primer_acierto > 0) & (primer_acierto <= k))
+
+    resultado = pd.DataFrame(columnas, index=self.queries_df[self.key_query_id].values[filas])
+    resultado.columns.names = ['metrica', 'k']
+    return resultado
+
+  def evaluar(self):
+    """
+     Recupera todas las consultas una vez y calcula el promedio de cada métrica por corte.
+
+        Retorna
+        -------
+        pandas.DataFrame
+            Filas = cortes k; columnas = precision, recall, map, ndcg, mrr.
+    """
+    return self.agregar(self.metricas_por_consulta(self.recuperar()))
+
+  def evaluar_paralelo(self, n_procesos=None, tam_lote=64, origen=None):
+    """
+     Igual que evaluar(), pero reparte las consultas en lotes entre varios procesos.
+
+     Cada proceso carga el modelo una sola vez desde los archivos guardados por Tfidf o
+     Bm25 (con mmap), por lo que no se serializa el modelo en cada tarea. Los rankings se
+     reúnen en el orden original de las consultas y las métricas se calculan igual que en
+     la ejecución serial, así que el resultado es el mismo si esos archivos son los del
+     modelo evaluado. Los modelos armados en memoria (desde_matriz, desde_indice,
+     fragmentos, comprimidos) no tienen archivos propios: hay que indicar origen.
+
+        Parámetros
+        ----------
+        n_procesos : int, opcional
+            Número de procesos (por defecto os.cpu_count()).
+        tam_lote : int
+            Número de consultas por tarea.
+        origen : str, opcional
+            modelName (archivos joblib o directorio columnar) desde el que cargan el modelo
+            los procesos; por defecto, el del modelo si sus archivos le corresponden.
+
+        Retorna
+        -------
+        pandas.DataFrame
+            La misma tabla que evaluar().
+    """
+    if origen is None:
+      if not getattr(self.modelo, "en_disco", False):
+        raise ValueError("El modelo no tiene archivos propios en disco (se armó en memoria); "
+                         "indique origen o use evaluar()")
+      origen = self.modelo.modelName
+    queries = list(self.queries_df[self.key_query].values)
+    lotes = [queries[i:i + tam_lote] for i in range(0, len(queries), tam_lote)]
+    k = self.cortes[-1]
+
+    with ProcessPoolExecutor(max_workers=n_procesos or os.cpu_count(), initializer=_iniciar_worker,
+                             initargs=(type(self.modelo), origen)) as executor:
+      indices = list(executor.map(_recuperar_lote, lotes, [k] * len(lotes)))
+
+    return self.agregar(self.metricas_por_consulta(np.vstack(indices)))
+
+  @staticmethod
+  def agregar(por_consulta):
+    """
+     Promedia las métricas por consulta en una tabla (cortes x métricas).
+    """
+    promedios = por_consulta.mean().unstack('metrica')
+    return promedios.rename(columns={'ap': 'map', 'rr': 'mrr'})[['precision', 'recall', 'map', 'ndcg', 'mrr']]
+
+  @staticmethod
+  def resumen(tabla, k=50):
+    """
+     Extrae del resultado de evaluar() el formato que guarda Sri_app.calcular_metrica
+     (recall, precision y map para un corte k).
+
+        Retorna
+        -------
+        pandas.Series
+    """
+    return tabla.loc[k, ['recall', 'precision', 'map']].rename(None)
@@ -1,12 +1,15 @@
+import os
 import joblib
-from rank_bm25 import BM25Okapi
-import numpy as np
+from .indice_bm25 import IndiceBm25
+from ..indice_columnar import cargar_arreglos, escribir_manifiesto, guardar_arreglos, leer_manifiesto
+from ..poda import TAM_BLOQUE, completar_top_k, top_k_filas
 
 class Bm25:
     """
-    Clase para implementar un modelo BM25 usando la librería rank_bm25.
+    Clase para implementar un modelo BM25 (variante Okapi) sobre un índice invertido en NumPy.
 
     Este modelo puede entrenarse con un corpus nuevo o cargar un modelo previamente guardado con joblib.
+    Los modelos antiguos guardados como ``rank_bm25.BM25Okapi`` se convierten al índice invertido al cargarse.
 
     Parámetros
     ----------
@@ -14,27 +17,100 @@ class Bm25:
         Corpus de documentos. Cada documento puede ser una cadena (que se tokenizará por espacios)
         o una lista de tokens. Si se proporciona, se entrena un nuevo modelo BM25.
     modelName : str, opcional
-        Nombre base del archivo para guardar o cargar el modelo BM25 con joblib.
+        Nombre base del archivo para guardar o cargar el modelo BM25 con joblib, o el
+        directorio de un índice columnar (ver guardar_columnar).
+    k1, b, epsilon : float, opcional
+        Parámetros de BM25Okapi, usados solo al entrenar un modelo nuevo.
+    mmap_mode : str, opcional
+        Modo de ``joblib.load`` para cargar los arreglos del índice como memoria mapeada
+        (por ejemplo "r"), compartida entre procesos que cargan el mismo archivo. Los
+        índices columnares se mapean siempre ("r" si no se indica otro modo).
     """
 
-    def __init__(self, corpus=None, modelName="modelo_bm25"):
+    def __init__(self, corpus=None, modelName="modelo_bm25", k1=1.5, b=0.75, epsilon=0.25, mmap_mode=None):
         """
         Inicializa el modelo BM25. Si se proporciona un corpus, entrena y guarda el modelo;
         de lo contrario, carga el modelo desde el archivo especificado.
         """
+        self.modelName = modelName
+        # Los archivos de modelName corresponden a este modelo (ver Motor_evaluacion.evaluar_paralelo).
+        self.en_disco = True
         if corpus is not None and len(corpus) > 0:
 
             if type(corpus[0]) == str:
                 corpus = [doc.split() for doc in corpus]
 
-            self.bm25 = BM25Okapi(corpus)
-            joblib.dump(self.bm25, modelName + ".joblib")
+            self.indice = IndiceBm25.construir(corpus, k1=k1, b=b, epsilon=epsilon)
+            # Se guardan también los valores precalculados para no recalcularlos en cada carga.
+            self.indice.valores()
+            joblib.dump(self.indice, modelName + ".joblib")
+        elif os.path.isdir(modelName):
+            self.cargar_columnar(modelName, mmap_mode or "r")
         else:
-            self.bm25 = joblib.load(modelName + ".joblib")
+            self.indice = joblib.load(modelName + ".joblib", mmap_mode=mmap_mode)
+            if not isinstance(self.indice, IndiceBm25):
+                self.indice = IndiceBm25.desde_bm25okapi(self.indice)
+
+    @classmethod
+    def desde_indice(cls, indice, modelName="modelo_bm25"):
+        """
+        Crea el modelo sobre un IndiceBm25 ya construido, sin entrenar ni guardar nada
+        (por ejemplo, el que exporta un IndiceIncremental).
+        """
+        modelo = cls.__new__(cls)
+        modelo.modelName = modelName
+        modelo.en_disco = False
+        modelo.indice = indice
+        return modelo
+
+    def comprimir(self, tam_bloque=TAM_BLOQUE):
+        """
+        Modelo con las listas de posteo comprimidas por bloques (ver IndiceBm25.comprimir);
+        los puntajes no cambian. guardar_columnar lo guarda comprimido.
+        """
+        return Bm25.desde_indice(self.indice.comprimir(tam_bloque), self.modelName)
+
+    def guardar_columnar(self, directorio):
+        """
+        Guarda el índice invertido en un directorio de índice columnar (un .npy por arreglo
+        y un manifiesto con k1, b, epsilon y la longitud media de documento). Si el índice
+        está comprimido, el manifiesto incluye los parámetros de la compresión.
+
+        Parámetros
+        ----------
+        directorio : str
+            Directorio del modelo (se crea si no existe).
+
+        Retorna
+        -------
+        dict
+            Manifiesto escrito.
+        """
+        manifiesto = {
+            "modelo": "bm25",
+            "n_docs": self.indice.n_docs,
+            "parametros": {"k1": self.indice.k1, "b": self.indice.b, "epsilon": self.indice.epsilon,
+                           "avgdl": float(self.indice.avgdl)},
+            "arreglos": guardar_arreglos(directorio, self.indice.arreglos()),
+        }
+        if self.indice.comprimidas is not None:
+            manifiesto["compresion"] = self.indice.comprimidas.parametros()
+        escribir_manifiesto(directorio, manifiesto)
+        return manifiesto
+
+    def cargar_columnar(self, directorio, mmap_mode="r"):
+        """
+        Carga el índice invertido desde un directorio de índice columnar, con los arreglos
+        mapeados en memoria.
+        """
+        manifiesto = leer_manifiesto(directorio)
+        arreglos = cargar_arreglos(directorio, manifiesto["arreglos"], mmap_mode)
+        self.indice = IndiceBm25.desde_arreglos(arreglos, manifiesto.get("compresion"), **manifiesto["parametros"])
 
     def obtener_scores (self, query_preprocesada):
         """
         Calcula los puntajes BM25 de todos los documentos del corpus respecto a una consulta dada.
+        Solo se recorren las listas de posteo de los términos de la consulta.
 
         Parámetros
         ----------
@@ -48,7 +124,89 @@ class Bm25:
         """
         if type(query_preprocesada) == str:
             query_preprocesada = query_preprocesada.split()
-        return self.bm25.get_scores(query_preprocesada)
+        return self.indice.puntuar(query_preprocesada)
+
+    def obtener_top_k(self, query_preprocesada, k=10, modo="bmw"):
+        """
+        Recupera las posiciones y puntajes de los k documentos más relevantes sin puntuar
+        todo el corpus (poda dinámica con cotas superiores por bloque).
+
+        Parámetros
+        ----------
+        query_preprocesada : str or list of str
+            Consulta ya preprocesada (tokenizada como lista o cadena de palabras).
+        k : int, opcional
+            Número de documentos a recuperar (default 10).
+        modo : str, opcional
+            "bmw" (Block-Max WAND, default), "wand", "disperso" o "denso".
+
+        Retorna
+        -------
+        tuple of numpy.ndarray
+            Posiciones de los documentos en el corpus y sus puntajes BM25, de mayor a menor.
+            Si menos de k documentos contienen algún término de la consulta, se completa
+            con documentos de puntaje 0.
+        """
+        if type(query_preprocesada) == str:
+            query_preprocesada = query_preprocesada.split()
+        indices, scores = self.indice.top_k(query_preprocesada, k, modo)
+        return completar_top_k(indices, scores, k, self.indice.n_docs)
+
+    def obtener_scores_docs(self, query_preprocesada, candidatos):
+        """
+        Calcula los puntajes BM25 solo de los documentos indicados.
+
+        Parámetros
+        ----------
+        query_preprocesada : str or list of str
+            Consulta ya preprocesada (tokenizada como lista o cadena de palabras).
+        candidatos : numpy.ndarray
+            Posiciones de los documentos a puntuar.
+
+        Retorna
+        -------
+        numpy.ndarray
+            Puntaje BM25 de cada candidato, en el mismo orden.
+        """
+        if type(query_preprocesada) == str:
+            query_preprocesada = query_preprocesada.split()
+        return self.indice.puntuar_docs(query_preprocesada, candidatos)
+
+    def obtener_scores_batch(self, queries_preprocesadas):
+        """
+        Calcula los puntajes BM25 de varias consultas a la vez.
+
+        Parámetros
+        ----------
+        queries_preprocesadas : list of str or list of list of str
+            Consultas ya preprocesadas.
+
+        Retorna
+        -------
+        scipy.sparse.csr_matrix
+            Matriz (n_consultas x n_docs) de puntajes BM25.
+        """
+        consultas = [query.split() if type(query) == str else query for query in queries_preprocesadas]
+        return self.indice.puntuar_batch(consultas)
+
+    def obtener_docs_relevantes_batch(self, queries_preprocesadas, k=10):
+        """
+        Recupera los k documentos más relevantes de varias consultas a la vez.
+
+        Parámetros
+        ----------
+        queries_preprocesadas : list of str or list of list of str
+            Consultas ya preprocesadas.
+        k : int, opcional
+            Número de documentos a recuperar por consulta (default 10).
+
+        Retorna
+        -------
+        tuple of numpy.ndarray
+            Posiciones de documento y puntajes BM25, ambos de forma (n_consultas x k),
+            ordenados de mayor a menor en cada fila.
+        """
+        return top_k_filas(self.obtener_scores_batch(queries_preprocesadas), k, self.indice.n_docs)
 
     def obtener_docs_relevantes(self, query_preprocesada, corpus_df, k=10):
         """
@@ -68,7 +226,6 @@ class Bm25:
         pandas.DataFrame
             Subconjunto del corpus_df con los k documentos más relevantes ordenados por score.
         """
-        scores = self.obtener_scores(query_preprocesada)
-        sorted_indices = np.argsort(-(scores))
+        indices, _ = self.obtener_top_k(query_preprocesada, k)
 
-        return corpus_df.iloc[sorted_indices[:k]]
\ No newline at end of file
+        return corpus_df.iloc[indices]
@@ -0,0 +1,386 @@
+import numpy as np
+from scipy import sparse
+from ..indice_columnar import VocabularioOrdenado
+from ..poda import MaximosPorBloque, TAM_BLOQUE, puntuar_docs, top_k_con_poda, top_k_denso, top_k_disperso
+from .. import posteos_comprimidos
+from ..posteos_comprimidos import ListasComprimidas
+
+class IndiceBm25:
+    """
+    Índice invertido para BM25 (variante Okapi de rank_bm25) almacenado en arreglos NumPy.
+
+    Las listas de posteo se guardan en formato CSR: para el término con id ``t``, los
+    documentos que lo contienen son ``docs[indptr[t]:indptr[t+1]]`` y sus frecuencias
+    ``tfs[indptr[t]:indptr[t+1]]``. El IDF de cada término se precalcula al construir el
+    índice y la normalización por longitud se calcula solo para los documentos de las
+    listas recorridas, de modo que una consulta solo recorre las listas de sus propios
+    términos.
+
+    Parámetros
+    ----------
+    vocabulario : dict or VocabularioOrdenado
+        Mapeo término -> id de término (posición en ``indptr``).
+    indptr : numpy.ndarray
+        Punteros de inicio de cada lista de posteo (tamaño n_terminos + 1).
+    docs : numpy.ndarray
+        Ids (posiciones) de documento de todas las listas concatenadas.
+    tfs : numpy.ndarray
+        Frecuencia del término en el documento, alineada con ``docs``.
+    doc_len : numpy.ndarray
+        Número de tokens de cada documento.
+    k1, b, epsilon : float
+        Parámetros de BM25Okapi (mismos valores por defecto que rank_bm25).
+    idf : numpy.ndarray, opcional
+        IDF ya calculado de cada término (por ejemplo, cargado de un índice columnar).
+    avgdl : float, opcional
+        Longitud media de documento; por defecto la de ``doc_len``. Un fragmento del
+        índice usa la del corpus completo (ver fragmento).
+    comprimidas : ListasComprimidas, opcional
+        Listas de posteo comprimidas (ver comprimir). En ese caso ``docs`` y ``tfs`` son
+        None y las consultas decodifican solo los bloques que necesitan; las operaciones
+        que recorren todo el índice (lotes, fragmentos, índice incremental) lo decodifican
+        completo la primera vez (ver descomprimir).
+    """
+
+    # Valor por defecto para los índices guardados con joblib antes de existir la compresión.
+    comprimidas = None
+
+    def __init__(self, vocabulario, indptr, docs, tfs, doc_len, k1=1.5, b=0.75, epsilon=0.25, idf=None, avgdl=None,
+                 comprimidas=None):
+        self.vocabulario = vocabulario
+        self.indptr = indptr
+        self.docs = docs
+        self.tfs = tfs
+        self.comprimidas = comprimidas
+        self.doc_len = doc_len
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.n_docs = len(doc_len)
+        self.avgdl = doc_len.sum() / self.n_docs if avgdl is None else avgdl
+        self.idf = self._calcular_idf(np.diff(indptr)) if idf is None else idf
+
+    def normas(self, docs):
+        """
+        Normalización por longitud ``k1 * (1 - b + b * doc_len / avgdl)`` de los documentos
+        indicados. Se calcula al vuelo desde ``doc_len`` (mapeado en memoria en un índice
+        columnar), así que cargar el índice no reserva un arreglo por documento.
+        """
+        return self.k1 * (1 - self.b + self.b * self.doc_len[docs] / self.avgdl)
+
+    def _calcular_idf(self, df):
+        """
+        Calcula el IDF de cada término con el mismo piso epsilon * idf_promedio que
+        usa BM25Okapi para los términos presentes en más de la mitad de los documentos.
+        """
+        idf = np.log(self.n_docs - df + 0.5) - np.log(df + 0.5)
+        if len(idf) > 0:
+            idf[idf < 0] = self.epsilon * idf.mean()
+        return idf
+
+    @classmethod
+    def construir(cls, corpus, **parametros):
+        """
+        Construye el índice a partir de un corpus tokenizado.
+
+        Parámetros
+        ----------
+        corpus : list of list of str
+            Documentos como listas de tokens.
+
+        Retorna
+        -------
+        IndiceBm25
+        """
+        doc_len = np.fromiter((len(doc) for doc in corpus), dtype=np.int64, count=len(corpus))
+        tokens = np.array([token for doc in corpus for token in doc], dtype=str)
+        terminos, term_ids = np.unique(tokens, return_inverse=True)
+        doc_ids = np.repeat(np.arange(len(corpus), dtype=np.int64), doc_len)
+
+        # Cada par (término, documento) se codifica en un entero para contar frecuencias
+        # y dejar las listas ordenadas por término y luego por documento.
+        claves, tfs = np.unique(term_ids.astype(np.int64) * len(corpus) + doc_ids, return_counts=True)
+        posteo_terminos = claves // len(corpus)
+
+        indptr = np.zeros(len(terminos) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(posteo_terminos, minlength=len(terminos)), out=indptr[1:])
+        vocabulario = {termino: i for i, termino in enumerate(terminos.tolist())}
+
+        return cls(vocabulario, indptr, (claves % len(corpus)).astype(np.int32),
+                   tfs.astype(np.int32), doc_len, **parametros)
+
+    @classmethod
+    def desde_bm25okapi(cls, bm25):
+        """
+        Convierte un objeto ``rank_bm25.BM25Okapi`` ya entrenado (modelos guardados
+        con versiones anteriores) a un índice invertido equivalente.
+        """
+        terminos = sorted(bm25.idf)
+        vocabulario = {termino: i for i, termino in enumerate(terminos)}
+        posteos = [[] for _ in terminos]
+        for doc_id, frecuencias in enumerate(bm25.doc_freqs):
+            for termino, tf in frecuencias.items():
+                posteos[vocabulario[termino]].append((doc_id, tf))
+
+        indptr = np.zeros(len(terminos) + 1, dtype=np.int64)
+        np.cumsum([len(lista) for lista in posteos], out=indptr[1:])
+        pares = np.array([par for lista in posteos for par in lista], dtype=np.int64).reshape(-1, 2)
+
+        return cls(vocabulario, indptr, pares[:, 0].astype(np.int32), pares[:, 1].astype(np.int32),
+                   np.asarray(bm25.doc_len, dtype=np.int64), k1=bm25.k1, b=bm25.b, epsilon=bm25.epsilon)
+
+    def comprimir(self, tam_bloque=TAM_BLOQUE):
+        """
+        Índice equivalente con las listas de posteo comprimidas por bloques (documentos por
+        diferencias y frecuencias empaquetadas en bits, ver posteos_comprimidos). La
+        compresión no pierde información: los puntajes son exactamente los mismos.
+
+        Retorna
+        -------
+        IndiceBm25
+        """
+        docs, tfs = self.listas()
+        comprimidas = ListasComprimidas.desde_frecuencias(self.indptr, docs, tfs, self.valores(), self.n_docs, tam_bloque)
+        return IndiceBm25(self.vocabulario, self.indptr, None, None, self.doc_len, k1=self.k1, b=self.b,
+                          epsilon=self.epsilon, idf=self.idf, avgdl=self.avgdl, comprimidas=comprimidas)
+
+    def listas(self):
+        """
+        Documentos y frecuencias de todas las listas de posteo (CSR), decodificadas si el
+        índice está comprimido.
+        """
+        self.descomprimir()
+        return self.docs, self.tfs
+
+    def descomprimir(self):
+        """
+        Decodifica completas las listas comprimidas en ``docs`` y ``tfs`` (una sola vez).
+        Las listas comprimidas se conservan para las consultas.
+        """
+        if self.docs is None and self.comprimidas is not None:
+            _, docs, tfs = self.comprimidas.decodificar_todo()
+            self.tfs = tfs.astype(np.int32)
+            self.docs = docs.astype(np.int32)
+
+    def arreglos(self):
+        """
+        Arreglos que definen el índice, para guardarlo en formato columnar. Incluye los
+        ``valores()`` precalculados para no recalcularlos al cargar o, si el índice está
+        comprimido, las listas comprimidas en lugar de docs, tfs y valores.
+        """
+        vocabulario = self.vocabulario
+        if not isinstance(vocabulario, VocabularioOrdenado):
+            vocabulario = VocabularioOrdenado.desde_dict(vocabulario)
+        if self.comprimidas is not None:
+            return {"vocabulario": vocabulario.terminos, "indptr": self.indptr, "doc_len": self.doc_len, "idf": self.idf,
+                    **self.comprimidas.arreglos()}
+        return {
+            "vocabulario": vocabulario.terminos,
+            "indptr": self.indptr,
+            "docs": self.docs,
+            "tfs": self.tfs,
+            "doc_len": self.doc_len,
+            "idf": self.idf,
+            "valores": self.valores(),
+        }
+
+    @classmethod
+    def desde_arreglos(cls, arreglos, compresion=None, **parametros):
+        """
+        Reconstruye el índice a partir de los arreglos de ``arreglos()`` (posiblemente
+        mapeados en memoria) sin recalcular IDF ni valores. ``compresion`` son los
+        parámetros de las listas comprimidas (ListasComprimidas.parametros), si lo están.
+        """
+        if compresion is not None:
+            comprimidas = ListasComprimidas.desde_arreglos(arreglos, **compresion)
+            return cls(VocabularioOrdenado(arreglos["vocabulario"]), arreglos["indptr"], None, None, arreglos["doc_len"],
+                       idf=arreglos["idf"], comprimidas=comprimidas, **parametros)
+        indice = cls(VocabularioOrdenado(arreglos["vocabulario"]), arreglos["indptr"], arreglos["docs"],
+                     arreglos["tfs"], arreglos["doc_len"], idf=arreglos["idf"], **parametros)
+        indice._valores = arreglos["valores"]
+        return indice
+
+    def fragmento(self, inicio, fin):
+        """
+        Índice con solo los documentos de las posiciones [inicio, fin), renumerados desde 0.
+        Conserva el vocabulario, el IDF y la longitud media del índice completo, así que los
+        puntajes de esos documentos son exactamente los mismos.
+
+        Retorna
+        -------
+        IndiceBm25
+        """
+        self.descomprimir()
+        terminos = np.repeat(np.arange(len(self.indptr) - 1), np.diff(self.indptr))
+        dentro = (self.docs >= inicio) & (self.docs < fin)
+        indptr = np.zeros(len(self.indptr), dtype=np.int64)
+        np.cumsum(np.bincount(terminos[dentro], minlength=len(self.indptr) - 1), out=indptr[1:])
+        return IndiceBm25(self.vocabulario, indptr, (self.docs[dentro] - inicio).astype(np.int32), self.tfs[dentro],
+                          np.asarray(self.doc_len[inicio:fin]), k1=self.k1, b=self.b, epsilon=self.epsilon,
+                          idf=self.idf, avgdl=self.avgdl)
+
+    def ids_terminos(self, tokens):
+        """
+        Traduce los tokens de una consulta a ids de término, descartando los que no
+        están en el vocabulario.
+
+        Retorna
+        -------
+        tuple of numpy.ndarray
+            Ids de término únicos y número de veces que aparece cada uno en la consulta.
+        """
+        ids = [self.vocabulario[token] for token in tokens if token in self.vocabulario]
+        return np.unique(np.asarray(ids, dtype=np.int64), return_counts=True)
+
+    def contribuciones(self, termino_id):
+        """
+        Calcula el aporte BM25 de un término a cada documento de su lista de posteo.
+
+        Retorna
+        -------
+        tuple of numpy.ndarray
+            Documentos de la lista y su aporte ``idf * tf * (k1 + 1) / (tf + norma)``.
+        """
+        if self.comprimidas is not None:
+            docs, tfs = self.comprimidas.decodificar(self.comprimidas.bloques_termino(termino_id))
+        else:
+            inicio, fin = self.indptr[termino_id], self.indptr[termino_id + 1]
+            docs = self.docs[inicio:fin]
+            tfs = self.tfs[inicio:fin]
+        return docs, self.idf[termino_id] * (tfs * (self.k1 + 1) / (tfs + self.normas(docs)))
+
+    def puntuar(self, tokens):
+        """
+        Calcula los puntajes BM25 de todos los documentos para una consulta tokenizada.
+        Solo se actualizan los documentos que contienen algún término de la consulta.
+
+        Retorna
+        -------
+        numpy.ndarray
+            Arreglo denso de puntajes (uno por documento).
+        """
+        scores = np.zeros(self.n_docs)
+        for termino_id, repeticiones in zip(*self.ids_terminos(tokens)):
+            docs, aporte = self.contribuciones(termino_id)
+            scores[docs] += repeticiones * aporte
+        return scores
+
+    def puntuar_docs(self, tokens, candidatos):
+        """
+        Calcula los puntajes BM25 de un conjunto pequeño de documentos para una consulta
+        tokenizada, sin arreglos del tamaño del corpus.
+
+        Retorna
+        -------
+        numpy.ndarray
+            Puntaje de cada documento de ``candidatos``, en el mismo orden.
+        """
+        terminos, repeticiones = self.ids_terminos(tokens)
+        if self.comprimidas is not None:
+            return posteos_comprimidos.puntuar_docs(self.comprimidas, terminos, self.idf[terminos] * repeticiones,
+                                                    self.valorar, candidatos)
+        return puntuar_docs(self.indptr, self.docs, self.valores(), terminos,
+                            self.idf[terminos] * repeticiones, np.asarray(candidatos, dtype=np.int64))
+
+    def puntuar_batch(self, consultas):
+        """
+        Calcula los puntajes BM25 de varias consultas tokenizadas a la vez como un producto
+        de matrices dispersas: (consultas x términos) por (términos x documentos).
+
+        Retorna
+        -------
+        scipy.sparse.csr_matrix
+            Matriz (n_consultas x n_docs) con puntaje solo para los documentos que
+            contienen algún término de cada consulta.
+        """
+        filas, columnas, pesos = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)], [np.empty(0)]
+        for fila, tokens in enumerate(consultas):
+            terminos, repeticiones = self.ids_terminos(tokens)
+            filas.append(np.full(len(terminos), fila))
+            columnas.append(terminos)
+            pesos.append(self.idf[terminos] * repeticiones)
+        matriz_consultas = sparse.csr_matrix((np.concatenate(pesos), (np.concatenate(filas), np.concatenate(columnas))),
+                                             shape=(len(consultas), len(self.indptr) - 1))
+        return (matriz_consultas @ self.matriz_valores()).tocsr()
+
+    def matriz_valores(self):
+        """
+        Vista (términos x documentos) de las listas de posteo como matriz CSR, con
+        ``valores()`` como datos. Se crea la primera vez que se pide.
+        """
+        if getattr(self, "_matriz_valores", None) is None:
+            valores = self.valores()
+            self._matriz_valores = sparse.csr_matrix((valores, self.docs, self.indptr),
+                                                     shape=(len(self.indptr) - 1, self.n_docs))
+        return self._matriz_valores
+
+    def valores(self):
+        """
+        Parte del aporte BM25 que no depende de la consulta, ``tf * (k1 + 1) / (tf + norma)``,
+        para cada entrada de las listas de posteo. Se calcula una sola vez y se reutiliza.
+        """
+        if getattr(self, "_valores", None) is None:
+            self._valores = self.valorar(*self.listas())
+        return self._valores
+
+    def valorar(self, docs, tfs):
+        """
+        ``tf * (k1 + 1) / (tf + norma)`` de entradas sueltas de las listas de posteo (ver valores).
+        """
+        return tfs * (self.k1 + 1) / (tfs + self.normas(docs))
+
+    def maximos(self, tam_bloque=TAM_BLOQUE):
+        """
+        Cotas superiores por bloque (o por término si ``tam_bloque`` es None) de
+        ``valores()``, calculadas la primera vez que se piden.
+        """
+        if getattr(self, "_maximos", None) is None:
+            self._maximos = {}
+        if tam_bloque not in self._maximos:
+            valores = self.valores()
+            self._maximos[tam_bloque] = MaximosPorBloque(self.indptr, self.docs, valores, tam_bloque)
+        return self._maximos[tam_bloque]
+
+    def top_k(self, tokens, k=10, modo="bmw"):
+        """
+        Recupera los k documentos de mayor puntaje BM25.
+
+        Parámetros
+        ----------
+        tokens : list of str
+            Consulta tokenizada.
+        k : int
+            Número de documentos a recuperar.
+        modo : str
+            "bmw" (Block-Max WAND), "wand" (cotas por término), "disperso" (acumula solo
+            los documentos de las listas de la consulta, sin poda) o "denso" (puntúa todo
+            el corpus y selecciona con ``np.argpartition``). Con listas comprimidas, "bmw"
+            y "wand" usan las cotas de los bloques comprimidos. Si algún término de la
+            consulta tiene idf negativo, todos los modos puntúan como "denso".
+
+        Retorna
+        -------
+        tuple of numpy.ndarray
+            Posiciones de documento y sus puntajes, ordenados de mayor a menor.
+        """
+        if modo == "denso":
+            scores = self.puntuar(tokens)
+            indices = top_k_denso(scores, k)
+            return indices, scores[indices]
+        if modo not in ("bmw", "wand", "disperso"):
+            raise ValueError(f"Modo top-k no soportado: {modo}")
+
+        terminos, repeticiones = self.ids_terminos(tokens)
+        if self.comprimidas is not None:
+            return posteos_comprimidos.top_k(self.comprimidas, terminos, self.idf[terminos] * repeticiones,
+                                             self.valorar, k, poda=modo != "disperso")
+        if (self.idf[terminos] < 0).any():
+            # Con idf negativos (piso epsilon de BM25Okapi con idf medio negativo) las cotas
+            # por bloque y el relleno con puntaje 0 dejan de valer: se puntúa todo el corpus.
+            return self.top_k(tokens, k, "denso")
+        if modo == "disperso":
+            return top_k_disperso(self.indptr, self.docs, self.valores(), terminos,
+                                  self.idf[terminos] * repeticiones, k)
+        maximos = self.maximos(TAM_BLOQUE if modo == "bmw" else None)
+        return top_k_con_poda(self.indptr, self.docs, self.valores(), maximos,
+                              terminos, self.idf[terminos] * repeticiones, k)
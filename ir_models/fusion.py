@@ -0,0 +1,128 @@
+"""
+Fusión de los puntajes de TF-IDF y BM25 sobre un conjunto pequeño de candidatos.
+
+En lugar de normalizar y combinar los puntajes de todo el corpus, cada modelo aporta su
+top-n y solo se combinan los documentos de la unión: se calculan los puntajes exactos de
+ambos modelos para esos documentos (una matriz candidatos x modelos) y se fusionan con
+una de las estrategias de ESTRATEGIAS:
+
+- "minmax": cada columna se escala a [0, 1] con el mínimo y el máximo de los candidatos.
+- "zscore": cada columna se estandariza con la media y la desviación de los candidatos.
+- "lineal": suma ponderada de los puntajes crudos.
+- "rrf": Reciprocal Rank Fusion, ``sum(peso / (k_rrf + rango))``; un modelo que no
+  encuentra ningún término de la consulta en el documento no aporta.
+
+Todas las estrategias terminan en un producto por el vector de pesos de SENALES: los dos
+modelos y, opcionalmente, la cercanía de los términos de la consulta en cada candidato
+(ver indice_posicional.IndicePosicional.cercania), que solo se calcula si pesa más de 0.
+"""
+import numpy as np
+
+MODELOS = ("sim_cos", "bm25_scores")
+SENALES = MODELOS + ("proximidad",)
+ESTRATEGIAS = ("minmax", "zscore", "lineal", "rrf")
+K_RRF = 60
+
+def leer_pesos(pesos=None):
+    """
+    Convierte los pesos pedidos en un vector alineado con SENALES que suma 1.
+
+    Parámetros:
+    - pesos: dict señal -> peso no negativo (las señales que no aparecen pesan 0), o
+      None para pesos iguales de los modelos (sin proximidad).
+
+    Retorna:
+    - numpy.ndarray con un peso por señal.
+    """
+    if pesos is None:
+        return np.array([1 / len(MODELOS)] * len(MODELOS) + [0.0] * (len(SENALES) - len(MODELOS)))
+    desconocidos = set(pesos) - set(SENALES)
+    if desconocidos:
+        raise ValueError(f"Modelos de fusión no soportados: {sorted(desconocidos)}")
+    vector = np.array([float(pesos.get(senal, 0)) for senal in SENALES])
+    if (vector < 0).any() or not np.isfinite(vector).all() or vector.sum() <= 0:
+        raise ValueError("Los pesos de fusión deben ser no negativos y sumar más de 0")
+    return vector / vector.sum()
+
+def candidatos(modelo_tfidf, modelo_bm25, query_preprocesada, n):
+    """
+    Une el top-n de cada modelo y calcula los puntajes exactos de ambos modelos para los
+    documentos de la unión.
+
+    Retorna:
+    - Tupla (posiciones ordenadas, matriz de puntajes crudos n_candidatos x MODELOS).
+    """
+    listas = []
+    for indices, scores in (modelo_tfidf.obtener_top_k(query_preprocesada, n),
+                            modelo_bm25.obtener_top_k(query_preprocesada, n)):
+        # obtener_top_k completa con documentos de puntaje 0, que no son candidatos.
+        listas.append(indices[scores > 0])
+    posiciones = np.unique(np.concatenate(listas))
+    scores = np.column_stack([modelo_tfidf.obtener_similitud_docs(query_preprocesada, posiciones),
+                              modelo_bm25.obtener_scores_docs(query_preprocesada, posiciones)])
+    return posiciones, scores
+
+def seleccionar(posiciones, scores, n):
+    """
+    Deja solo los documentos que están en el top-n de algún modelo con puntaje positivo
+    (empates por posición), ordenados por posición. Sirve para reducir a la unión global
+    los candidatos reunidos de varios fragmentos.
+    """
+    elegidos = np.zeros(len(posiciones), dtype=bool)
+    for columna in scores.T:
+        orden = np.lexsort((posiciones, -columna))[:n]
+        elegidos[orden[columna[orden] > 0]] = True
+    orden = np.argsort(posiciones[elegidos], kind="stable")
+    return posiciones[elegidos][orden], scores[elegidos][orden]
+
+def minmax(scores):
+    """
+    Escala cada columna a [0, 1]; una columna constante queda en 0.
+    """
+    minimo = scores.min(axis=0)
+    rango = scores.max(axis=0) - minimo
+    return np.divide(scores - minimo, rango, out=np.zeros_like(scores), where=rango > 0)
+
+def zscore(scores):
+    """
+    Estandariza cada columna (media 0, desviación 1); una columna constante queda en 0.
+    """
+    desviacion = scores.std(axis=0)
+    return np.divide(scores - scores.mean(axis=0), desviacion, out=np.zeros_like(scores), where=desviacion > 0)
+
+def rrf(scores, k_rrf=K_RRF):
+    """
+    Aporte ``1 / (k_rrf + rango)`` de cada documento en cada columna, con rangos desde 1
+    por puntaje descendente (empates por fila); los puntajes no positivos aportan 0.
+    """
+    orden = np.argsort(-scores, axis=0, kind="stable")
+    rangos = np.empty_like(orden)
+    np.put_along_axis(rangos, orden, np.arange(1, len(scores) + 1)[:, None], axis=0)
+    return np.where(scores > 0, 1 / (k_rrf + rangos), 0.0)
+
+def fusionar(scores, estrategia="minmax", pesos=None, k_rrf=K_RRF):
+    """
+    Combina la matriz de puntajes de los candidatos en un puntaje por documento.
+
+    Parámetros:
+    - scores: matriz de puntajes crudos (n_candidatos x señales, en el orden de SENALES);
+      las señales que falten al final (la proximidad, si no se calculó) pesan 0.
+    - estrategia: una de ESTRATEGIAS.
+    - pesos: vector de leer_pesos (por defecto, pesos iguales de los modelos).
+    - k_rrf: constante de RRF.
+
+    Retorna:
+    - Arreglo con el puntaje fusionado de cada candidato.
+    """
+    if estrategia not in ESTRATEGIAS:
+        raise ValueError(f"Estrategia de fusión no soportada: {estrategia}")
+    pesos = leer_pesos() if pesos is None else pesos
+    if len(scores) == 0:
+        return np.empty(0)
+    if estrategia == "minmax":
+        scores = minmax(scores)
+    elif estrategia == "zscore":
+        scores = zscore(scores)
+    elif estrategia == "rrf":
+        scores = rrf(scores, k_rrf)
+    return scores @ pesos[:scores.shape[1]]
@@ -0,0 +1,213 @@
+"""
+Formato de índice en disco por columnas.
+
+Un índice es un directorio con un ``manifest.json`` versionado, la tabla de ids de
+documento (``doc_ids.npy``) y un subdirectorio por modelo (``tfidf/``, ``bm25/``). Cada
+subdirectorio tiene su propio manifiesto con los parámetros del modelo y un ``.npy`` por
+arreglo (vocabulario, listas de posteo en CSR, longitudes de documento, IDF...). Los
+arreglos se cargan con ``np.load(mmap_mode="r")``: el arranque no deserializa nada y las
+páginas se comparten entre todos los procesos que abren el mismo índice.
+"""
+
+import json
+import os
+import numpy as np
+
+FORMATO = "indice_columnar"
+VERSION = 1
+MANIFIESTO = "manifest.json"
+
+def escribir_manifiesto(directorio, contenido):
+    """
+    Escribe el manifiesto del directorio agregando el formato y la versión. Se escribe
+    primero en un archivo temporal y luego se reemplaza, para no dejar un manifiesto a medias.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    ruta = os.path.join(directorio, MANIFIESTO)
+    with open(ruta + ".tmp", "w", encoding="utf-8") as archivo:
+        json.dump({"formato": FORMATO, "version": VERSION, **contenido}, archivo, indent=2)
+    os.replace(ruta + ".tmp", ruta)
+
+def leer_manifiesto(directorio):
+    """
+    Lee el manifiesto de un directorio de índice y verifica su formato y versión.
+
+    Retorna:
+    - Diccionario con el contenido del manifiesto.
+    """
+    with open(os.path.join(directorio, MANIFIESTO), encoding="utf-8") as archivo:
+        manifiesto = json.load(archivo)
+    if manifiesto.get("formato") != FORMATO or manifiesto.get("version") != VERSION:
+        raise ValueError(f"Índice no soportado en {directorio}: formato {manifiesto.get('formato')} "
+                         f"versión {manifiesto.get('version')} (se esperaba {FORMATO} versión {VERSION})")
+    return manifiesto
+
+def existe_indice(directorio):
+    """
+    Indica si el directorio contiene un índice columnar (tiene manifiesto).
+    """
+    return os.path.isfile(os.path.join(directorio, MANIFIESTO))
+
+def guardar_arreglos(directorio, arreglos):
+    """
+    Guarda cada arreglo como ``<nombre>.npy`` en el directorio.
+
+    Retorna:
+    - Descripción de los arreglos para el manifiesto: nombre -> {"dtype", "shape"}.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    descripcion = {}
+    for nombre, arreglo in arreglos.items():
+        arreglo = np.ascontiguousarray(arreglo)
+        np.save(os.path.join(directorio, nombre + ".npy"), arreglo)
+        descripcion[nombre] = {"dtype": arreglo.dtype.str, "shape": list(arreglo.shape)}
+    return descripcion
+
+def cargar_arreglos(directorio, descripcion, mmap_mode="r"):
+    """
+    Carga los arreglos descritos en el manifiesto, comprobando su tipo y forma.
+
+    Parámetros:
+    - directorio: directorio de los ``.npy``.
+    - descripcion: descripción escrita por guardar_arreglos.
+    - mmap_mode: modo de ``np.load`` ("r" para memoria mapeada, None para leerlos a memoria).
+
+    Retorna:
+    - Diccionario nombre -> arreglo.
+    """
+    arreglos = {}
+    for nombre, meta in descripcion.items():
+        arreglo = np.load(os.path.join(directorio, nombre + ".npy"), mmap_mode=mmap_mode)
+        if arreglo.dtype.str != meta["dtype"] or list(arreglo.shape) != meta["shape"]:
+            raise ValueError(f"El arreglo {nombre} de {directorio} no coincide con el manifiesto")
+        arreglos[nombre] = arreglo
+    return arreglos
+
+def guardar_indice(directorio, modelos, doc_ids):
+    """
+    Guarda un índice columnar completo.
+
+    Parámetros:
+    - directorio: directorio del índice (se crea si no existe).
+    - modelos: diccionario nombre -> modelo con el método ``guardar_columnar(directorio)``
+      (Tfidf, Bm25); cada uno se guarda en su subdirectorio.
+    - doc_ids: id de cada documento, en el orden de las posiciones del índice.
+    """
+    doc_ids = np.asarray([str(doc_id) for doc_id in doc_ids], dtype=str)
+    manifiesto = {"n_docs": len(doc_ids), "arreglos": guardar_arreglos(directorio, {"doc_ids": doc_ids}), "modelos": {}}
+    for nombre, modelo in modelos.items():
+        manifiesto["modelos"][nombre] = modelo.guardar_columnar(os.path.join(directorio, nombre))
+        if manifiesto["modelos"][nombre]["n_docs"] != len(doc_ids):
+            raise ValueError(f"El modelo {nombre} tiene {manifiesto['modelos'][nombre]['n_docs']} documentos "
+                             f"y la tabla de ids {len(doc_ids)}")
+    # El manifiesto raíz se escribe al final: un índice sin él está incompleto.
+    escribir_manifiesto(directorio, manifiesto)
+
+def cargar_doc_ids(directorio, mmap_mode="r"):
+    """
+    Carga la tabla de ids de documento de un índice columnar.
+    """
+    return cargar_arreglos(directorio, leer_manifiesto(directorio)["arreglos"], mmap_mode)["doc_ids"]
+
+
+class EscritorArreglo:
+    """
+    Escribe un arreglo 1-D como ``<nombre>.npy`` por partes, sin tenerlo completo en
+    memoria: cada parte se agrega a un archivo temporal y al cerrar se copia al ``.npy``
+    a través de memoria mapeada. Para texto (dtype ``U`` o ``S``) el ancho final es el de
+    la parte más ancha.
+
+    Parámetros:
+    - directorio: directorio del arreglo (se crea si no existe).
+    - nombre: nombre del arreglo (sin extensión).
+    - dtype: tipo de los elementos.
+    """
+
+    def __init__(self, directorio, nombre, dtype):
+        os.makedirs(directorio, exist_ok=True)
+        self.ruta = os.path.join(directorio, nombre + ".npy")
+        self.dtype = np.dtype(dtype)
+        self.n = 0
+        self._partes = []
+        self._archivo = open(self.ruta + ".parcial", "wb")
+
+    def agregar(self, valores):
+        """
+        Agrega valores al final del arreglo.
+        """
+        valores = np.ascontiguousarray(valores, dtype=self.dtype if self.dtype.itemsize else None)
+        if len(valores) == 0:
+            return
+        self._partes.append((valores.dtype, len(valores), self._archivo.tell()))
+        self._archivo.write(valores.tobytes())
+        self.n += len(valores)
+
+    def cerrar(self):
+        """
+        Escribe el ``.npy`` final y borra el temporal.
+
+        Retorna:
+        - Descripción del arreglo para el manifiesto: {"dtype", "shape"}.
+        """
+        self._archivo.close()
+        dtype = self.dtype
+        if not dtype.itemsize:
+            dtype = max((parte[0] for parte in self._partes), key=lambda d: d.itemsize, default=np.dtype(dtype.char + "1"))
+        destino = np.lib.format.open_memmap(self.ruta, mode="w+", dtype=dtype, shape=(self.n,))
+        inicio = 0
+        for tipo, n, desplazamiento in self._partes:
+            destino[inicio:inicio + n] = np.memmap(self.ruta + ".parcial", dtype=tipo, mode="r", offset=desplazamiento, shape=(n,))
+            inicio += n
+        destino.flush()
+        del destino
+        os.remove(self.ruta + ".parcial")
+        return {"dtype": dtype.str, "shape": [self.n]}
+
+
+class VocabularioOrdenado:
+    """
+    Vocabulario guardado como arreglo ordenado de términos en UTF-8 (dtype ``S``), donde el
+    id de un término es su posición. Se consulta por bisección, así que puede estar mapeado
+    en memoria sin construir un diccionario en cada proceso.
+
+    Admite ``termino in vocabulario`` y ``vocabulario[termino]`` como un diccionario.
+    """
+
+    def __init__(self, terminos):
+        self.terminos = terminos
+
+    @classmethod
+    def desde_dict(cls, vocabulario):
+        """
+        Crea el vocabulario a partir de un diccionario término -> id cuyos ids siguen el
+        orden de los términos (como los de TfidfVectorizer e IndiceBm25).
+        """
+        terminos = sorted(vocabulario, key=vocabulario.get)
+        if any(anterior >= siguiente for anterior, siguiente in zip(terminos, terminos[1:])):
+            raise ValueError("Los ids del vocabulario deben seguir el orden de los términos")
+        return cls(np.array([termino.encode("utf-8") for termino in terminos], dtype=bytes))
+
+    def ids(self, tokens):
+        """
+        Traduce tokens a ids de término.
+
+        Retorna:
+        - Arreglo de ids (int64), con -1 para los tokens que no están en el vocabulario.
+        """
+        if len(tokens) == 0 or len(self.terminos) == 0:
+            return np.full(len(tokens), -1, dtype=np.int64)
+        claves = np.array([token.encode("utf-8") for token in tokens], dtype=bytes)
+        posiciones = np.minimum(np.searchsorted(self.terminos, claves), len(self.terminos) - 1)
+        return np.where(self.terminos[posiciones] == claves, posiciones, -1)
+
+    def __len__(self):
+        return len(self.terminos)
+
+    def __contains__(self, termino):
+        return self.ids([termino])[0] >= 0
+
+    def __getitem__(self, termino):
+        termino_id = self.ids([termino])[0]
+        if termino_id < 0:
+            raise KeyError(termino)
+        return int(termino_id)
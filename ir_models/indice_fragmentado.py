@@ -0,0 +1,288 @@
+"""
+Índice dividido en fragmentos por rangos de posiciones de documento.
+
+Cada fragmento es un índice columnar completo (``fragmento_000/``, ``fragmento_001/``...)
+con las filas de sus documentos en la matriz TF-IDF, sus listas de posteo BM25 y sus doc
+ids, pero con el vocabulario, el IDF, las normas TF-IDF y la longitud media del corpus
+completo: el puntaje de cada documento es el del índice sin fragmentar (salvo redondeo en
+el último decimal de TF-IDF, que suma los productos de otra submatriz).
+
+Una consulta se reparte a todos los fragmentos en dos fases:
+
+1. ``extremos``: cada fragmento calcula los puntajes crudos de sus documentos, los guarda
+   con el id de la consulta y retorna su mínimo y máximo por modelo; el coordinador obtiene
+   los extremos globales.
+2. ``top_k``: cada fragmento retira los puntajes de esa consulta, normaliza con los
+   extremos globales (y promedia, para 'promedio'), selecciona su top-k y el coordinador
+   los mezcla.
+
+Como la normalización usa los mismos extremos y las mismas operaciones que
+Sri_app.puntuar, y los empates se resuelven por posición global, el ranking es el del
+índice completo; los puntajes pueden diferir en el redondeo del último decimal. Los
+fragmentos se atienden con clientes que exponen ``llamar(metodo, *args) -> Future``:
+ClienteProceso (un proceso por fragmento, mensajes por un Pipe) o ClienteLocal (en este
+proceso); un cliente remoto solo tendría que implementar la misma interfaz.
+
+Para la fusión por candidatos (ver fusion.py) basta una fase: cada documento vive en un
+solo fragmento, así que cada uno retorna su top-n por modelo con los puntajes de ambos
+modelos y el coordinador se queda con el top-n global de cada modelo.
+"""
+import itertools
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from .indice_columnar import escribir_manifiesto, existe_indice, guardar_indice, leer_manifiesto
+from .poda import top_k_denso
+from . import fusion
+from .tfidf.tf_idf import Tfidf
+from .bm25.bm25 import Bm25
+
+METRICAS = ("sim_cos", "bm25_scores", "promedio")
+
+def fragmentar(directorio, modelo_tfidf, modelo_bm25, doc_ids, n_fragmentos, huella=None):
+    """
+    Divide los modelos en n_fragmentos rangos consecutivos de documentos de igual tamaño y
+    guarda cada uno como índice columnar.
+
+    Parámetros:
+    - directorio: directorio de los fragmentos (se crea si no existe).
+    - modelo_tfidf, modelo_bm25: modelos del corpus completo.
+    - doc_ids: id de cada documento, en orden de posición.
+    - n_fragmentos: número de fragmentos (como máximo, uno por documento).
+    - huella: huella de los modelos de origen, para saber si los fragmentos están vigentes.
+    """
+    n_docs = len(doc_ids)
+    limites = np.linspace(0, n_docs, min(n_fragmentos, n_docs) + 1).astype(np.int64)
+    fragmentos = []
+    for i, (inicio, fin) in enumerate(zip(limites[:-1].tolist(), limites[1:].tolist())):
+        nombre = f"fragmento_{i:03d}"
+        guardar_indice(os.path.join(directorio, nombre), {"tfidf": modelo_tfidf.fragmento(inicio, fin),
+                                                          "bm25": Bm25.desde_indice(modelo_bm25.indice.fragmento(inicio, fin))},
+                       doc_ids[inicio:fin])
+        fragmentos.append({"directorio": nombre, "inicio": inicio, "fin": fin})
+    escribir_manifiesto(directorio, {"contenido": "fragmentos", "n_docs": n_docs, "huella": huella, "fragmentos": fragmentos})
+
+def normalizar(scores, minimo, maximo):
+    """
+    Escala los puntajes al rango [0, 1] con extremos dados (los globales de la consulta),
+    con las mismas operaciones que Sri_app.normalizar.
+    """
+    rango = maximo - minimo
+    return (scores - minimo) / rango if rango > 0 else np.zeros_like(scores)
+
+
+class Fragmento:
+    """
+    Atiende las consultas de un fragmento. Los puntajes crudos de la fase 1 se guardan con
+    el id de la consulta y se descartan al terminar su fase 2, así que solo se conservan los
+    de las consultas en curso.
+
+    Parámetros:
+    - directorio: directorio del índice columnar del fragmento.
+    - inicio: posición global de su primer documento.
+    - max_pendientes: consultas en curso cuyos puntajes se conservan; si una consulta no
+      llega a la fase 2 (por un error del coordinador), se descarta la más antigua.
+    """
+
+    def __init__(self, directorio, inicio, max_pendientes=64):
+        self.modelo_tfidf = Tfidf(modelName=os.path.join(directorio, "tfidf"))
+        self.modelo_bm25 = Bm25(modelName=os.path.join(directorio, "bm25"))
+        self.inicio = inicio
+        self.max_pendientes = max_pendientes
+        self._pendientes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def puntajes(self, query_preprocesada, metrica):
+        """
+        Puntajes crudos de los modelos que usa la métrica, por nombre de métrica.
+        """
+        puntajes = {}
+        if metrica != METRICAS[1]:
+            puntajes[METRICAS[0]] = self.modelo_tfidf.obtener_similitud_coseno(query_preprocesada)
+        if metrica != METRICAS[0]:
+            puntajes[METRICAS[1]] = self.modelo_bm25.obtener_scores(query_preprocesada)
+        return puntajes
+
+    def extremos(self, id_consulta, query_preprocesada, metrica):
+        """
+        Fase 1: mínimo y máximo de cada modelo en este fragmento. Los puntajes quedan
+        guardados con id_consulta hasta la fase 2.
+        """
+        puntajes = self.puntajes(query_preprocesada, metrica)
+        with self._lock:
+            self._pendientes[id_consulta] = puntajes
+            while len(self._pendientes) > self.max_pendientes:
+                self._pendientes.popitem(last=False)
+        return {modelo: (float(scores.min()), float(scores.max()))
+                for modelo, scores in puntajes.items() if len(scores)}
+
+    def top_k(self, id_consulta, query_preprocesada, metrica, k, extremos):
+        """
+        Fase 2: top-k del fragmento con los puntajes normalizados con los extremos globales.
+        Retira los puntajes guardados en la fase 1 (o los recalcula si ya se descartaron).
+
+        Retorna:
+        - Tupla (posiciones globales, puntajes) ordenada por puntaje descendente.
+        """
+        with self._lock:
+            puntajes = self._pendientes.pop(id_consulta, None)
+        if puntajes is None:
+            puntajes = self.puntajes(query_preprocesada, metrica)
+        normalizados = [normalizar(scores, *extremos[modelo]) for modelo, scores in puntajes.items()]
+        scores = normalizados[0] if len(normalizados) == 1 else (normalizados[0] + normalizados[1]) / 2
+        indices = top_k_denso(scores, k)
+        return indices + self.inicio, scores[indices]
+
+    def candidatos(self, query_preprocesada, n):
+        """
+        Top-n de cada modelo en este fragmento con los puntajes crudos de ambos modelos.
+
+        Retorna:
+        - Tupla (posiciones globales, matriz de puntajes n_candidatos x fusion.MODELOS).
+        """
+        posiciones, scores = fusion.candidatos(self.modelo_tfidf, self.modelo_bm25, query_preprocesada, n)
+        return posiciones + self.inicio, scores
+
+
+def _servir(directorio, inicio, conexion):
+    """
+    Bucle de un proceso de fragmento: recibe (método, argumentos) y responde
+    (True, resultado) o (False, excepción). Termina al recibir None.
+    """
+    fragmento = Fragmento(directorio, inicio)
+    while True:
+        mensaje = conexion.recv()
+        if mensaje is None:
+            break
+        metodo, argumentos = mensaje
+        try:
+            conexion.send((True, getattr(fragmento, metodo)(*argumentos)))
+        except Exception as error:
+            conexion.send((False, error))
+    conexion.close()
+
+
+class ClienteLocal:
+    """
+    Atiende un fragmento en este mismo proceso, con un hilo propio.
+    """
+
+    def __init__(self, directorio, inicio):
+        self.fragmento = Fragmento(directorio, inicio)
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def llamar(self, metodo, *argumentos):
+        return self._executor.submit(getattr(self.fragmento, metodo), *argumentos)
+
+    def cerrar(self):
+        self._executor.shutdown(wait=False)
+
+
+class ClienteProceso:
+    """
+    Atiende un fragmento en un proceso propio (que abre el índice mapeado en memoria) y se
+    comunica con él por un Pipe. Las llamadas se envían en orden desde un hilo por cliente,
+    así que el cliente puede usarse desde varios hilos.
+    """
+
+    def __init__(self, directorio, inicio):
+        contexto = multiprocessing.get_context("spawn")
+        self._conexion, remota = contexto.Pipe()
+        self.proceso = contexto.Process(target=_servir, args=(directorio, inicio, remota), daemon=True)
+        self.proceso.start()
+        remota.close()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def _llamar(self, metodo, argumentos):
+        self._conexion.send((metodo, argumentos))
+        correcto, resultado = self._conexion.recv()
+        if not correcto:
+            raise resultado
+        return resultado
+
+    def llamar(self, metodo, *argumentos):
+        return self._executor.submit(self._llamar, metodo, argumentos)
+
+    def cerrar(self):
+        self._executor.shutdown(wait=True)
+        self._conexion.send(None)
+        self.proceso.join(timeout=5)
+        self._conexion.close()
+
+
+class IndiceFragmentado:
+    """
+    Coordinador: reparte cada consulta a todos los fragmentos en paralelo y mezcla sus
+    top-k en un único ranking global.
+
+    Parámetros:
+    - directorio: directorio escrito por fragmentar.
+    - procesos: True para un proceso por fragmento (ClienteProceso), False para atenderlos
+      en este proceso (ClienteLocal).
+    """
+
+    def __init__(self, directorio, procesos=True):
+        manifiesto = leer_manifiesto(directorio)
+        self.n_docs = manifiesto["n_docs"]
+        self.fragmentos = manifiesto["fragmentos"]
+        cliente = ClienteProceso if procesos else ClienteLocal
+        self.clientes = [cliente(os.path.join(directorio, fragmento["directorio"]), fragmento["inicio"])
+                         for fragmento in self.fragmentos]
+        # Ids de consulta para asociar las dos fases en cada fragmento.
+        self._ids = itertools.count()
+
+    @staticmethod
+    def vigente(directorio, n_fragmentos, huella):
+        """
+        Indica si el directorio tiene n_fragmentos fragmentos construidos con la huella dada.
+        """
+        if not existe_indice(directorio):
+            return False
+        manifiesto = leer_manifiesto(directorio)
+        return manifiesto.get("huella") == huella and len(manifiesto["fragmentos"]) == n_fragmentos
+
+    def repartir(self, metodo, *argumentos):
+        """
+        Llama al mismo método en todos los fragmentos a la vez y retorna sus resultados.
+        """
+        futuros = [cliente.llamar(metodo, *argumentos) for cliente in self.clientes]
+        return [futuro.result() for futuro in futuros]
+
+    def top_k(self, query_preprocesada, k, metrica="promedio"):
+        """
+        Recupera los k documentos de mayor puntaje normalizado de todo el corpus.
+
+        Retorna:
+        - Tupla (posiciones globales, puntajes) ordenada por puntaje descendente y, en
+          empates, por posición.
+        """
+        if metrica not in METRICAS:
+            raise ValueError(f"Métrica no soportada: {metrica}")
+        id_consulta = next(self._ids)
+        extremos = {}
+        for extremos_fragmento in self.repartir("extremos", id_consulta, query_preprocesada, metrica):
+            for modelo, (minimo, maximo) in extremos_fragmento.items():
+                if modelo in extremos:
+                    minimo, maximo = min(extremos[modelo][0], minimo), max(extremos[modelo][1], maximo)
+                extremos[modelo] = (minimo, maximo)
+        partes = self.repartir("top_k", id_consulta, query_preprocesada, metrica, k, extremos)
+        indices = np.concatenate([parte[0] for parte in partes])
+        scores = np.concatenate([parte[1] for parte in partes])
+        orden = np.lexsort((indices, -scores))[:k]
+        return indices[orden], scores[orden]
+
+    def candidatos(self, query_preprocesada, n):
+        """
+        Une los candidatos de todos los fragmentos y deja los del top-n global de cada
+        modelo: el mismo conjunto que fusion.candidatos sobre el índice completo.
+        """
+        partes = self.repartir("candidatos", query_preprocesada, n)
+        return fusion.seleccionar(np.concatenate([parte[0] for parte in partes]),
+                                  np.concatenate([parte[1] for parte in partes]), n)
+
+    def cerrar(self):
+        for cliente in self.clientes:
+            cliente.cerrar()
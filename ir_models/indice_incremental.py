@@ -0,0 +1,507 @@
+import re
+import threading
+import numpy as np
+from scipy import sparse
+from .indice_columnar import VocabularioOrdenado
+from .bm25.indice_bm25 import IndiceBm25
+from .tfidf.vectorizador_columnar import VectorizadorColumnar
+
+class Segmento:
+    """
+    Segmento inmutable de listas de posteo con ids globales de término.
+
+    Las listas están en CSR por término: el término ``terminos[i]`` aparece en
+    ``docs[indptr[i]:indptr[i+1]]`` con frecuencias ``tfs[...]``. Los documentos son
+    posiciones globales consecutivas desde ``inicio``. Los términos de cada documento (para
+    borrarlo) se arman en memoria la primera vez que se piden.
+
+    Parámetros
+    ----------
+    inicio : int
+        Posición global del primer documento.
+    n_docs : int
+        Número de posiciones que cubre el segmento (incluidos documentos ya eliminados).
+    terminos : numpy.ndarray
+        Ids globales de término presentes, ordenados.
+    indptr, docs, tfs : numpy.ndarray
+        Listas de posteo en CSR.
+    """
+
+    def __init__(self, inicio, n_docs, terminos, indptr, docs, tfs):
+        self.inicio = inicio
+        self.n_docs = n_docs
+        self.terminos = terminos
+        self.indptr = indptr
+        self.docs = docs
+        self.tfs = tfs
+        self._doc_ptr = None
+        self._doc_terminos = None
+
+    @classmethod
+    def construir(cls, inicio, ids_docs):
+        """
+        Construye un segmento a partir de los ids globales de término de cada documento.
+
+        Parámetros
+        ----------
+        inicio : int
+            Posición global del primer documento.
+        ids_docs : list of numpy.ndarray
+            Ids de término de cada documento (con repeticiones).
+        """
+        n_docs = len(ids_docs)
+        largos = np.fromiter((len(ids) for ids in ids_docs), dtype=np.int64, count=n_docs)
+        ids = np.concatenate([np.empty(0, dtype=np.int64)] + [np.asarray(ids, dtype=np.int64) for ids in ids_docs])
+        filas = np.repeat(np.arange(n_docs, dtype=np.int64), largos)
+        # Igual que en IndiceBm25.construir: cada par (término, documento) se codifica en un entero.
+        claves, tfs = np.unique(ids * max(n_docs, 1) + filas, return_counts=True)
+        terminos, posteo_terminos = np.unique(claves // max(n_docs, 1), return_inverse=True)
+        indptr = np.zeros(len(terminos) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(posteo_terminos, minlength=len(terminos)), out=indptr[1:])
+        return cls(inicio, n_docs, terminos, indptr, claves % max(n_docs, 1) + inicio, tfs.astype(np.int32))
+
+    @classmethod
+    def fusionar(cls, segmentos, vivos):
+        """
+        Fusiona segmentos consecutivos en uno solo, descartando los documentos eliminados.
+        Las posiciones de los documentos no cambian.
+        """
+        terminos = np.concatenate([np.repeat(s.terminos, np.diff(s.indptr)) for s in segmentos])
+        docs = np.concatenate([np.asarray(s.docs, dtype=np.int64) for s in segmentos])
+        tfs = np.concatenate([s.tfs for s in segmentos])
+        conservar = vivos[docs]
+        terminos, docs, tfs = terminos[conservar], docs[conservar], tfs[conservar]
+        orden = np.lexsort((docs, terminos))
+        terminos_unicos, posteo_terminos = np.unique(terminos[orden], return_inverse=True)
+        indptr = np.zeros(len(terminos_unicos) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(posteo_terminos, minlength=len(terminos_unicos)), out=indptr[1:])
+        inicio = segmentos[0].inicio
+        return cls(inicio, segmentos[-1].inicio + segmentos[-1].n_docs - inicio, terminos_unicos, indptr, docs[orden], tfs[orden])
+
+    def posteo(self, termino_id):
+        """
+        Retorna los documentos y frecuencias del término en el segmento (vacíos si no está).
+        """
+        i = np.searchsorted(self.terminos, termino_id)
+        if i == len(self.terminos) or self.terminos[i] != termino_id:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32)
+        return self.docs[self.indptr[i]:self.indptr[i + 1]], self.tfs[self.indptr[i]:self.indptr[i + 1]]
+
+    def entradas(self, terminos):
+        """
+        Entradas de varios términos en el segmento (los que no están se omiten).
+
+        Retorna
+        -------
+        tuple of numpy.ndarray
+            (índice en ``terminos`` de cada entrada, documentos, frecuencias).
+        """
+        i = np.minimum(np.searchsorted(self.terminos, terminos), max(len(self.terminos) - 1, 0))
+        presentes = np.flatnonzero(self.terminos[i] == terminos) if len(self.terminos) else np.empty(0, dtype=np.int64)
+        desde = self.indptr[i[presentes]]
+        largos = self.indptr[i[presentes] + 1] - desde
+        indices = np.repeat(desde - np.cumsum(largos) + largos, largos) + np.arange(largos.sum())
+        return np.repeat(presentes, largos), np.asarray(self.docs[indices], dtype=np.int64), self.tfs[indices]
+
+    def terminos_de(self, posicion):
+        """
+        Retorna los ids de término de un documento del segmento. La primera llamada arma
+        la lista de términos por documento (un entero por entrada).
+        """
+        if self._doc_ptr is None:
+            filas = np.asarray(self.docs, dtype=np.int64) - self.inicio
+            self._doc_ptr = np.zeros(self.n_docs + 1, dtype=np.int64)
+            np.cumsum(np.bincount(filas, minlength=self.n_docs), out=self._doc_ptr[1:])
+            columnas = np.repeat(np.arange(len(self.terminos), dtype=np.int32), np.diff(self.indptr))
+            self._doc_terminos = columnas[np.argsort(filas, kind="stable")]
+        fila = posicion - self.inicio
+        return self.terminos[self._doc_terminos[self._doc_ptr[fila]:self._doc_ptr[fila + 1]]]
+
+
+class EstadoIndice:
+    """
+    Instantánea inmutable de un IndiceIncremental: segmentos, documentos vivos y
+    estadísticas globales. Una consulta usa una sola instantánea, así que nunca mezcla
+    estadísticas de antes y después de una modificación.
+    """
+
+    def __init__(self, segmentos, vivos, idf_bm25, idf_tfidf, norma_bm25, norma_tfidf):
+        self.segmentos = segmentos
+        self.vivos = vivos
+        self.idf_bm25 = idf_bm25
+        self.idf_tfidf = idf_tfidf
+        self.norma_bm25 = norma_bm25
+        self.norma_tfidf = norma_tfidf
+        self.n_docs = len(vivos)
+        self.n_terminos = len(idf_bm25)
+
+
+class IndiceIncremental:
+    """
+    Índice que admite agregar, actualizar y eliminar documentos por doc_id sin reentrenar
+    TF-IDF ni BM25.
+
+    Parte del índice BM25 base (listas de posteo con frecuencias) y guarda los documentos
+    nuevos en segmentos pequeños en memoria; los eliminados se marcan con una lápida
+    (``vivos[posicion] = False``) y una actualización es eliminar + agregar. Las
+    frecuencias de documento, la longitud media y el número de documentos se actualizan en
+    cada operación, y con ellos se recalculan el IDF de ambos modelos y las normas:
+
+    - BM25 igual que BM25Okapi sobre los documentos vivos (mismo piso epsilon).
+    - TF-IDF igual que TfidfVectorizer (idf suavizado, norma L2) sobre los documentos vivos.
+      Como el texto preprocesado solo tiene tokens alfabéticos separados por espacios, la
+      frecuencia de un término en TF-IDF es la misma que en BM25 para los términos que
+      cumplen ``token_pattern``, así que ambos modelos salen de las mismas listas.
+
+    Con ``a = log(1 + n) + 1`` y ``c = log(1 + df)``, el idf TF-IDF es ``a - c`` y la norma²
+    de un documento es ``a² S0 - 2a S1 + S2``, con ``S0 = Σ tf²``, ``S1 = Σ tf² c`` y
+    ``S2 = Σ tf² c²`` sobre sus términos. Las tres sumas se guardan por documento: un cambio
+    en n solo cambia ``a``, y un cambio en el df de un término solo actualiza las sumas de
+    los documentos de sus listas, así que cada operación recorre las listas de los términos
+    de los documentos modificados y no todo el índice.
+
+    Los puntajes coinciden con los de reconstruir ambos modelos con los documentos vivos
+    (salvo redondeo).
+    Cuando hay más de ``max_segmentos`` segmentos nuevos se fusionan en un hilo en segundo
+    plano.
+
+    Parámetros
+    ----------
+    base : IndiceBm25
+        Índice BM25 de los documentos actuales.
+    doc_ids : sequence
+        Id de cada documento del índice base, en orden de posición.
+    token_pattern : str
+        Patrón de tokens del TfidfVectorizer.
+    max_segmentos : int
+        Número de segmentos nuevos a partir del cual se fusionan.
+    """
+
+    def __init__(self, base, doc_ids, token_pattern=r"(?u)\b\w\w+\b", max_segmentos=8):
+        self.k1 = base.k1
+        self.b = base.b
+        self.epsilon = base.epsilon
+        self.max_segmentos = max_segmentos
+        self.token_pattern = token_pattern
+        self.patron = re.compile(token_pattern)
+
+        if isinstance(base.vocabulario, VocabularioOrdenado):
+            self.terminos = [termino.decode("utf-8") for termino in base.vocabulario.terminos.tolist()]
+        else:
+            self.terminos = sorted(base.vocabulario, key=base.vocabulario.get)
+        self.vocabulario = {termino: i for i, termino in enumerate(self.terminos)}
+        self.es_tfidf = np.array([self.patron.fullmatch(termino) is not None for termino in self.terminos], dtype=bool)
+
+        self.n_base = base.n_docs
+        self.segmentos = [Segmento(0, base.n_docs, np.arange(len(self.terminos)), base.indptr, *base.listas())]
+        self.doc_len = np.asarray(base.doc_len, dtype=np.int64)
+        self.vivos = np.ones(base.n_docs, dtype=bool)
+        self.df = np.diff(base.indptr).astype(np.int64)
+        # c = log(1 + df) con el que están calculadas las sumas S0, S1 y S2 de cada documento.
+        self.c = np.log1p(self.df)
+        self.sumas = self.sumas_segmento(self.segmentos[0])
+        self.suma_len = int(self.doc_len.sum())
+        self.n_vivos = base.n_docs
+        self.doc_ids = [str(doc_id) for doc_id in doc_ids]
+        self.posiciones = {doc_id: i for i, doc_id in enumerate(self.doc_ids)}
+        self.documentos = {}
+        self.generacion = 0
+        self._lock = threading.Lock()
+        self._fusionando = False
+        self.publicar()
+
+    def ids_terminos(self, tokens, crear=False):
+        """
+        Traduce tokens a ids globales de término. Con ``crear=True`` agrega al vocabulario
+        los términos nuevos; si no, descarta los desconocidos.
+        """
+        if crear:
+            for token in tokens:
+                if token not in self.vocabulario:
+                    self.vocabulario[token] = len(self.terminos)
+                    self.terminos.append(token)
+        return np.array([self.vocabulario[token] for token in tokens if token in self.vocabulario], dtype=np.int64)
+
+    def extender_terminos(self):
+        """
+        Extiende las estadísticas por término a los términos nuevos del vocabulario.
+        """
+        faltantes = len(self.terminos) - len(self.es_tfidf)
+        if faltantes > 0:
+            nuevos = [self.patron.fullmatch(termino) is not None for termino in self.terminos[len(self.es_tfidf):]]
+            self.es_tfidf = np.concatenate([self.es_tfidf, np.array(nuevos, dtype=bool)])
+            self.df = np.concatenate([self.df, np.zeros(faltantes, dtype=np.int64)])
+            self.c = np.concatenate([self.c, np.zeros(faltantes)])
+
+    def sumas_segmento(self, segmento):
+        """
+        Sumas S0, S1 y S2 (ver el docstring de la clase) de los documentos de un segmento,
+        con el c actual.
+
+        Retorna
+        -------
+        numpy.ndarray
+            Matriz (3 x documentos del segmento).
+        """
+        terminos = np.repeat(segmento.terminos, np.diff(segmento.indptr))
+        tf_cuadrado = np.where(self.es_tfidf[terminos], np.asarray(segmento.tfs, dtype=np.float64) ** 2, 0.0)
+        filas = np.asarray(segmento.docs, dtype=np.int64) - segmento.inicio
+        c = self.c[terminos]
+        return np.vstack([np.bincount(filas, weights=peso, minlength=segmento.n_docs)
+                          for peso in (tf_cuadrado, tf_cuadrado * c, tf_cuadrado * c * c)])
+
+    def actualizar_sumas(self, c):
+        """
+        Lleva las sumas S1 y S2 de todos los documentos al nuevo c, recorriendo solo las
+        listas de los términos TF-IDF cuyo df cambió.
+        """
+        terminos = np.flatnonzero((c != self.c) & self.es_tfidf)
+        if len(terminos) == 0:
+            return
+        delta_c = c[terminos] - self.c[terminos]
+        delta_c2 = c[terminos] ** 2 - self.c[terminos] ** 2
+        for segmento in self.segmentos:
+            cual, docs, tfs = segmento.entradas(terminos)
+            if len(docs) == 0:
+                continue
+            tf_cuadrado = np.asarray(tfs, dtype=np.float64) ** 2
+            filas = docs - segmento.inicio
+            tramo = self.sumas[:, segmento.inicio:segmento.inicio + segmento.n_docs]
+            tramo[1] += np.bincount(filas, weights=tf_cuadrado * delta_c[cual], minlength=segmento.n_docs)
+            tramo[2] += np.bincount(filas, weights=tf_cuadrado * delta_c2[cual], minlength=segmento.n_docs)
+
+    def publicar(self):
+        """
+        Recalcula IDF, longitud media y normas con las estadísticas actuales y publica una
+        nueva instantánea. Las normas TF-IDF salen de las sumas por documento, que solo se
+        actualizan para los documentos de los términos cuyo df cambió.
+        """
+        self.extender_terminos()
+        n_terminos = len(self.terminos)
+        df = self.df
+        presentes = df > 0
+        n = self.n_vivos
+
+        idf_bm25 = np.zeros(n_terminos)
+        idf_bm25[presentes] = np.log(n - df[presentes] + 0.5) - np.log(df[presentes] + 0.5)
+        negativos = presentes & (idf_bm25 < 0)
+        if presentes.any():
+            idf_bm25[negativos] = self.epsilon * idf_bm25[presentes].mean()
+
+        en_tfidf = presentes & self.es_tfidf
+        idf_tfidf = np.zeros(n_terminos)
+        idf_tfidf[en_tfidf] = np.log((1 + n) / (1 + df[en_tfidf])) + 1
+
+        avgdl = self.suma_len / n if n > 0 else 1.0
+        norma_bm25 = self.k1 * (1 - self.b + self.b * self.doc_len / avgdl)
+        c = np.log1p(df)
+        self.actualizar_sumas(c)
+        self.c = c
+        a = np.log(1 + n) + 1
+        norma_tfidf = np.sqrt(np.maximum(a * a * self.sumas[0] - 2 * a * self.sumas[1] + self.sumas[2], 0))
+
+        self.estado = EstadoIndice(tuple(self.segmentos), self.vivos.copy(), idf_bm25, idf_tfidf, norma_bm25, norma_tfidf)
+
+    def _agregar(self, doc_ids, documentos_tokens, registros):
+        doc_ids = [str(doc_id) for doc_id in doc_ids]
+        repetidos = [doc_id for doc_id in doc_ids if doc_id in self.posiciones]
+        if repetidos or len(set(doc_ids)) != len(doc_ids):
+            raise ValueError(f"Los doc_id ya existen o están repetidos: {repetidos or doc_ids}")
+        ids_docs = [self.ids_terminos(tokens, crear=True) for tokens in documentos_tokens]
+        self.extender_terminos()
+        inicio = len(self.doc_ids)
+        segmento = Segmento.construir(inicio, ids_docs)
+        largos = np.array([len(ids) for ids in ids_docs], dtype=np.int64)
+
+        # Las sumas de los documentos nuevos se calculan con el c vigente; publicar las lleva al nuevo.
+        self.sumas = np.hstack([self.sumas, self.sumas_segmento(segmento)])
+        self.df[segmento.terminos] += np.diff(segmento.indptr)
+        self.doc_len = np.concatenate([self.doc_len, largos])
+        self.vivos = np.concatenate([self.vivos, np.ones(len(doc_ids), dtype=bool)])
+        self.suma_len += int(largos.sum())
+        self.n_vivos += len(doc_ids)
+        for i, doc_id in enumerate(doc_ids):
+            self.posiciones[doc_id] = inicio + i
+            if registros is not None:
+                self.documentos[inicio + i] = registros[i]
+        self.doc_ids.extend(doc_ids)
+        self.segmentos.append(segmento)
+
+    def _eliminar(self, doc_ids):
+        doc_ids = [str(doc_id) for doc_id in doc_ids]
+        faltantes = [doc_id for doc_id in doc_ids if doc_id not in self.posiciones]
+        if faltantes:
+            raise KeyError(f"Los doc_id no están en el índice: {faltantes}")
+        inicios = np.array([s.inicio for s in self.segmentos])
+        for doc_id in doc_ids:
+            posicion = self.posiciones.pop(doc_id)
+            segmento = self.segmentos[np.searchsorted(inicios, posicion, side="right") - 1]
+            self.df[segmento.terminos_de(posicion)] -= 1
+            self.vivos[posicion] = False
+            self.suma_len -= int(self.doc_len[posicion])
+            self.n_vivos -= 1
+            self.documentos.pop(posicion, None)
+
+    def agregar(self, doc_ids, documentos_tokens, registros=None):
+        """
+        Agrega documentos nuevos en un segmento en memoria.
+
+        Parámetros
+        ----------
+        doc_ids : list
+            Ids de los documentos (no deben existir).
+        documentos_tokens : list of list of str
+            Texto preprocesado de cada documento, tokenizado.
+        registros : list of dict, opcional
+            Campos de cada documento para hidratar resultados.
+        """
+        with self._lock:
+            self._agregar(doc_ids, documentos_tokens, registros)
+            self.generacion += 1
+            self.publicar()
+        self.fusionar_si_necesario()
+
+    def actualizar(self, doc_ids, documentos_tokens, registros=None):
+        """
+        Reemplaza documentos existentes (eliminar + agregar en una sola publicación).
+        """
+        with self._lock:
+            self._eliminar(doc_ids)
+            self._agregar(doc_ids, documentos_tokens, registros)
+            self.generacion += 1
+            self.publicar()
+        self.fusionar_si_necesario()
+
+    def eliminar(self, doc_ids):
+        """
+        Marca documentos como eliminados por doc_id.
+        """
+        with self._lock:
+            self._eliminar(doc_ids)
+            self.generacion += 1
+            self.publicar()
+
+    def fusionar_si_necesario(self):
+        """
+        Lanza la fusión en segundo plano si hay más de max_segmentos segmentos nuevos.
+        """
+        with self._lock:
+            if len(self.segmentos) - 1 <= self.max_segmentos or self._fusionando:
+                return
+            self._fusionando = True
+        threading.Thread(target=self.fusionar, daemon=True).start()
+
+    def fusionar(self):
+        """
+        Fusiona todos los segmentos nuevos en uno. La fusión se calcula fuera del lock; al
+        publicarla se conservan los segmentos agregados mientras tanto. Los puntajes no cambian.
+        """
+        try:
+            with self._lock:
+                nuevos = self.segmentos[1:]
+                vivos = self.vivos.copy()
+            if len(nuevos) < 2:
+                return
+            fusionado = Segmento.fusionar(nuevos, vivos)
+            with self._lock:
+                self.segmentos = [self.segmentos[0], fusionado] + self.segmentos[1 + len(nuevos):]
+                self.publicar()
+        finally:
+            with self._lock:
+                self._fusionando = False
+
+    def ids_de(self, posiciones):
+        """
+        Retorna los doc_id de las posiciones dadas.
+        """
+        return np.array([self.doc_ids[posicion] for posicion in posiciones], dtype=object)
+
+    def puntuar_bm25(self, query_preprocesada, estado=None):
+        """
+        Puntajes BM25 de todas las posiciones con la instantánea dada (o la actual).
+        Las posiciones eliminadas pueden tener puntaje; se filtran con ``estado.vivos``.
+        """
+        estado = estado or self.estado
+        tokens = query_preprocesada.split() if type(query_preprocesada) == str else query_preprocesada
+        ids = self.ids_terminos(tokens)
+        terminos, repeticiones = np.unique(ids[ids < estado.n_terminos], return_counts=True)
+        scores = np.zeros(estado.n_docs)
+        for termino, veces in zip(terminos, repeticiones):
+            for segmento in estado.segmentos:
+                docs, tfs = segmento.posteo(termino)
+                scores[docs] += veces * estado.idf_bm25[termino] * (tfs * (self.k1 + 1) / (tfs + estado.norma_bm25[docs]))
+        return scores
+
+    def puntuar_tfidf(self, query_preprocesada, estado=None):
+        """
+        Similitud de coseno TF-IDF de todas las posiciones con la instantánea dada (o la actual).
+        """
+        estado = estado or self.estado
+        texto = query_preprocesada if type(query_preprocesada) == str else ' '.join(query_preprocesada)
+        ids = self.ids_terminos(self.patron.findall(texto.lower()))
+        terminos, frecuencias = np.unique(ids[ids < estado.n_terminos], return_counts=True)
+        pesos = frecuencias * estado.idf_tfidf[terminos]
+        norma = np.sqrt(np.dot(pesos, pesos))
+        scores = np.zeros(estado.n_docs)
+        if norma == 0:
+            return scores
+        for termino, peso in zip(terminos, pesos / norma):
+            if peso == 0:
+                continue
+            for segmento in estado.segmentos:
+                docs, tfs = segmento.posteo(termino)
+                scores[docs] += peso * tfs * estado.idf_tfidf[termino]
+        return np.divide(scores, estado.norma_tfidf, out=np.zeros_like(scores), where=estado.norma_tfidf > 0)
+
+    def exportar(self):
+        """
+        Construye los modelos completos con solo los documentos vivos, renumerados en orden
+        de posición, para guardarlos como un índice columnar nuevo.
+
+        Retorna
+        -------
+        tuple
+            (IndiceBm25, VectorizadorColumnar, matriz TF-IDF CSC documentos x términos,
+            posiciones originales de los documentos vivos, doc_ids).
+        """
+        with self._lock:
+            estado = self.estado
+            terminos_texto = list(self.terminos)
+        vivos = estado.vivos
+        nueva_posicion = np.cumsum(vivos) - 1
+        terminos = np.concatenate([np.repeat(s.terminos, np.diff(s.indptr)) for s in estado.segmentos])
+        docs = np.concatenate([np.asarray(s.docs, dtype=np.int64) for s in estado.segmentos])
+        tfs = np.concatenate([s.tfs for s in estado.segmentos])
+        conservar = vivos[docs]
+        terminos, docs, tfs = terminos[conservar], nueva_posicion[docs[conservar]], tfs[conservar]
+
+        # Los ids nuevos siguen el orden alfabético de los términos, como en un índice recién construido.
+        presentes = np.unique(terminos)
+        orden_alfabetico = presentes[np.argsort(np.array([terminos_texto[t] for t in presentes], dtype=object))]
+        nuevo_id = np.full(len(terminos_texto), -1, dtype=np.int64)
+        nuevo_id[orden_alfabetico] = np.arange(len(orden_alfabetico))
+        terminos = nuevo_id[terminos]
+        orden = np.lexsort((docs, terminos))
+        terminos, docs, tfs = terminos[orden], docs[orden], tfs[orden]
+        indptr = np.zeros(len(orden_alfabetico) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terminos, minlength=len(orden_alfabetico)), out=indptr[1:])
+
+        posiciones = np.flatnonzero(vivos)
+        vocabulario = {terminos_texto[t]: i for i, t in enumerate(orden_alfabetico)}
+        bm25 = IndiceBm25(vocabulario, indptr, docs.astype(np.int32), tfs.astype(np.int32),
+                          self.doc_len[:len(vivos)][posiciones], k1=self.k1, b=self.b, epsilon=self.epsilon)
+
+        # TF-IDF: solo los términos que cumplen token_pattern, con pesos tf * idf / norma.
+        en_tfidf = self.es_tfidf[orden_alfabetico]
+        terminos_tfidf = orden_alfabetico[en_tfidf]
+        entradas = en_tfidf[terminos]
+        columna = np.cumsum(en_tfidf) - 1
+        docs_tfidf, tfs_tfidf = docs[entradas], tfs[entradas]
+        gids = orden_alfabetico[terminos[entradas]]
+        pesos = tfs_tfidf * estado.idf_tfidf[gids] / estado.norma_tfidf[posiciones][docs_tfidf]
+        indptr_tfidf = np.zeros(len(terminos_tfidf) + 1, dtype=np.int32)
+        np.cumsum(np.bincount(columna[terminos[entradas]], minlength=len(terminos_tfidf)), out=indptr_tfidf[1:])
+        vectorizador = VectorizadorColumnar(VocabularioOrdenado.desde_dict({terminos_texto[t]: i for i, t in enumerate(terminos_tfidf)}),
+                                            estado.idf_tfidf[terminos_tfidf], self.token_pattern)
+        matriz = sparse.csc_matrix((pesos, docs_tfidf.astype(np.int32), indptr_tfidf), shape=(len(posiciones), len(terminos_tfidf)))
+        return bm25, vectorizador, matriz, posiciones, [self.doc_ids[posicion] for posicion in posiciones]
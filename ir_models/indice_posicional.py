@@ -0,0 +1,244 @@
+"""
+Índice posicional para consultas de frase y de proximidad.
+
+Para cada término guarda sus documentos (en el mismo orden término -> documento que las
+listas de posteo de BM25) y, para cada par (término, documento), las posiciones del
+término en el texto preprocesado del documento: ``posiciones[pos_ptr[e]:pos_ptr[e + 1]]``
+son las de la entrada ``e``. Se construye al indexar, sobre el mismo texto que TF-IDF y
+BM25, y se guarda como un modelo más del índice columnar (``indice/posiciones/``).
+
+Operadores de la consulta (ver analizar_consulta):
+
+- ``"a b c"``: frase exacta, los términos en posiciones consecutivas y en ese orden.
+- ``"a b c"~N``: proximidad, los términos en cualquier orden dentro de una ventana con a
+  lo sumo N posiciones de otras palabras.
+
+Un operador nunca recorre los documentos: los candidatos son los documentos que están en
+las listas de posteo de todos sus términos (intersección de listas), y sobre ellos se
+intersecan las listas de posiciones. Como las posiciones son las del texto preprocesado
+(sin palabras vacías), una frase coincide con el texto normalizado igual que la consulta.
+"""
+import re
+import numpy as np
+from .indice_columnar import VocabularioOrdenado, cargar_arreglos, escribir_manifiesto, guardar_arreglos, leer_manifiesto
+
+# Patrón de los operadores: "frase" o "frase"~N.
+PATRON_OPERADOR = re.compile(r'"([^"]+)"(?:~(\d+))?')
+# Las posiciones de un candidato se codifican como candidato * BASE + posición.
+BASE = 1 << 32
+
+def analizar_consulta(query):
+    """
+    Separa los operadores de frase y de proximidad del texto de la consulta.
+
+    Retorna:
+    - Tupla (texto, operadores): el texto sin comillas ni ``~N`` (las palabras de los
+      operadores siguen contando para el ranking) y una lista de (texto del operador,
+      distancia), con distancia None para las frases exactas.
+    """
+    operadores = [(coincidencia.group(1), int(coincidencia.group(2)) if coincidencia.group(2) is not None else None)
+                  for coincidencia in PATRON_OPERADOR.finditer(query)]
+    return PATRON_OPERADOR.sub(lambda coincidencia: coincidencia.group(1), query), operadores
+
+
+class IndicePosicional:
+    """
+    Listas de posteo con posiciones (ver el docstring del módulo).
+
+    Parámetros:
+    - vocabulario: VocabularioOrdenado (id de término = posición en indptr).
+    - indptr: punteros CSR término -> entradas.
+    - docs: documento de cada entrada, ordenados dentro de cada término.
+    - pos_ptr: punteros entrada -> posiciones (tamaño n_entradas + 1).
+    - posiciones: posición de cada aparición, ordenadas dentro de cada entrada.
+    - n_docs: número de documentos del corpus.
+    """
+
+    def __init__(self, vocabulario, indptr, docs, pos_ptr, posiciones, n_docs):
+        self.vocabulario = vocabulario
+        self.indptr = indptr
+        self.docs = docs
+        self.pos_ptr = pos_ptr
+        self.posiciones = posiciones
+        self.n_docs = n_docs
+
+    @classmethod
+    def construir(cls, textos):
+        """
+        Construye el índice a partir de los textos preprocesados (tokens separados por espacios).
+        """
+        documentos = [texto.split() for texto in textos]
+        n_docs = len(documentos)
+        doc_len = np.fromiter((len(doc) for doc in documentos), dtype=np.int64, count=n_docs)
+        tokens = np.array([token for doc in documentos for token in doc], dtype=str)
+        terminos, term_ids = np.unique(tokens, return_inverse=True)
+        posiciones = np.arange(len(tokens)) - np.repeat(np.cumsum(doc_len) - doc_len, doc_len)
+
+        # Orden estable por (término, documento): las posiciones quedan crecientes en cada entrada.
+        claves = term_ids.astype(np.int64) * max(n_docs, 1) + np.repeat(np.arange(n_docs, dtype=np.int64), doc_len)
+        orden = np.argsort(claves, kind="stable")
+        entradas, apariciones = np.unique(claves[orden], return_counts=True)
+        indptr = np.zeros(len(terminos) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(entradas // max(n_docs, 1), minlength=len(terminos)), out=indptr[1:])
+        pos_ptr = np.zeros(len(entradas) + 1, dtype=np.int64)
+        np.cumsum(apariciones, out=pos_ptr[1:])
+        vocabulario = VocabularioOrdenado(np.array([termino.encode("utf-8") for termino in terminos.tolist()], dtype=bytes))
+        return cls(vocabulario, indptr, (entradas % max(n_docs, 1)).astype(np.int32), pos_ptr,
+                   posiciones[orden].astype(np.int32), n_docs)
+
+    def guardar_columnar(self, directorio):
+        """
+        Guarda el índice en un directorio de índice columnar.
+
+        Retorna:
+        - Manifiesto escrito.
+        """
+        manifiesto = {
+            "modelo": "posiciones",
+            "n_docs": self.n_docs,
+            "arreglos": guardar_arreglos(directorio, {"vocabulario": self.vocabulario.terminos, "indptr": self.indptr,
+                                                      "docs": self.docs, "pos_ptr": self.pos_ptr,
+                                                      "posiciones": self.posiciones}),
+        }
+        escribir_manifiesto(directorio, manifiesto)
+        return manifiesto
+
+    @classmethod
+    def cargar(cls, directorio, mmap_mode="r"):
+        """
+        Carga el índice desde un directorio de índice columnar, con los arreglos mapeados.
+        """
+        manifiesto = leer_manifiesto(directorio)
+        arreglos = cargar_arreglos(directorio, manifiesto["arreglos"], mmap_mode)
+        return cls(VocabularioOrdenado(arreglos["vocabulario"]), arreglos["indptr"], arreglos["docs"],
+                   arreglos["pos_ptr"], arreglos["posiciones"], manifiesto["n_docs"])
+
+    def ids(self, tokens):
+        """
+        Ids de término de los tokens, en orden (-1 para los que no están en el vocabulario).
+        """
+        return self.vocabulario.ids(list(tokens))
+
+    def documentos(self, terminos):
+        """
+        Documentos que contienen todos los términos: intersección de sus listas de posteo,
+        empezando por la más corta.
+
+        Retorna:
+        - Arreglo ordenado de posiciones de documento.
+        """
+        terminos = np.unique(terminos)
+        if len(terminos) == 0 or (terminos < 0).any():
+            return np.empty(0, dtype=np.int64)
+        terminos = terminos[np.argsort(self.indptr[terminos + 1] - self.indptr[terminos], kind="stable")]
+        docs = np.asarray(self.docs[self.indptr[terminos[0]]:self.indptr[terminos[0] + 1]], dtype=np.int64)
+        for termino in terminos[1:]:
+            lista = self.docs[self.indptr[termino]:self.indptr[termino + 1]]
+            posiciones = np.searchsorted(lista, docs)
+            presentes = posiciones < len(lista)
+            presentes[presentes] = lista[posiciones[presentes]] == docs[presentes]
+            docs = docs[presentes]
+        return docs
+
+    def ocurrencias(self, termino, candidatos):
+        """
+        Apariciones de un término en los documentos candidatos (ordenados).
+
+        Retorna:
+        - Arreglo ordenado de claves ``indice_candidato * BASE + posición``.
+        """
+        inicio, fin = self.indptr[termino], self.indptr[termino + 1]
+        lista = self.docs[inicio:fin]
+        entradas = np.searchsorted(lista, candidatos)
+        presentes = entradas < len(lista)
+        presentes[presentes] = lista[entradas[presentes]] == candidatos[presentes]
+        entradas = inicio + entradas[presentes]
+        desde = self.pos_ptr[entradas]
+        largos = self.pos_ptr[entradas + 1] - desde
+        indices = np.repeat(desde - np.cumsum(largos) + largos, largos) + np.arange(largos.sum())
+        return np.repeat(np.flatnonzero(presentes), largos) * BASE + self.posiciones[indices]
+
+    def frase(self, terminos, candidatos):
+        """
+        Cuenta las apariciones de la frase (términos en posiciones consecutivas, en orden)
+        en cada candidato, intersecando las posiciones de cada término desplazadas por su
+        lugar en la frase.
+
+        Retorna:
+        - Arreglo con el número de apariciones por candidato.
+        """
+        candidatos = np.asarray(candidatos, dtype=np.int64)
+        if len(terminos) == 0 or (np.asarray(terminos) < 0).any():
+            return np.zeros(len(candidatos), dtype=np.int64)
+        claves = None
+        for lugar, termino in enumerate(terminos):
+            # Desplazadas al inicio de la frase (+ len(terminos) para no quedar negativas).
+            desplazadas = self.ocurrencias(termino, candidatos) + (len(terminos) - lugar)
+            claves = desplazadas if claves is None else np.intersect1d(claves, desplazadas, assume_unique=True)
+        return np.bincount(claves // BASE, minlength=len(candidatos))
+
+    def ventana_minima(self, terminos, candidatos):
+        """
+        Ancho (en posiciones) de la menor ventana de cada candidato que contiene todos los
+        términos distintos que aparecen en él. Para cada aparición se toma, de cada término,
+        su última aparición anterior en el mismo documento: la ventana que termina ahí
+        empieza en la menor de ellas.
+
+        Retorna:
+        - Tupla (ancho de la ventana, inf si el candidato no tiene ningún término; número
+          de términos distintos presentes).
+        """
+        candidatos = np.asarray(candidatos, dtype=np.int64)
+        terminos = np.unique(np.asarray(terminos, dtype=np.int64))
+        listas = [self.ocurrencias(termino, candidatos) for termino in terminos[terminos >= 0]]
+        presentes = np.zeros(len(candidatos), dtype=np.int64)
+        ventana = np.full(len(candidatos), np.inf)
+        if not listas:
+            return ventana, presentes
+        for claves in listas:
+            presentes[np.unique(claves // BASE)] += 1
+        eventos = np.concatenate(listas)
+        candidato = eventos // BASE
+        cubiertos = np.zeros(len(eventos), dtype=np.int64)
+        izquierda = eventos % BASE
+        for claves in listas:
+            anterior = np.searchsorted(claves, eventos, side="right") - 1
+            valido = anterior >= 0
+            valido[valido] = claves[anterior[valido]] // BASE == candidato[valido]
+            cubiertos += valido
+            izquierda[valido] = np.minimum(izquierda[valido], claves[anterior[valido]] % BASE)
+        completos = cubiertos == presentes[candidato]
+        np.minimum.at(ventana, candidato[completos], (eventos % BASE - izquierda + 1)[completos])
+        return ventana, presentes
+
+    def cercania(self, terminos, candidatos):
+        """
+        Señal de proximidad de los términos de una consulta en cada candidato:
+        ``términos presentes / ancho de la menor ventana que los contiene`` (1 si aparecen
+        todos seguidos), o 0 si el candidato tiene menos de dos términos distintos.
+        """
+        ventana, presentes = self.ventana_minima(terminos, candidatos)
+        return np.where(presentes >= 2, presentes / ventana, 0.0)
+
+    def filtrar(self, operadores):
+        """
+        Documentos que cumplen todos los operadores de la consulta.
+
+        Parámetros:
+        - operadores: lista de (ids de término en orden, distancia); distancia None es una
+          frase exacta y un entero N, proximidad con a lo sumo N posiciones intermedias.
+
+        Retorna:
+        - Arreglo ordenado de posiciones de documento.
+        """
+        terminos = [np.asarray(ids, dtype=np.int64) for ids, _ in operadores]
+        candidatos = self.documentos(np.concatenate(terminos) if terminos else np.empty(0, dtype=np.int64))
+        for ids, (_, distancia) in zip(terminos, operadores):
+            if len(candidatos) == 0:
+                break
+            if distancia is None:
+                candidatos = candidatos[self.frase(ids, candidatos) > 0]
+            else:
+                ventana, _ = self.ventana_minima(ids, candidatos)
+                candidatos = candidatos[ventana <= len(np.unique(ids)) + distancia]
+        return candidatos
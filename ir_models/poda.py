@@ -0,0 +1,249 @@
+import numpy as np
+
+TAM_BLOQUE = 128
+
+def top_k_denso(scores, k):
+    """
+    Obtiene los k índices de mayor puntaje de un arreglo denso sin ordenarlo completo
+    (``np.argpartition`` + orden de los k seleccionados).
+
+    Parámetros:
+    - scores: arreglo 1D de puntajes.
+    - k: número de posiciones a retornar.
+
+    Retorna:
+    - Arreglo de índices ordenados por puntaje descendente (empates por índice ascendente).
+    """
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    umbral = scores[np.argpartition(-scores, k - 1)[k - 1]]
+    # argpartition deja cualquiera de los empatados con el k-ésimo puntaje; se toman los de
+    # menor índice para que el resultado no dependa de cómo se parte el arreglo.
+    mayores = np.flatnonzero(scores > umbral)
+    indices = np.concatenate([mayores, np.flatnonzero(scores == umbral)[:k - len(mayores)]])
+    return indices[np.lexsort((indices, -scores[indices]))]
+
+def top_k_candidatos(docs, scores, k):
+    """
+    Selecciona los k mejores documentos de un conjunto disperso de candidatos.
+
+    Parámetros:
+    - docs: ids de documento candidatos.
+    - scores: puntaje de cada candidato.
+    - k: número de documentos a retornar.
+
+    Retorna:
+    - Tupla (docs, scores) con los k mejores, ordenados por puntaje descendente.
+    """
+    seleccion = top_k_denso(scores, k)
+    orden = np.lexsort((docs[seleccion], -scores[seleccion]))
+    seleccion = seleccion[orden]
+    return docs[seleccion], scores[seleccion]
+
+def acumular(docs, aportes):
+    """
+    Suma los aportes de varias listas de posteo por documento sin crear un arreglo del
+    tamaño del corpus.
+
+    Retorna:
+    - Tupla (docs únicos ordenados, puntaje acumulado de cada uno).
+    """
+    docs_unicos, posiciones = np.unique(docs, return_inverse=True)
+    return docs_unicos, np.bincount(posiciones, weights=aportes, minlength=len(docs_unicos))
+
+def completar_top_k(docs, scores, k, n_docs):
+    """
+    Completa un top-k disperso con documentos de puntaje 0 (los de menor índice que no
+    estén ya en el resultado), para que siempre se retornen min(k, n_docs) documentos
+    como en el ranking completo del corpus.
+    """
+    faltantes = min(k, n_docs) - len(docs)
+    if faltantes <= 0:
+        return docs, scores
+    relleno = np.setdiff1d(np.arange(len(docs) + faltantes), docs)[:faltantes]
+    return np.concatenate([docs, relleno]), np.concatenate([scores, np.zeros(faltantes)])
+
+def top_k_filas(scores, k, n_docs):
+    """
+    Selecciona el top-k de cada fila de una matriz dispersa de puntajes
+    (consultas x documentos), completando con documentos de puntaje 0 si es necesario.
+    Las filas con puntajes negativos (BM25 con idf negativo) se seleccionan densas, porque
+    los documentos fuera de la fila (puntaje 0) pueden superarlos.
+
+    Parámetros:
+    - scores: matriz scipy.sparse de forma (n_consultas, n_docs).
+    - k: número de documentos por consulta.
+    - n_docs: número de documentos del corpus.
+
+    Retorna:
+    - Tupla (indices, scores) de arreglos de forma (n_consultas, min(k, n_docs)).
+    """
+    scores = scores.tocsr()
+    k_filas = min(k, n_docs)
+    indices = np.zeros((scores.shape[0], k_filas), dtype=np.int64)
+    valores = np.zeros((scores.shape[0], k_filas))
+    for fila in range(scores.shape[0]):
+        inicio, fin = scores.indptr[fila], scores.indptr[fila + 1]
+        if (scores.data[inicio:fin] < 0).any():
+            densa = scores[fila].toarray().ravel()
+            indices[fila] = top_k_denso(densa, k)
+            valores[fila] = densa[indices[fila]]
+            continue
+        docs, scores_fila = top_k_candidatos(scores.indices[inicio:fin], scores.data[inicio:fin], k)
+        indices[fila], valores[fila] = completar_top_k(docs, scores_fila, k, n_docs)
+    return indices, valores
+
+
+class MaximosPorBloque:
+    """
+    Cotas superiores por bloque de las listas de posteo (Block-Max), usadas por la
+    recuperación top-k con poda dinámica.
+
+    Cada lista de posteo se divide en bloques consecutivos de ``tam_bloque`` entradas;
+    para cada bloque se guarda el primer y el último documento y el valor máximo del
+    bloque. Con ``tam_bloque=None`` cada término tiene un único bloque, es decir, la
+    cota por término de WAND.
+
+    Parámetros:
+    - indptr: punteros CSR de las listas (término -> posiciones en docs/valores).
+    - docs: ids de documento ordenados dentro de cada lista.
+    - valores: valor no negativo de cada entrada; el aporte de un término a un documento
+      es ``peso_termino * valor``.
+    - tam_bloque: número de entradas por bloque.
+    """
+
+    def __init__(self, indptr, docs, valores, tam_bloque=TAM_BLOQUE):
+        largos = np.diff(indptr)
+        if tam_bloque is None:
+            tam_bloque = max(int(largos.max(initial=0)), 1)
+        n_bloques = -(-largos // tam_bloque)
+        self.ptr = np.zeros(len(largos) + 1, dtype=np.int64)
+        np.cumsum(n_bloques, out=self.ptr[1:])
+
+        orden = np.arange(self.ptr[-1]) - np.repeat(self.ptr[:-1], n_bloques)
+        self.inicio = np.repeat(indptr[:-1], n_bloques) + orden * tam_bloque
+        self.fin = np.minimum(self.inicio + tam_bloque, np.repeat(indptr[1:], n_bloques))
+        self.primer_doc = docs[self.inicio]
+        self.ultimo_doc = docs[self.fin - 1]
+        self.maximo = np.maximum.reduceat(valores, self.inicio) if len(self.inicio) else np.empty(0)
+
+
+def puntuar_docs(indptr, docs, valores, terminos, pesos, candidatos):
+    """
+    Calcula el puntaje exacto de un conjunto pequeño de documentos buscándolos por
+    bisección en las listas de posteo de los términos de la consulta.
+    """
+    scores = np.zeros(len(candidatos))
+    for termino, peso in zip(terminos, pesos):
+        inicio, fin = indptr[termino], indptr[termino + 1]
+        posiciones = inicio + np.searchsorted(docs[inicio:fin], candidatos)
+        encontrados = posiciones < fin
+        encontrados[encontrados] = docs[posiciones[encontrados]] == candidatos[encontrados]
+        scores[encontrados] += peso * valores[posiciones[encontrados]]
+    return scores
+
+def top_k_disperso(indptr, docs, valores, terminos, pesos, k):
+    """
+    Recupera los k documentos de mayor puntaje ``sum(peso_t * valor_td)`` recorriendo
+    completas solo las listas de posteo de los términos de la consulta. Los puntajes se
+    acumulan sobre los documentos candidatos, sin arreglos del tamaño del corpus.
+
+    Retorna:
+    - Tupla (docs, scores) con a lo sumo k documentos de puntaje positivo, ordenados.
+    """
+    if len(terminos) == 0 or k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    listas_docs = []
+    aportes = []
+    for termino, peso in zip(terminos, pesos):
+        inicio, fin = indptr[termino], indptr[termino + 1]
+        listas_docs.append(docs[inicio:fin])
+        aportes.append(peso * valores[inicio:fin])
+    candidatos, scores = acumular(np.concatenate(listas_docs), np.concatenate(aportes))
+    return top_k_candidatos(candidatos, scores, k)
+
+def intervalos_vivos(primer_doc, ultimo_doc, cotas, umbral):
+    """
+    Corta los rangos de documentos de los bloques de una consulta en intervalos
+    elementales; la cota de un intervalo es la suma de las cotas de los bloques que lo
+    cubren y queda vivo si alcanza el umbral.
+
+    Retorna:
+    - Tupla (bordes, vivo, sobreviven): inicio de cada intervalo, si está vivo (el
+      intervalo i es ``[bordes[i], bordes[i + 1])``) y qué bloques tocan alguno vivo.
+    """
+    bordes = np.unique(np.concatenate([primer_doc, ultimo_doc + 1]))
+    delta = np.zeros(len(bordes) + 1)
+    np.add.at(delta, np.searchsorted(bordes, primer_doc), cotas)
+    np.add.at(delta, np.searchsorted(bordes, ultimo_doc + 1), -cotas)
+    # Tolerancia relativa para que el redondeo de la suma acumulada no descarte empates.
+    vivo = np.cumsum(delta)[:-1] >= umbral * (1 - 1e-9)
+    vivos_acumulados = np.concatenate([[0], np.cumsum(vivo)])
+    sobreviven = (vivos_acumulados[np.searchsorted(bordes, ultimo_doc + 1)]
+                  - vivos_acumulados[np.searchsorted(bordes, primer_doc)]) > 0
+    return bordes, vivo, sobreviven
+
+def top_k_con_poda(indptr, docs, valores, maximos, terminos, pesos, k):
+    """
+    Recupera los k documentos de mayor puntaje ``sum(peso_t * valor_td)`` usando cotas
+    superiores por bloque (Block-Max WAND) para no puntuar documentos que no pueden
+    entrar al top-k.
+
+    Es una versión vectorizada por conjuntos en lugar del recorrido documento a documento
+    de WAND clásico:
+
+    1. Se puntúan exactamente los documentos del mejor bloque de cada término; el k-ésimo
+       mejor puntaje es un umbral inicial válido.
+    2. Los rangos de documentos de los bloques de la consulta se cortan en intervalos; la
+       cota de un intervalo es la suma de los máximos de los bloques que lo cubren.
+    3. Solo se leen los bloques que tocan algún intervalo con cota >= umbral y, dentro de
+       ellos, solo las entradas de esos intervalos. Un documento con cota menor al umbral
+       nunca puede superar al k-ésimo documento ya encontrado.
+
+    Parámetros:
+    - indptr, docs, valores: listas de posteo en CSR (ver MaximosPorBloque).
+    - maximos: MaximosPorBloque calculado sobre las mismas listas.
+    - terminos: ids de los términos de la consulta (sin repetir).
+    - pesos: peso no negativo de cada término en la consulta.
+    - k: número de documentos a recuperar.
+
+    Retorna:
+    - Tupla (docs, scores) con a lo sumo k documentos de puntaje positivo, ordenados.
+    """
+    terminos = np.asarray(terminos, dtype=np.int64)
+    pesos = np.asarray(pesos, dtype=np.float64)
+    if len(terminos) == 0 or k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+
+    n_bloques = maximos.ptr[terminos + 1] - maximos.ptr[terminos]
+    bloques = np.concatenate([np.arange(maximos.ptr[t], maximos.ptr[t + 1]) for t in terminos])
+    cotas = np.repeat(pesos, n_bloques) * maximos.maximo[bloques]
+    primer_doc = maximos.primer_doc[bloques]
+    ultimo_doc = maximos.ultimo_doc[bloques]
+
+    # 1. Umbral inicial con el mejor bloque de cada término.
+    fin_bloques = np.cumsum(n_bloques)
+    mejores = [bloques[i:j][np.argmax(cotas[i:j])] for i, j in zip(fin_bloques - n_bloques, fin_bloques) if j > i]
+    if not mejores:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    semillas = np.unique(np.concatenate([docs[maximos.inicio[b]:maximos.fin[b]] for b in mejores]))
+    scores_semillas = puntuar_docs(indptr, docs, valores, terminos, pesos, semillas)
+    umbral = 0.0
+    if len(semillas) >= k:
+        umbral = np.partition(scores_semillas, len(semillas) - k)[len(semillas) - k]
+
+    # 2-3. Solo se leen los bloques que cubren algún intervalo vivo.
+    bordes, vivo, sobreviven = intervalos_vivos(primer_doc, ultimo_doc, cotas, umbral)
+    inicios = maximos.inicio[bloques[sobreviven]]
+    largos = maximos.fin[bloques[sobreviven]] - inicios
+    posiciones = np.repeat(inicios - np.cumsum(largos) + largos, largos) + np.arange(largos.sum())
+    pesos_entrada = np.repeat(np.repeat(pesos, n_bloques)[sobreviven], largos)
+
+    docs_leidos = docs[posiciones]
+    en_vivo = vivo[np.searchsorted(bordes, docs_leidos, side="right") - 1]
+    candidatos, scores = acumular(docs_leidos[en_vivo], pesos_entrada[en_vivo] * valores[posiciones[en_vivo]])
+    candidatos = np.concatenate([candidatos, semillas])
+    scores = np.concatenate([scores, scores_semillas])
+    candidatos, unicos = np.unique(candidatos, return_index=True)
+    return top_k_candidatos(candidatos, scores[unicos], k)
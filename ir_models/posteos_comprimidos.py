@@ -0,0 +1,453 @@
+"""
+Listas de posteo comprimidas por bloques.
+
+Cada lista de posteo (término -> documentos) se divide en bloques de ``tam_bloque``
+entradas, los mismos bloques que usa la poda Block-Max (ver poda.MaximosPorBloque). Por
+bloque se guardan:
+
+- punteros de salto: primer y último documento del bloque, para saber sin decodificar qué
+  bloques pueden contener un documento y cuáles no tocan ningún intervalo vivo de la poda;
+- los documentos como diferencias con el anterior (el primero es ``primer_doc``),
+  empaquetadas con el mínimo número de bits que necesita la mayor diferencia del bloque;
+- la carga de cada entrada, también empaquetada: la frecuencia del término (BM25, sin
+  pérdida) o el peso TF-IDF cuantizado a ``bits`` bits relativo al máximo del bloque;
+- el valor máximo del bloque, que es la cota superior de la poda.
+
+Cada bloque empieza en un byte, así que se ubica con un desplazamiento y se decodifica con
+operaciones de NumPy sobre todas sus entradas a la vez (lectura de 8 bytes, corrimiento y
+máscara), sin recorrer bits en Python. Las funciones puntuar_docs y top_k recuperan sobre
+las listas comprimidas decodificando solo los bloques necesarios.
+"""
+import numpy as np
+from .poda import TAM_BLOQUE, acumular, intervalos_vivos, top_k_candidatos, top_k_denso
+
+TIPOS = ("frecuencias", "pesos")
+# Arreglos que definen las listas; las de pesos tienen además "escala".
+ARREGLOS = ("ptr", "entradas", "primer_doc", "ultimo_doc", "maximo", "bits_docs", "pos_docs", "flujo_docs",
+            "bits_carga", "pos_carga", "flujo_carga")
+
+def _bits_necesarios(valores):
+    """
+    Número de bits para representar cada entero no negativo (0 para el valor 0).
+    """
+    restante = np.asarray(valores, dtype=np.uint64).copy()
+    bits = np.zeros(len(restante), dtype=np.uint8)
+    while restante.any():
+        bits += restante > 0
+        restante >>= np.uint64(1)
+    return bits
+
+def _empaquetar(valores, bloque_de_entrada, orden_en_bloque, bits_bloque, tam_lote=1 << 22):
+    """
+    Empaqueta enteros no negativos bloque a bloque: el bloque b ocupa
+    ``ceil(n_b * bits_b / 8)`` bytes desde un byte propio y su entrada i los bits
+    ``[i * bits_b, (i + 1) * bits_b)`` (orden little-endian).
+
+    Retorna:
+    - Tupla (flujo uint8 con 8 bytes de relleno al final, byte de inicio de cada bloque).
+    """
+    n_bloques = len(bits_bloque)
+    largos = np.bincount(bloque_de_entrada, minlength=n_bloques)
+    desplazamientos = np.zeros(n_bloques + 1, dtype=np.int64)
+    np.cumsum((largos * bits_bloque.astype(np.int64) + 7) // 8, out=desplazamientos[1:])
+    flujo = np.zeros(desplazamientos[-1] + 8, dtype=np.uint8)
+    # Por lotes de entradas para acotar la memoria temporal (un byte por bit); un bloque
+    # partido entre dos lotes se completa con el OR del segundo.
+    for inicio in range(0, len(valores), tam_lote):
+        fin = min(inicio + tam_lote, len(valores))
+        bloques = bloque_de_entrada[inicio:fin]
+        bits = bits_bloque[bloques].astype(np.int64)
+        primer_byte, ultimo_byte = desplazamientos[bloques[0]], desplazamientos[bloques[-1] + 1]
+        primer_bit = (desplazamientos[bloques] - primer_byte) * 8 + orden_en_bloque[inicio:fin] * bits
+        plano = np.zeros((ultimo_byte - primer_byte) * 8, dtype=np.uint8)
+        lote = np.asarray(valores[inicio:fin], dtype=np.uint64)
+        for j in range(int(bits.max())):
+            activos = bits > j
+            plano[primer_bit[activos] + j] = (lote[activos] >> np.uint64(j)) & np.uint64(1)
+        flujo[primer_byte:ultimo_byte] |= np.packbits(plano, bitorder="little")
+    return flujo, desplazamientos[:-1]
+
+def _bloques(indptr, tam_bloque):
+    """
+    Divide cada lista de posteo en bloques consecutivos de tam_bloque entradas (como
+    poda.MaximosPorBloque).
+
+    Retorna:
+    - Tupla (ptr, inicio, fin): bloques de cada término y rango de entradas de cada bloque.
+    """
+    largos = np.diff(indptr)
+    n_bloques = -(-largos // tam_bloque)
+    ptr = np.zeros(len(largos) + 1, dtype=np.int64)
+    np.cumsum(n_bloques, out=ptr[1:])
+    orden = np.arange(ptr[-1]) - np.repeat(ptr[:-1], n_bloques)
+    inicio = np.repeat(indptr[:-1], n_bloques) + orden * tam_bloque
+    fin = np.minimum(inicio + tam_bloque, np.repeat(indptr[1:], n_bloques))
+    return ptr, inicio, fin
+
+def _palabras(flujo):
+    """
+    Vista del flujo como palabras de 64 bits (little-endian) que empiezan en cada byte,
+    superpuestas: ``_palabras(flujo)[i]`` son los bytes ``flujo[i:i + 8]``. No copia el
+    flujo, que puede estar mapeado en memoria.
+    """
+    return np.ndarray((len(flujo) - 7,), dtype="<u8", buffer=flujo, strides=(1,))
+
+def _desempaquetar(palabras, primer_bit, bits):
+    """
+    Lee enteros de ``bits`` bits que empiezan en el bit ``primer_bit`` del flujo (uno por
+    entrada, vectorizado: una lectura de 64 bits, un corrimiento y una máscara).
+    """
+    mascara = (np.uint64(1) << bits.astype(np.uint64)) - np.uint64(1)
+    return (palabras[primer_bit >> 3] >> (primer_bit & 7).astype(np.uint64)) & mascara
+
+
+class ListasComprimidas:
+    """
+    Listas de posteo comprimidas por bloques con punteros de salto (ver el docstring del
+    módulo). Se construyen con desde_frecuencias (BM25) o desde_pesos (TF-IDF) y se
+    guardan y cargan como arreglos del índice columnar (arreglos / desde_arreglos).
+
+    Atributos por bloque: ``primer_doc``, ``ultimo_doc``, ``maximo``, ``entradas`` (posición
+    de su primera entrada en la lista sin comprimir), ``bits_docs``/``pos_docs`` y
+    ``bits_carga``/``pos_carga`` (ancho en bits y byte de inicio en cada flujo) y, para los
+    pesos, ``escala``. ``ptr[t]:ptr[t + 1]`` son los bloques del término t.
+    """
+
+    def __init__(self, arreglos, tipo, tam_bloque=TAM_BLOQUE, bits=None, n_docs=None):
+        if tipo not in TIPOS:
+            raise ValueError(f"Tipo de carga no soportado: {tipo}")
+        self.tipo = tipo
+        self.tam_bloque = tam_bloque
+        self.bits = bits
+        self.n_docs = n_docs
+        for nombre, arreglo in arreglos.items():
+            setattr(self, nombre, arreglo)
+        self.niveles = (1 << bits) - 1 if bits else None
+        self._palabras_docs = _palabras(self.flujo_docs)
+        self._palabras_carga = _palabras(self.flujo_carga)
+
+    @classmethod
+    def _construir(cls, indptr, docs, carga, tam_bloque):
+        """
+        Arma los bloques, codifica los documentos por diferencias y empaqueta documentos y carga.
+        """
+        indptr = np.asarray(indptr, dtype=np.int64)
+        docs = np.asarray(docs, dtype=np.int64)
+        ptr, inicio, fin = _bloques(indptr, tam_bloque)
+        bloque_de_entrada = np.repeat(np.arange(ptr[-1]), fin - inicio)
+        orden_en_bloque = np.arange(len(docs)) - np.repeat(inicio, fin - inicio)
+        diferencias = np.diff(docs, prepend=0)
+        diferencias[inicio] = 0
+        bits_docs = np.zeros(ptr[-1], dtype=np.uint8)
+        bits_carga = np.zeros(ptr[-1], dtype=np.uint8)
+        if len(docs):
+            bits_docs = np.maximum.reduceat(_bits_necesarios(diferencias), inicio)
+            bits_carga = np.maximum.reduceat(_bits_necesarios(carga), inicio)
+        flujo_docs, pos_docs = _empaquetar(diferencias, bloque_de_entrada, orden_en_bloque, bits_docs)
+        flujo_carga, pos_carga = _empaquetar(carga, bloque_de_entrada, orden_en_bloque, bits_carga)
+        entradas = np.append(inicio, indptr[-1])
+        tipo_doc = np.int32 if len(docs) == 0 or docs.max() < 2 ** 31 else np.int64
+        return {
+            "ptr": ptr,
+            "entradas": entradas,
+            "primer_doc": docs[inicio].astype(tipo_doc),
+            "ultimo_doc": docs[fin - 1].astype(tipo_doc),
+            "bits_docs": bits_docs,
+            "pos_docs": pos_docs,
+            "flujo_docs": flujo_docs,
+            "bits_carga": bits_carga,
+            "pos_carga": pos_carga,
+            "flujo_carga": flujo_carga,
+        }
+
+    @classmethod
+    def desde_frecuencias(cls, indptr, docs, tfs, valores, n_docs, tam_bloque=TAM_BLOQUE):
+        """
+        Comprime listas BM25: la carga es la frecuencia del término (sin pérdida, se guarda
+        tf - 1) y el máximo de cada bloque es el de ``valores`` (el aporte BM25 sin el IDF).
+        """
+        arreglos = cls._construir(indptr, docs, np.asarray(tfs, dtype=np.int64) - 1, tam_bloque)
+        valores = np.asarray(valores, dtype=np.float64)
+        arreglos["maximo"] = np.maximum.reduceat(valores, arreglos["entradas"][:-1]) if len(valores) else np.empty(0)
+        return cls(arreglos, "frecuencias", tam_bloque, n_docs=n_docs)
+
+    @classmethod
+    def desde_pesos(cls, indptr, docs, pesos, n_docs, bits=8, tam_bloque=TAM_BLOQUE):
+        """
+        Comprime listas de pesos no negativos (TF-IDF) cuantizando cada peso a ``bits`` bits
+        relativo al máximo de su bloque: ``q = round(peso / maximo * (2**bits - 1))``. El
+        error absoluto de cada peso es a lo sumo ``maximo / (2 * (2**bits - 1))``.
+        """
+        pesos = np.asarray(pesos, dtype=np.float64)
+        niveles = (1 << bits) - 1
+        indptr = np.asarray(indptr, dtype=np.int64)
+        _, inicio, fin = _bloques(indptr, tam_bloque)
+        escala = np.maximum.reduceat(pesos, inicio) if len(pesos) else np.empty(0)
+        bloque_de_entrada = np.repeat(np.arange(len(inicio)), fin - inicio)
+        escala_entrada = escala[bloque_de_entrada]
+        cuantizados = np.rint(np.divide(pesos, escala_entrada, out=np.zeros_like(pesos), where=escala_entrada > 0) * niveles)
+        arreglos = cls._construir(indptr, docs, cuantizados.astype(np.int64), tam_bloque)
+        arreglos["escala"] = escala
+        listas = cls(arreglos, "pesos", tam_bloque, bits, n_docs)
+        # La cota de cada bloque es el máximo de los pesos ya decodificados.
+        decodificados = listas.decodificar_carga(cuantizados.astype(np.uint64), bloque_de_entrada)
+        listas.maximo = np.maximum.reduceat(decodificados, inicio) if len(pesos) else np.empty(0)
+        return listas
+
+    def arreglos(self):
+        """
+        Arreglos que definen las listas, para guardarlos en el índice columnar.
+        """
+        nombres = ARREGLOS + ("escala",) if self.tipo == "pesos" else ARREGLOS
+        return {nombre: getattr(self, nombre) for nombre in nombres}
+
+    def parametros(self):
+        """
+        Parámetros para el manifiesto (ver desde_arreglos).
+        """
+        return {"tipo": self.tipo, "tam_bloque": self.tam_bloque, "bits": self.bits, "n_docs": self.n_docs}
+
+    @classmethod
+    def desde_arreglos(cls, arreglos, tipo, tam_bloque=TAM_BLOQUE, bits=None, n_docs=None):
+        """
+        Reconstruye las listas a partir de los arreglos de un índice columnar (que puede
+        tener otros arreglos del modelo) y de los parámetros del manifiesto.
+        """
+        nombres = ARREGLOS + ("escala",) if tipo == "pesos" else ARREGLOS
+        return cls({nombre: arreglos[nombre] for nombre in nombres}, tipo, tam_bloque, bits, n_docs)
+
+    def bloques_termino(self, termino):
+        return np.arange(self.ptr[termino], self.ptr[termino + 1])
+
+    def decodificar_carga(self, cuantizados, bloques):
+        """
+        Convierte la carga empaquetada de cada entrada (del bloque indicado) a su valor: la
+        frecuencia del término o el peso TF-IDF.
+        """
+        if self.tipo == "frecuencias":
+            return cuantizados.astype(np.int64) + 1
+        return cuantizados.astype(np.float64) * (self.escala[bloques] / self.niveles)
+
+    def decodificar_docs(self, bloques):
+        """
+        Decodifica solo los documentos de varios bloques a la vez.
+
+        Parámetros:
+        - bloques: ids de bloque (en orden; los de un término, ascendentes).
+
+        Retorna:
+        - Tupla (docs, bloque de cada entrada, orden de cada entrada en su bloque); las dos
+          últimas sirven para leer después la carga de algunas entradas (ver leer_carga).
+        """
+        bloques = np.asarray(bloques, dtype=np.int64)
+        largos = self.entradas[bloques + 1] - self.entradas[bloques]
+        bloque_de_entrada = np.repeat(bloques, largos)
+        comienzos = np.cumsum(largos) - largos
+        orden = np.arange(len(bloque_de_entrada)) - np.repeat(comienzos, largos)
+        if len(bloque_de_entrada) == 0:
+            return np.empty(0, dtype=np.int64), bloque_de_entrada, orden
+
+        bits = self.bits_docs[bloque_de_entrada].astype(np.int64)
+        diferencias = _desempaquetar(self._palabras_docs, self.pos_docs[bloque_de_entrada] * 8 + orden * bits, bits)
+        # Suma acumulada dentro de cada bloque (su primera diferencia es 0) desde su primer documento.
+        acumuladas = np.cumsum(diferencias.astype(np.int64))
+        docs = acumuladas - np.repeat(acumuladas[comienzos] - self.primer_doc[bloques], largos)
+        return docs, bloque_de_entrada, orden
+
+    def leer_carga(self, bloque_de_entrada, orden):
+        """
+        Decodifica la carga de las entradas indicadas (ver decodificar_docs).
+        """
+        bits = self.bits_carga[bloque_de_entrada].astype(np.int64)
+        carga = _desempaquetar(self._palabras_carga, self.pos_carga[bloque_de_entrada] * 8 + orden * bits, bits)
+        return self.decodificar_carga(carga, bloque_de_entrada)
+
+    def decodificar(self, bloques):
+        """
+        Decodifica varios bloques a la vez.
+
+        Retorna:
+        - Tupla (docs, carga) con las entradas de los bloques concatenadas.
+        """
+        docs, bloque_de_entrada, orden = self.decodificar_docs(bloques)
+        return docs, self.leer_carga(bloque_de_entrada, orden)
+
+    def decodificar_todo(self):
+        """
+        Decodifica todas las listas (para exportarlas o para las operaciones por lotes).
+
+        Retorna:
+        - Tupla (indptr, docs, carga) en CSR.
+        """
+        docs, carga = self.decodificar(np.arange(len(self.entradas) - 1))
+        indptr = self.entradas[self.ptr]
+        return indptr, docs, carga
+
+    def bytes_por_termino(self):
+        """
+        Bytes que ocupa cada término: sus flujos de documentos y de carga y los metadatos
+        de sus bloques.
+        """
+        n_bloques = len(self.entradas) - 1
+        fin_docs = np.append(self.pos_docs[1:], len(self.flujo_docs) - 8) if n_bloques else np.empty(0, dtype=np.int64)
+        fin_carga = np.append(self.pos_carga[1:], len(self.flujo_carga) - 8) if n_bloques else np.empty(0, dtype=np.int64)
+        por_bloque = (fin_docs - self.pos_docs) + (fin_carga - self.pos_carga) + self.bytes_por_bloque()
+        acumulado = np.concatenate([[0], np.cumsum(por_bloque)])
+        return acumulado[self.ptr[1:]] - acumulado[self.ptr[:-1]] + self.ptr.itemsize
+
+    def bytes_por_bloque(self):
+        """
+        Bytes de metadatos de cada bloque (punteros de salto, anchos, desplazamientos, cotas).
+        """
+        return sum(arreglo.itemsize for nombre, arreglo in self.arreglos().items()
+                   if nombre not in ("ptr", "flujo_docs", "flujo_carga"))
+
+    def nbytes(self):
+        """
+        Tamaño total de los arreglos de las listas.
+        """
+        return sum(arreglo.nbytes for arreglo in self.arreglos().values())
+
+
+def valor_carga(docs, carga):
+    """
+    Valoración de las listas de pesos: el valor de cada entrada es su peso.
+    """
+    return carga
+
+def puntuar(listas, terminos, pesos, valorar, n_docs):
+    """
+    Calcula el puntaje ``sum(peso_t * valorar(docs, carga))`` de todos los documentos
+    decodificando completas las listas de los términos de la consulta.
+
+    Retorna:
+    - Arreglo denso de puntajes (uno por documento).
+    """
+    scores = np.zeros(n_docs)
+    for termino, peso in zip(terminos, pesos):
+        docs, carga = listas.decodificar(listas.bloques_termino(termino))
+        scores[docs] += peso * valorar(docs, carga)
+    return scores
+
+def puntuar_docs(listas, terminos, pesos, valorar, candidatos):
+    """
+    Calcula el puntaje exacto ``sum(peso_t * valorar(docs, carga))`` de un conjunto pequeño
+    de documentos. Con los punteros de salto solo se decodifican, por término, los bloques
+    cuyo rango puede contener algún candidato.
+
+    Parámetros:
+    - listas: ListasComprimidas.
+    - terminos, pesos: ids de los términos de la consulta y su peso.
+    - valorar: función (docs, carga) -> valor de cada entrada.
+    - candidatos: posiciones de documento, ordenadas.
+    """
+    candidatos = np.asarray(candidatos, dtype=np.int64)
+    scores = np.zeros(len(candidatos))
+    for termino, peso in zip(terminos, pesos):
+        inicio, fin = listas.ptr[termino], listas.ptr[termino + 1]
+        bloques = inicio + np.searchsorted(listas.ultimo_doc[inicio:fin], candidatos)
+        bloques = np.unique(bloques[bloques < fin])
+        docs, carga = listas.decodificar(bloques)
+        posiciones = np.searchsorted(docs, candidatos)
+        encontrados = posiciones < len(docs)
+        encontrados[encontrados] = docs[posiciones[encontrados]] == candidatos[encontrados]
+        scores[encontrados] += peso * valorar(docs, carga)[posiciones[encontrados]]
+    return scores
+
+def top_k(listas, terminos, pesos, valorar, k, poda=True):
+    """
+    Recupera los k documentos de mayor puntaje ``sum(peso_t * valorar(docs, carga))``
+    decodificando bloque a bloque, con la misma poda Block-Max que poda.top_k_con_poda:
+
+    1. Se decodifica el mejor bloque de cada término; la suma parcial de cada documento
+       de esos bloques es una cota inferior de su puntaje y el k-ésimo mejor es el umbral.
+    2. Solo se decodifican los bloques que tocan algún intervalo de documentos con cota
+       superior >= umbral, y se puntúan los documentos de esos intervalos.
+
+    Todo documento con puntaje >= umbral está en un intervalo vivo y se puntúa con todos
+    sus términos, así que el resultado es el mismo que sin comprimir. Con poda=False se
+    decodifican todas las listas de la consulta. Si algún peso es negativo (idf negativos
+    de BM25), las cotas no valen y se puntúa todo el corpus (``listas.n_docs``).
+
+    Retorna:
+    - Tupla (docs, scores) con a lo sumo k documentos, ordenados.
+    """
+    terminos = np.asarray(terminos, dtype=np.int64)
+    pesos = np.asarray(pesos, dtype=np.float64)
+    if len(terminos) == 0 or k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    n_bloques = listas.ptr[terminos + 1] - listas.ptr[terminos]
+    bloques = np.concatenate([listas.bloques_termino(t) for t in terminos])
+    pesos_bloque = np.repeat(pesos, n_bloques)
+    if len(bloques) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+
+    if (pesos < 0).any():
+        # Los documentos fuera de las listas (puntaje 0) pueden superar a los de las listas:
+        # se acumulan todas las entradas en un arreglo denso, como puntuar.
+        docs, bloque_de_entrada, orden = listas.decodificar_docs(bloques)
+        largos = listas.entradas[bloques + 1] - listas.entradas[bloques]
+        aportes = np.repeat(pesos_bloque, largos) * valorar(docs, listas.leer_carga(bloque_de_entrada, orden))
+        scores = np.bincount(docs, weights=aportes, minlength=listas.n_docs)
+        indices = top_k_denso(scores, k)
+        return indices, scores[indices]
+
+    if poda:
+        cotas = pesos_bloque * listas.maximo[bloques]
+        fin_bloques = np.cumsum(n_bloques)
+        mejores = np.array([i + np.argmax(cotas[i:j]) for i, j in zip(fin_bloques - n_bloques, fin_bloques) if j > i])
+        docs, carga = listas.decodificar(bloques[mejores])
+        largos = listas.entradas[bloques[mejores] + 1] - listas.entradas[bloques[mejores]]
+        _, parciales = acumular(docs, np.repeat(pesos_bloque[mejores], largos) * valorar(docs, carga))
+        umbral = 0.0
+        if len(parciales) >= k:
+            umbral = np.partition(parciales, len(parciales) - k)[len(parciales) - k]
+        primer_doc = listas.primer_doc[bloques]
+        ultimo_doc = listas.ultimo_doc[bloques]
+        bordes, vivo, sobreviven = intervalos_vivos(primer_doc, ultimo_doc, cotas, umbral)
+        bloques, pesos_bloque = bloques[sobreviven], pesos_bloque[sobreviven]
+
+    docs, bloque_de_entrada, orden = listas.decodificar_docs(bloques)
+    largos = listas.entradas[bloques + 1] - listas.entradas[bloques]
+    pesos_entrada = np.repeat(pesos_bloque, largos)
+    if poda:
+        # La carga solo se decodifica para las entradas de intervalos vivos.
+        en_vivo = vivo[np.searchsorted(bordes, docs, side="right") - 1]
+        docs, bloque_de_entrada, orden, pesos_entrada = docs[en_vivo], bloque_de_entrada[en_vivo], orden[en_vivo], pesos_entrada[en_vivo]
+    if len(docs) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    candidatos, scores = acumular(docs, pesos_entrada * valorar(docs, listas.leer_carga(bloque_de_entrada, orden)))
+    return top_k_candidatos(candidatos, scores, k)
+
+def reporte(listas, tamano_original, vocabulario=None, n_terminos=10):
+    """
+    Resume el tamaño de las listas comprimidas.
+
+    Parámetros:
+    - listas: ListasComprimidas.
+    - tamano_original: bytes de las mismas listas sin comprimir.
+    - vocabulario: términos en orden de id (str o bytes UTF-8), para nombrar los más grandes.
+    - n_terminos: cuántos de los términos más grandes listar.
+
+    Retorna:
+    - dict con bytes totales, bytes por entrada, razón de compresión y los términos que
+      más ocupan (bytes, entradas).
+    """
+    por_termino = listas.bytes_por_termino()
+    entradas = np.diff(listas.entradas[listas.ptr])
+    total = listas.nbytes()
+    mayores = []
+    for termino in np.argsort(-por_termino, kind="stable")[:n_terminos]:
+        nombre = vocabulario[termino] if vocabulario is not None else int(termino)
+        if isinstance(nombre, bytes):
+            nombre = nombre.decode("utf-8")
+        mayores.append({"termino": nombre, "bytes": int(por_termino[termino]), "entradas": int(entradas[termino])})
+    return {
+        "bytes": int(total),
+        "bytes_original": int(tamano_original),
+        "razon_compresion": tamano_original / total if total else 0.0,
+        "entradas": int(entradas.sum()),
+        "bytes_por_entrada": float(total / entradas.sum()) if entradas.sum() else 0.0,
+        "bytes_por_termino_medio": float(por_termino.mean()) if len(por_termino) else 0.0,
+        "terminos_mayores": mayores,
+    }
@@ -1,37 +1,162 @@
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import os
 import joblib
 import numpy as np
+from scipy import sparse
+from ..indice_columnar import VocabularioOrdenado, cargar_arreglos, escribir_manifiesto, guardar_arreglos, leer_manifiesto
+from .vectorizador_columnar import VectorizadorColumnar
+from .. import posteos_comprimidos
+from ..posteos_comprimidos import ListasComprimidas
+from ..poda import MaximosPorBloque, TAM_BLOQUE, completar_top_k, puntuar_docs, top_k_con_poda, top_k_denso, top_k_disperso, top_k_filas
 
 class Tfidf:
     """
     Clase que implementa un modelo de representación vectorial basado en TF-IDF
     para calcular similitud de coseno entre una consulta y un corpus documental.
     """
-    def __init__(self, corpus=None, modelName="modelo_tfidf"):
+    def __init__(self, corpus=None, modelName="modelo_tfidf", mmap_mode=None):
        """
             Inicializa el modelo TF-IDF. Si se proporciona un corpus, se entrena y guarda
             el modelo y la matriz TF-IDF. Si no, carga un modelo previamente entrenado.
 
             Parámetros:
             - corpus: lista o arreglo de textos preprocesados.
-            - modelName: nombre base para guardar/cargar los archivos del modelo.
+            - modelName: nombre base para guardar/cargar los archivos del modelo, o el
+              directorio de un índice columnar (ver guardar_columnar).
+            - mmap_mode: modo de joblib.load para mapear en memoria los arreglos de la
+              matriz (por ejemplo "r"), compartidos entre procesos. Los índices columnares
+              se mapean siempre ("r" si no se indica otro modo).
        """
+       self.modelName = modelName
+       # Los archivos de modelName corresponden a este modelo (ver Motor_evaluacion.evaluar_paralelo).
+       self.en_disco = True
        self.tfidf_vectorizer = None
        self.tfidf_matrix = None
+       self.comprimidas = None
        if corpus is not None and len(corpus) > 0:
            self.tfidf_vectorizer = TfidfVectorizer()
            self.tfidf_matrix = self.tfidf_vectorizer.fit_transform(corpus)
            joblib.dump(self.tfidf_vectorizer, modelName + ".joblib")
            joblib.dump(self.tfidf_matrix, "matriz_" + modelName +".joblib")
+       elif os.path.isdir(modelName):
+           self.cargar_columnar(modelName, mmap_mode or "r")
        else:
            self.tfidf_vectorizer = joblib.load(modelName + ".joblib")
-           self.tfidf_matrix = joblib.load( "matriz_" + modelName +".joblib")
+           self.tfidf_matrix = joblib.load( "matriz_" + modelName +".joblib", mmap_mode=mmap_mode)
 
 
+    @classmethod
+    def desde_matriz (cls, vectorizador, matriz, modelName="modelo_tfidf"):
+        """
+        Crea el modelo a partir de un vectorizador y una matriz TF-IDF ya calculados, sin
+        entrenar ni guardar nada (por ejemplo, los que exporta un IndiceIncremental).
+        """
+        modelo = cls.__new__(cls)
+        modelo.modelName = modelName
+        modelo.en_disco = False
+        modelo.tfidf_vectorizer = vectorizador
+        modelo.tfidf_matrix = matriz
+        modelo.comprimidas = None
+        return modelo
+
+    def comprimir (self, bits=8, tam_bloque=TAM_BLOQUE):
+        """
+        Modelo con las listas de posteo comprimidas por bloques: documentos por diferencias
+        empaquetadas en bits y pesos cuantizados a ``bits`` bits relativos al máximo de cada
+        bloque (ver posteos_comprimidos). Las similitudes pasan a ser aproximadas (error
+        por peso de a lo sumo máximo_bloque / (2 * (2**bits - 1))). guardar_columnar lo
+        guarda comprimido.
+        """
+        csc = self.listas_terminos()
+        modelo = Tfidf.desde_matriz(self.tfidf_vectorizer, None, self.modelName)
+        modelo.comprimidas = ListasComprimidas.desde_pesos(csc.indptr, csc.indices, csc.data, csc.shape[0], bits, tam_bloque)
+        return modelo
+
+    def descomprimir (self):
+        """
+        Decodifica completas las listas comprimidas en la matriz TF-IDF (CSC), para las
+        operaciones que recorren todo el corpus (lotes, fragmentos). Se hace una sola vez.
+        """
+        if self.tfidf_matrix is None and self.comprimidas is not None:
+            indptr, docs, pesos = self.comprimidas.decodificar_todo()
+            self.tfidf_matrix = sparse.csc_matrix((pesos, docs, indptr), shape=(self.comprimidas.n_docs, len(indptr) - 1))
+            self._matriz_csc = self.tfidf_matrix
+
+    def n_docs (self):
+        """
+        Número de documentos del modelo.
+        """
+        if self.comprimidas is not None:
+            return self.comprimidas.n_docs
+        return self.tfidf_matrix.shape[0]
+
+    def fragmento (self, inicio, fin):
+        """
+        Modelo con solo las filas [inicio, fin) de la matriz TF-IDF y el mismo vectorizador:
+        como el IDF y las normas son los del corpus completo, las similitudes de esos
+        documentos son exactamente las mismas.
+        """
+        self.descomprimir()
+        return Tfidf.desde_matriz(self.tfidf_vectorizer, self.tfidf_matrix[inicio:fin], self.modelName)
+
+    def guardar_columnar (self, directorio):
+        """
+        Guarda el modelo en un directorio de índice columnar: vocabulario ordenado, IDF y
+        las listas de posteo término -> documentos con sus pesos TF-IDF en CSR o, si el
+        modelo está comprimido, las listas comprimidas y los parámetros de la compresión.
+
+        Parámetros:
+        - directorio: directorio del modelo (se crea si no existe).
+
+        Retorna:
+        - Manifiesto escrito (parámetros, número de documentos y arreglos).
+        """
+        vectorizador = self.tfidf_vectorizer
+        if not isinstance(vectorizador, VectorizadorColumnar):
+            VectorizadorColumnar.validar(vectorizador)
+            vectorizador = VectorizadorColumnar(VocabularioOrdenado.desde_dict(vectorizador.vocabulary_), vectorizador.idf_,
+                                                vectorizador.token_pattern, vectorizador.lowercase)
+        arreglos = {"vocabulario": vectorizador.vocabulario.terminos, "idf": vectorizador.idf}
+        if self.comprimidas is not None:
+            arreglos.update(self.comprimidas.arreglos())
+        else:
+            csc = self.listas_terminos()
+            arreglos.update({"indptr": csc.indptr, "docs": csc.indices, "pesos": csc.data})
+        manifiesto = {
+            "modelo": "tfidf",
+            "n_docs": self.n_docs(),
+            "parametros": {"token_pattern": vectorizador.token_pattern, "lowercase": vectorizador.lowercase},
+            "arreglos": guardar_arreglos(directorio, arreglos),
+        }
+        if self.comprimidas is not None:
+            manifiesto["compresion"] = self.comprimidas.parametros()
+        escribir_manifiesto(directorio, manifiesto)
+        return manifiesto
+
+    def cargar_columnar (self, directorio, mmap_mode="r"):
+        """
+        Carga el modelo desde un directorio de índice columnar. La matriz TF-IDF queda como
+        CSC (documentos x términos) sobre los arreglos mapeados, que sirve a la vez como
+        listas de posteo para la recuperación top-k. Si está comprimido, solo se cargan las
+        listas comprimidas (ver descomprimir).
+        """
+        manifiesto = leer_manifiesto(directorio)
+        arreglos = cargar_arreglos(directorio, manifiesto["arreglos"], mmap_mode)
+        self.tfidf_vectorizer = VectorizadorColumnar(VocabularioOrdenado(arreglos["vocabulario"]), arreglos["idf"],
+                                                     **manifiesto["parametros"])
+        if "compresion" in manifiesto:
+            self.comprimidas = ListasComprimidas.desde_arreglos(arreglos, **manifiesto["compresion"])
+            return
+        self.tfidf_matrix = sparse.csc_matrix((arreglos["pesos"], arreglos["docs"], arreglos["indptr"]),
+                                              shape=(manifiesto["n_docs"], len(arreglos["vocabulario"])))
+        self._matriz_csc = self.tfidf_matrix
+
     def obtener_similitud_coseno (self, query_preprocesada):
         """
         Calcula la similitud de coseno entre la consulta y todos los documentos del corpus.
+        Como las filas de la matriz TF-IDF y el vector de la consulta ya tienen norma L2
+        unitaria, es un producto disperso; no se copia ni normaliza la matriz (que puede
+        estar mapeada y compartida entre procesos) en cada consulta.
 
         Parámetros:
         - query_preprocesada: texto ya preprocesado (str o lista con un único elemento).
@@ -42,7 +167,154 @@ class Tfidf:
         if type(query_preprocesada) == str:
             query_preprocesada = [query_preprocesada]
         query_vector = self.tfidf_vectorizer.transform(query_preprocesada)
-        return cosine_similarity(query_vector, self.tfidf_matrix).flatten()
+        if self.comprimidas is not None:
+            return posteos_comprimidos.puntuar(self.comprimidas, query_vector.indices, query_vector.data,
+                                               posteos_comprimidos.valor_carga, self.n_docs())
+        return (query_vector @ self.tfidf_matrix.T).toarray().ravel()
+
+    def obtener_similitud_docs (self, query_preprocesada, candidatos):
+        """
+        Calcula la similitud de coseno solo de los documentos indicados, buscándolos en las
+        listas de posteo de los términos de la consulta.
+
+        Parámetros:
+        - query_preprocesada: texto ya preprocesado.
+        - candidatos: posiciones de los documentos a puntuar.
+
+        Retorna:
+        - Arreglo con la similitud de cada candidato, en el mismo orden.
+        """
+        if type(query_preprocesada) == str:
+            query_preprocesada = [query_preprocesada]
+        query_vector = self.tfidf_vectorizer.transform(query_preprocesada)
+        if self.comprimidas is not None:
+            return posteos_comprimidos.puntuar_docs(self.comprimidas, query_vector.indices, query_vector.data,
+                                                    posteos_comprimidos.valor_carga, candidatos)
+        csc = self.listas_terminos()
+        return puntuar_docs(csc.indptr, csc.indices, csc.data, query_vector.indices, query_vector.data,
+                            np.asarray(candidatos, dtype=np.int64))
+
+    def obtener_scores_batch (self, queries_preprocesadas):
+        """
+        Calcula la similitud de coseno de varias consultas con todo el corpus mediante un
+        único producto de matrices dispersas.
+
+        Parámetros:
+        - queries_preprocesadas: lista de textos ya preprocesados.
+
+        Retorna:
+        - Matriz scipy.sparse (n_consultas x n_docs) de similitudes.
+        """
+        query_matrix = self.tfidf_vectorizer.transform(queries_preprocesadas)
+        self.descomprimir()
+        return (query_matrix @ self.tfidf_matrix.T).tocsr()
+
+    def obtener_docs_relevantes_batch (self, queries_preprocesadas, k=10):
+        """
+        Retorna los k documentos más similares de varias consultas a la vez.
+
+        Parámetros:
+        - queries_preprocesadas: lista de textos ya preprocesados.
+        - k: número de documentos por consulta.
+
+        Retorna:
+        - Tupla (posiciones, similitudes) de arreglos (n_consultas x k), ordenados de
+          mayor a menor en cada fila.
+        """
+        return top_k_filas(self.obtener_scores_batch(queries_preprocesadas), k, self.n_docs())
+
+    def listas_terminos(self):
+        """
+        Retorna una copia CSC (término -> documentos) de la matriz TF-IDF con los índices
+        ordenados, creada la primera vez que se necesita.
+        """
+        self.descomprimir()
+        if getattr(self, "_matriz_csc", None) is None:
+            self._matriz_csc = self.tfidf_matrix.tocsc()
+            self._matriz_csc.sort_indices()
+        return self._matriz_csc
+
+    def maximos(self, tam_bloque=TAM_BLOQUE):
+        """
+        Cotas superiores por bloque (o por término si tam_bloque es None) de los pesos
+        TF-IDF de cada lista de posteo.
+        """
+        if getattr(self, "_maximos", None) is None:
+            self._maximos = {}
+        if tam_bloque not in self._maximos:
+            csc = self.listas_terminos()
+            self._maximos[tam_bloque] = MaximosPorBloque(csc.indptr, csc.indices, csc.data, tam_bloque)
+        return self._maximos[tam_bloque]
+
+    def obtener_top_k_coseno (self, query_preprocesada, k=10):
+        """
+        Calcula la similitud de coseno solo para los documentos que comparten algún término
+        con la consulta y retorna los k mejores, sin generar un arreglo denso por consulta.
+
+        Como las filas de la matriz TF-IDF ya están normalizadas (L2), el coseno es el
+        producto punto disperso entre la consulta y cada documento: se leen únicamente las
+        columnas (listas término -> documentos) de los términos de la consulta.
+
+        Parámetros:
+        - query_preprocesada: texto de la consulta ya preprocesado.
+        - k: número de documentos a retornar.
+
+        Retorna:
+        - Tupla (posiciones, similitudes) con a lo sumo k documentos de similitud positiva,
+          ordenados de mayor a menor.
+        """
+        if type(query_preprocesada) == str:
+            query_preprocesada = [query_preprocesada]
+        query_vector = self.tfidf_vectorizer.transform(query_preprocesada)
+        if self.comprimidas is not None:
+            return posteos_comprimidos.top_k(self.comprimidas, query_vector.indices, query_vector.data,
+                                             posteos_comprimidos.valor_carga, k, poda=False)
+        csc = self.listas_terminos()
+        return top_k_disperso(csc.indptr, csc.indices, csc.data, query_vector.indices, query_vector.data, k)
+
+    def obtener_top_k (self, query_preprocesada, k=10, modo="bmw"):
+        """
+        Retorna las posiciones y similitudes de los k documentos más similares a la consulta.
+
+        Como las filas de la matriz están normalizadas (L2), la similitud de coseno es la
+        suma de ``peso_consulta * peso_documento`` sobre los términos de la consulta, y se
+        pueden usar cotas superiores por bloque para no puntuar todo el corpus.
+
+        Parámetros:
+        - query_preprocesada: texto de la consulta ya preprocesado.
+        - k: número de documentos a retornar.
+        - modo: "bmw" (Block-Max WAND, default), "wand" (cotas por término), "disperso"
+          (acumulación dispersa sin poda, ver obtener_top_k_coseno) o "denso" (similitud
+          con todo el corpus y selección con np.argpartition). Con listas comprimidas,
+          "bmw" y "wand" usan las cotas de los bloques comprimidos.
+
+        Retorna:
+        - Tupla (posiciones, similitudes) ordenada de mayor a menor, completada con
+          documentos de similitud 0 si hay menos de k coincidencias.
+        """
+        n_docs = self.n_docs()
+        if modo == "denso":
+            sim_cos = self.obtener_similitud_coseno(query_preprocesada)
+            indices = top_k_denso(sim_cos, k)
+            return indices, sim_cos[indices]
+        if modo == "disperso":
+            indices, scores = self.obtener_top_k_coseno(query_preprocesada, k)
+            return completar_top_k(indices, scores, k, n_docs)
+        if modo not in ("bmw", "wand"):
+            raise ValueError(f"Modo top-k no soportado: {modo}")
+
+        if type(query_preprocesada) == str:
+            query_preprocesada = [query_preprocesada]
+        query_vector = self.tfidf_vectorizer.transform(query_preprocesada)
+        if self.comprimidas is not None:
+            indices, scores = posteos_comprimidos.top_k(self.comprimidas, query_vector.indices, query_vector.data,
+                                                        posteos_comprimidos.valor_carga, k)
+            return completar_top_k(indices, scores, k, n_docs)
+        csc = self.listas_terminos()
+        maximos = self.maximos(TAM_BLOQUE if modo == "bmw" else None)
+        indices, scores = top_k_con_poda(csc.indptr, csc.indices, csc.data, maximos,
+                                         query_vector.indices, query_vector.data, k)
+        return completar_top_k(indices, scores, k, n_docs)
 
     def obtener_docs_relevantes (self, query_preprocesada, corpus_df, k=10):
         """
@@ -56,8 +328,6 @@ class Tfidf:
         Retorna:
         - DataFrame con los k documentos más relevantes ordenados por similitud.
         """
-        sim_cos = self.obtener_similitud_coseno(query_preprocesada)
-        sorted_indices = np.argsort(-(sim_cos))
-
-        return corpus_df.iloc[sorted_indices[:k]]
+        indices, _ = self.obtener_top_k(query_preprocesada, k)
 
+        return corpus_df.iloc[indices]
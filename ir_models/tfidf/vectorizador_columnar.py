@@ -0,0 +1,67 @@
+import re
+import numpy as np
+from scipy import sparse
+
+class VectorizadorColumnar:
+    """
+    Equivalente de ``TfidfVectorizer.transform`` para un modelo cargado desde un índice
+    columnar: el vocabulario (VocabularioOrdenado) y el IDF son arreglos NumPy que pueden
+    estar mapeados en memoria.
+
+    Reproduce la configuración que usa Tfidf: análisis por palabras con ``token_pattern``,
+    unigramas, frecuencias sin tf sublineal, multiplicación por IDF y norma L2.
+
+    Parámetros:
+    - vocabulario: VocabularioOrdenado (término -> columna).
+    - idf: IDF de cada término.
+    - token_pattern: expresión regular de tokens (la de TfidfVectorizer).
+    - lowercase: si se pasa el texto a minúsculas antes de tokenizar.
+    """
+
+    # Parámetros de TfidfVectorizer que deben tener estos valores para poder convertirlo.
+    parametros_requeridos = {
+        "analyzer": "word", "ngram_range": (1, 1), "norm": "l2", "use_idf": True, "sublinear_tf": False,
+        "binary": False, "stop_words": None, "preprocessor": None, "tokenizer": None, "strip_accents": None,
+    }
+
+    def __init__(self, vocabulario, idf, token_pattern=r"(?u)\b\w\w+\b", lowercase=True):
+        self.vocabulario = vocabulario
+        self.idf = idf
+        self.token_pattern = token_pattern
+        self.lowercase = lowercase
+        self.patron = re.compile(token_pattern)
+
+    @classmethod
+    def validar(cls, tfidf_vectorizer):
+        """
+        Comprueba que un TfidfVectorizer entrenado use la configuración soportada.
+        """
+        parametros = tfidf_vectorizer.get_params()
+        distintos = [nombre for nombre, valor in cls.parametros_requeridos.items() if parametros[nombre] != valor]
+        if distintos:
+            raise ValueError(f"TfidfVectorizer con parámetros no soportados por el índice columnar: {distintos}")
+
+    def transform(self, textos):
+        """
+        Vectoriza textos como lo haría el TfidfVectorizer original.
+
+        Parámetros:
+        - textos: lista de textos ya preprocesados.
+
+        Retorna:
+        - Matriz CSR (n_textos x n_terminos) con filas de norma L2 unitaria.
+        """
+        indptr = [0]
+        indices, datos = [np.empty(0, dtype=np.int64)], [np.empty(0)]
+        for texto in textos:
+            if self.lowercase:
+                texto = texto.lower()
+            ids = self.vocabulario.ids(self.patron.findall(texto))
+            terminos, frecuencias = np.unique(ids[ids >= 0], return_counts=True)
+            pesos = frecuencias * self.idf[terminos]
+            norma = np.sqrt(np.dot(pesos, pesos))
+            indices.append(terminos)
+            datos.append(pesos / norma if norma > 0 else pesos)
+            indptr.append(indptr[-1] + len(terminos))
+        return sparse.csr_matrix((np.concatenate(datos), np.concatenate(indices), np.asarray(indptr)),
+                                 shape=(len(textos), len(self.vocabulario)))
@@ -1,12 +1,25 @@
 #quiero usar FastAPI
+import logging
+import os
+import time
 from fastapi import FastAPI
 from pydantic import BaseModel
-from fastapi.responses import JSONResponse
-from typing import Optional
+from fastapi.responses import JSONResponse, PlainTextResponse
+from typing import Dict, List, Optional
 from fastapi.middleware.cors import CORSMiddleware
 from .sri import Sri_app
+from .despachador import ColaLlena, DespachadorConsultas
+from .telemetria import formato_prometheus
+# Nivel de log configurable con SRI_LOG (DEBUG muestra cada consulta recibida).
+logging.basicConfig(level=os.environ.get("SRI_LOG", "INFO").upper(),
+                    format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
 # App
 sri_app  = None
+metricas = None
+# Hilos de búsqueda y consultas distintas en curso antes de responder 503 (configurables).
+despachador = DespachadorConsultas(int(os.environ.get("SRI_HILOS", 0)) or None,
+                                   int(os.environ.get("SRI_MAX_PENDIENTES", 64)))
 
 #Fast Api
 app = FastAPI()
@@ -14,8 +27,35 @@ app = FastAPI()
 @app.on_event("startup")
 def init_once():
     global sri_app
-    sri_app = Sri_app()
-    print("App SRI cargada correctamente...:D")
+    inicio = time.perf_counter()
+    # SRI_EVALUACION=0 (lo fija servidor.py) evita cargar consultas y qrels en cada proceso.
+    sri_app = Sri_app(evaluacion=os.environ.get("SRI_EVALUACION", "1") != "0")
+    logger.info("App SRI cargada correctamente en %.2f s", time.perf_counter() - inicio)
+    # SRI_FRAGMENTOS=N reparte cada consulta entre N procesos de fragmento.
+    if int(os.environ.get("SRI_FRAGMENTOS", 0)) > 0:
+        sri_app.activar_fragmentos(int(os.environ["SRI_FRAGMENTOS"]))
+    logger.info("Tiempos de carga del preprocesador (s): %s", sri_app.preprocesador.tiempos_carga)
+    cargar_metricas()
+
+def cargar_metricas():
+    """
+    Arma una sola vez la respuesta de métricas de evaluación; se sirve en /metricas y en
+    cada respuesta de /consultar sin volver a convertir los DataFrames.
+    """
+    global metricas
+    metricas_tfidf_res_dict = sri_app.metricas_tfidf_res.to_dict()
+    metricas = {
+        "metricas_tfidf_res": list(metricas_tfidf_res_dict.values())[0] if metricas_tfidf_res_dict else {},
+        "metricas_bm25_res": sri_app.metricas_bm25_res.to_dict()
+    }
+
+@app.on_event("shutdown")
+def guardar_cache():
+    global sri_app
+    if sri_app is not None:
+        sri_app.guardar_cache_normalizacion()
+        sri_app.desactivar_fragmentos()
+    despachador.cerrar()
 
 app.add_middleware(
     CORSMiddleware,
@@ -29,29 +69,106 @@ class Consulta(BaseModel):
     query:str
     metrica: Optional[str] = None #sri_app.metricas_buscar[2]
     k: Optional[int] = None
+    # Fusión de TF-IDF y BM25 por candidatos ('minmax', 'zscore', 'lineal', 'rrf') y sus
+    # pesos, p. ej. {"sim_cos": 0.3, "bm25_scores": 0.7, "proximidad": 0.2}; solo con la
+    # métrica 'promedio'. La query acepta frases ("...") y proximidad ("..."~N).
+    fusion: Optional[str] = None
+    pesos: Optional[Dict[str, float]] = None
+    # Si es True, la respuesta incluye la duración de cada etapa de la búsqueda.
+    debug_timings: Optional[bool] = False
+
+class ConsultaBatch(BaseModel):
+    queries: List[str]
+    metrica: Optional[str] = None
+    k: Optional[int] = None
 
 
 #Endpoint
+def buscar_registros(query, k, metrica, fusion=None, pesos=None):
+    """
+    Búsqueda completa (preprocesamiento, puntajes e hidratación) que corre en un hilo del
+    despachador; retorna los documentos listos para JSON y la duración (s) de cada etapa.
+    """
+    telemetria = sri_app.telemetria
+    with telemetria.recolectar() as tiempos:
+        with telemetria.medir("busqueda"):
+            documentos = sri_app.buscar(query, k, metrica, fusion, pesos)
+        with telemetria.medir("serializacion"):
+            registros = documentos.to_dict(orient="records")
+    return registros, tiempos
+
 @app.post("/consultar")
-def consultar(input:Consulta):
+async def consultar(input:Consulta):
     global sri_app
-    print(input)
+    inicio = time.perf_counter()
+    logger.debug("Consulta recibida: %s", input)
     if not input.metrica:
         input.metrica = sri_app.metricas_buscar[-1]
     if not input.k:
         input.k = 10
-     
-    resultado = sri_app.buscar(input.query, input.k, input.metrica)
-    data = resultado.to_dict(orient="records")
-    
 
-    metricas_tfidf_res_dict = sri_app.metricas_tfidf_res.to_dict()
-    metricas_tfidf_res = list(metricas_tfidf_res_dict.values())[0] if metricas_tfidf_res_dict else {}
+    try:
+        pesos = tuple(sorted(input.pesos.items())) if input.pesos is not None else None
+        data, tiempos = await despachador.ejecutar((input.query, input.metrica, input.k, input.fusion, pesos), buscar_registros,
+                                          input.query, input.k, input.metrica, input.fusion, input.pesos)
+    except ColaLlena as error:
+        return JSONResponse(status_code=503, content={"detalle": str(error)}, headers={"Retry-After": "1"})
+    except ValueError as error:
+        return JSONResponse(status_code=400, content={"detalle": str(error)})
+
+    # Las métricas se mantienen en la respuesta para el frontend, pero vienen ya armadas.
+    contenido = {
+        "resultados": data,
+        **metricas
+    }
+    total = time.perf_counter() - inicio
+    sri_app.telemetria.registrar("consultar", total)
+    if input.debug_timings:
+        # Las consultas coalescidas reportan las etapas de la ejecución que comparten.
+        contenido["debug_timings"] = {**{etapa: segundos * 1000 for etapa, segundos in tiempos.items()},
+                                      "consultar": total * 1000}
+    return JSONResponse(content=contenido)
 
-    metricas_bm25_res = sri_app.metricas_bm25_res.to_dict()
+@app.get("/metricas")
+def obtener_metricas():
+    return JSONResponse(content=metricas)
+
+@app.get("/metrics")
+def exponer_metrics():
+    """
+    Histogramas de duración por etapa y contadores de la caché y del despachador en el
+    formato de texto de Prometheus.
+    """
+    cache = sri_app.cache_resultados.estadisticas()
+    cola = despachador.estadisticas()
+    contadores = [
+        ("sri_cache_aciertos_total", "Búsquedas respondidas desde la caché de resultados.", cache["hits"]),
+        ("sri_cache_fallos_total", "Búsquedas que no estaban en la caché de resultados.", cache["misses"]),
+        ("sri_cache_invalidaciones_total", "Vaciados de la caché por cambio de índice.", cache["invalidaciones"]),
+        ("sri_consultas_total", "Consultas de /consultar por resultado en el despachador.",
+         [({"resultado": "ejecutada"}, cola["ejecutadas"]), ({"resultado": "coalescida"}, cola["coalescidas"]),
+          ({"resultado": "rechazada"}, cola["rechazadas"])]),
+    ]
+    medidores = [
+        ("sri_cache_entradas", "Entradas en la caché de resultados.", cache["entradas"]),
+        ("sri_cache_capacidad", "Capacidad de la caché de resultados.", cache["capacidad"]),
+        ("sri_consultas_en_curso", "Consultas distintas en ejecución o esperando un hilo.", cola["en_curso"]),
+        ("sri_consultas_max_pendientes", "Consultas distintas en curso admitidas antes de responder 503.", cola["max_pendientes"]),
+        ("sri_hilos_busqueda", "Hilos del pool de búsqueda.", cola["max_hilos"]),
+    ]
+    return PlainTextResponse(formato_prometheus(sri_app.telemetria, contadores, medidores),
+                             media_type="text/plain; version=0.0.4")
+
+@app.post("/consultar_batch")
+def consultar_batch(input:ConsultaBatch):
+    global sri_app
+    if not input.metrica:
+        input.metrica = sri_app.metricas_buscar[-1]
+    if not input.k:
+        input.k = 10
+
+    resultados = sri_app.buscar_batch(input.queries, input.k, input.metrica)
 
     return JSONResponse(content={
-        "resultados": data,
-        "metricas_tfidf_res": metricas_tfidf_res,
-        "metricas_bm25_res": metricas_bm25_res
-    })
\ No newline at end of file
+        "resultados": [resultado.to_dict(orient="records") for resultado in resultados]
+    })
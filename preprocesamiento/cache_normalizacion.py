@@ -0,0 +1,102 @@
+import threading
+from collections import OrderedDict
+
+class CacheLRU ():
+    """
+    Caché acotada con desalojo LRU (menos usado recientemente) para resultados de
+    normalización de tokens (lemas y stems).
+
+    El vocabulario sigue una distribución de Zipf, así que pocas claves concentran la
+    mayoría de las consultas a la caché.
+
+    Atributos:
+    ----------
+    capacidad : int
+        Número máximo de entradas.
+    hits, misses : int
+        Contadores de aciertos y fallos.
+    """
+
+    def __init__(self, capacidad=100000):
+        """
+        Parameters
+        ----------
+        capacidad : int
+            Número máximo de entradas antes de desalojar la menos usada.
+        """
+        self.capacidad = capacidad
+        self.hits = 0
+        self.misses = 0
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, clave, funcion, *args):
+        """
+        Retorna el valor guardado para la clave o lo calcula con funcion(*args), lo guarda
+        y lo retorna.
+
+        Parameters
+        ----------
+        clave : hashable
+            Clave de la entrada.
+        funcion : callable
+            Función que calcula el valor si la clave no está en la caché.
+
+        Returns
+        -------
+        object
+            Valor asociado a la clave.
+        """
+        with self._lock:
+            if clave in self._entradas:
+                self._entradas.move_to_end(clave)
+                self.hits += 1
+                return self._entradas[clave]
+        valor = funcion(*args)
+        with self._lock:
+            self.misses += 1
+            self._entradas[clave] = valor
+            if len(self._entradas) > self.capacidad:
+                self._entradas.popitem(last=False)
+        return valor
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def estadisticas(self):
+        """
+        Retorna los contadores de la caché.
+
+        Returns
+        -------
+        dict
+            hits, misses, tasa_aciertos, entradas y capacidad.
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "tasa_aciertos": self.hits / total if total else 0.0,
+            "entradas": len(self._entradas),
+            "capacidad": self.capacidad,
+        }
+
+    def entradas(self):
+        """
+        Retorna las entradas como lista de pares (clave, valor), de la menos a la más
+        usada recientemente, para guardarlas en disco.
+        """
+        with self._lock:
+            return list(self._entradas.items())
+
+    def agregar_entradas(self, entradas):
+        """
+        Agrega entradas obtenidas con entradas() (por ejemplo, cargadas de disco) sin
+        modificar los contadores. Si no caben todas, se conservan las más usadas.
+        """
+        with self._lock:
+            for clave, valor in list(entradas)[-self.capacidad:]:
+                self._entradas[clave] = valor
+                self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.capacidad:
+                self._entradas.popitem(last=False)
@@ -0,0 +1,32 @@
+"""
+Instalación única de los recursos del preprocesamiento (datos de NLTK y modelo spaCy).
+
+El Preprocesador nunca descarga nada al crearse; este comando se ejecuta una vez (por
+ejemplo, al construir la imagen del servidor) desde el directorio padre del proyecto:
+
+    python -m busqueda_ir.preprocesamiento.preparar [--sin-spacy] [--directorio DIR]
+"""
+import argparse
+import time
+from .preprocesador import Preprocesador
+
+def main():
+    parser = argparse.ArgumentParser(description="Descarga los recursos de NLTK y spaCy del preprocesador.")
+    parser.add_argument("--sin-spacy", action="store_true", help="No instalar el modelo spaCy 'en_core_web_sm'.")
+    parser.add_argument("--directorio", default=None, help="Directorio de datos de NLTK donde descargar.")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    Preprocesador.descargar_paquetes_necesarios(incluir_spacy=not args.sin_spacy, directorio=args.directorio)
+    print(f"Recursos listos en {time.perf_counter() - inicio:.2f} s")
+
+    # Arranque en frío con los recursos ya instalados.
+    preprocesador = Preprocesador()
+    for recurso, segundos in preprocesador.precargar(lmt=True).items():
+        print(f"  carga de {recurso}: {segundos:.3f} s")
+    if not args.sin_spacy:
+        preprocesador.lematizer_spacy
+        print(f"  carga de lematizer_spacy: {preprocesador.tiempos_carga['lematizer_spacy']:.3f} s")
+
+if __name__ == "__main__":
+    main()
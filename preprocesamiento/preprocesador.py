@@ -1,11 +1,35 @@
+import os
+import time
+import joblib
+from contextlib import nullcontext
 import nltk
+from concurrent.futures import ProcessPoolExecutor
 from nltk.corpus import stopwords, wordnet
 from nltk.data import find
-import spacy #muy lentoooo
 from nltk import regexp_tokenize
 from nltk.stem import SnowballStemmer
 from nltk.stem import WordNetLemmatizer
 from nltk.tag import pos_tag
+from .cache_normalizacion import CacheLRU
+
+# Preprocesador propio de cada proceso del preprocesamiento paralelo.
+_preprocesador_worker = None
+
+def _iniciar_worker(attr_id, long_min, long_max, stopwords_extra, tam_cache):
+    """
+    Crea el Preprocesador del proceso trabajador una sola vez, con la misma configuración
+    del filtro de tokens que el proceso principal. Sus recursos NLTK se cargan en el primer
+    bloque que procesa.
+    """
+    global _preprocesador_worker
+    _preprocesador_worker = Preprocesador(attr_id, long_min, long_max, stopwords_extra, tam_cache)
+
+def _preprocesar_chunk(textos, lmt):
+    """
+    Preprocesa un bloque de textos en el proceso trabajador, conservando el orden.
+    """
+    metodo = _preprocesador_worker.preprocesar_con_lmt if lmt else _preprocesador_worker.preprocesar_con_stm
+    return [metodo(texto) for texto in textos]
 
 class Preprocesador ():
     """
@@ -25,16 +49,29 @@ class Preprocesador ():
     paquetes_requeridos : list
         Recursos de NLTK necesarios para los métodos de procesamiento.
 
+    Los recursos (stopwords, stemmer, WordNet + etiquetador POS y spaCy) se cargan de forma
+    perezosa la primera vez que un método los necesita y sin descargar nada; el tiempo de
+    cada carga queda en ``tiempos_carga``.
+
     Métodos:
     --------
-    descargar_paquetes_necesarios():
-        Descarga los recursos necesarios de NLTK y spaCy si no están disponibles.
+    descargar_paquetes_necesarios(incluir_spacy=True, directorio=None):
+        Descarga los recursos necesarios de NLTK y spaCy si no están disponibles (instalación única).
+
+    precargar(lmt=True):
+        Carga por adelantado los recursos del preprocesamiento por defecto.
     
     normalizar_tokenizar(doc):
         Convierte el texto a minúsculas y extrae solo tokens alfabéticos.
     
     eliminar_stopwords(tokens):
-        Elimina las palabras vacías del conjunto de tokens.
+        Elimina todas las apariciones de las palabras vacías de la lista de tokens.
+
+    filtrar_tokens(tokens):
+        Filtro de una sola pasada: stopwords (incluida la lista extra) y longitud mínima/máxima.
+
+    guardar_cache(ruta) / cargar_cache(ruta):
+        Guardan y cargan las cachés LRU de lemas y stems.
     
     stemming(doc):
         Aplica stemming a una lista de tokens.
@@ -54,10 +91,16 @@ class Preprocesador ():
     preprocesar_con_stm(doc):
         Preprocesa un documento aplicando stemming.
     
-    preprocesar_corpus(corpus, attr, attr_new, lmt=True):
+    preprocesar_corpus(corpus, attr, attr_new, lmt=True, n_procesos=None):
         Preprocesa una columna de un DataFrame usando lematización o stemming.
+
+    preprocesar_corpus_paralelo(corpus, attr, attr_new, lmt=True, n_procesos=None, tam_chunk=1000):
+        Igual que preprocesar_corpus, repartiendo bloques de documentos entre procesos.
     
-    preprocesar_corpus_spacy(corpus, attr, attr_new, lmt=True):
+    lematizar_spacy_lote(lista_tokens, batch_size=1000, n_process=1):
+        Lematiza varios documentos con spaCy usando nlp.pipe.
+
+    preprocesar_corpus_spacy(corpus, attr, attr_new, lmt=True, batch_size=1000, n_process=1):
         Igual que preprocesar_corpus, pero con lematización vía spaCy.
     """
 
@@ -65,12 +108,16 @@ class Preprocesador ():
     paquetes_requeridos = [
        'punkt','punkt_tab','stopwords', 'wordnet', 'averaged_perceptron_tagger', 'averaged_perceptron_tagger_eng'
     ]
+    # Componentes de en_core_web_sm que la lematización no usa (el lematizador solo
+    # necesita tok2vec, tagger y attribute_ruler).
+    componentes_spacy_excluidos = ['parser', 'ner', 'senter']
 
     
     @staticmethod
-    def _resource_path(package_name): #este aun no encuentro bien la ruta
+    def _resource_path(package_name):
         """
-        Retorna la ruta local al recurso NLTK basado en su nombre.
+        Retorna la ruta del recurso NLTK relativa a los directorios de datos estándar
+        (nltk.data.path), que es como la busca nltk.data.find.
 
         Parameters
         ----------
@@ -80,50 +127,162 @@ class Preprocesador ():
         Returns
             -------
         str
-            Ruta local al recurso o el nombre si no está mapeado."""
-        base_path = r"C:\Users\54Y1\AppData\Roaming\nltk_data"
+            Ruta relativa al recurso o el nombre si no está mapeado."""
         mapping = {
-            "punkt": base_path + "/tokenizers/punkt",
-            "punkt_tab": base_path+ "/tokenizers/punk_tab",
-            "stopwords": base_path + "/corpora/stopwords",
-            "wordnet": base_path + "/corpora/wordnet",
-            "averaged_perceptron_tagger": base_path + "/taggers/averaged_perceptron_tagger",
-            "averaged_perceptron_tagger_eng": base_path + "/taggers/averaged_perceptron_tagger_eng"
+            "punkt": "tokenizers/punkt",
+            "punkt_tab": "tokenizers/punkt_tab",
+            "stopwords": "corpora/stopwords",
+            "wordnet": "corpora/wordnet",
+            "averaged_perceptron_tagger": "taggers/averaged_perceptron_tagger",
+            "averaged_perceptron_tagger_eng": "taggers/averaged_perceptron_tagger_eng"
 
         }
         return mapping.get(package_name, package_name)
 
-    def __init__(self, attr_id="doc_id"):
+    def __init__(self, attr_id="doc_id", long_min=1, long_max=None, stopwords_extra=None, tam_cache=100000):
         """
-        Inicializa el preprocesador, descargando los recursos necesarios y
-        cargando las stopwords, stemmer y lematizadores.
+        Inicializa el preprocesador. No descarga ni carga recursos: las stopwords, el
+        stemmer y los lematizadores se cargan la primera vez que un método los usa
+        (ver descargar_paquetes_necesarios para instalarlos).
 
         Parameters
         ----------
         attr_id : str
             Nombre del atributo identificador de cada documento en el corpus.
+        long_min : int
+            Longitud mínima (en caracteres) de los tokens que se conservan.
+        long_max : int, optional
+            Longitud máxima de los tokens que se conservan (None = sin límite).
+        stopwords_extra : iterable of str, optional
+            Palabras adicionales a eliminar junto con las stopwords de NLTK.
+        tam_cache : int
+            Capacidad de cada caché LRU de normalización: lemas por (token, POS de WordNet)
+            y stems por token.
         """
-        self.descargar_paquetes_necesarios()
-        self.stop_words= set(stopwords.words('english'))
-        self.stemmer = SnowballStemmer("english")
-        self.lematizer_spacy =  spacy.load("en_core_web_sm")
-        self.lematizer =  WordNetLemmatizer()
+        self.long_min = long_min
+        self.long_max = long_max
+        self.stopwords_extra = set(stopwords_extra or [])
+        self._stop_words = None
+        self._stemmer = None
+        self._lematizer = None
+        self._lematizer_spacy = None
+        self.tiempos_carga = {}
+        self.cache_lemas = CacheLRU(tam_cache)
+        self.cache_stems = CacheLRU(tam_cache)
         self.attr_id = attr_id
 
+    def _cargar_recurso(self, nombre, paquetes, cargar):
+        """
+        Verifica que los paquetes NLTK estén instalados (sin descargarlos), ejecuta la
+        función de carga y registra su duración en tiempos_carga.
+
+        Parameters
+        ----------
+        nombre : str
+            Nombre del recurso para el registro de tiempos.
+        paquetes : list
+            Paquetes NLTK que necesita el recurso.
+        cargar : callable
+            Función que crea el recurso.
+        """
+        for paquete in paquetes:
+            try:
+                find(self._resource_path(paquete))
+            except LookupError:
+                raise LookupError(f"Falta el recurso NLTK '{paquete}'. Instálelo una vez con: "
+                                  f"python -m {__package__}.preparar") from None
+        inicio = time.perf_counter()
+        recurso = cargar()
+        self.tiempos_carga[nombre] = time.perf_counter() - inicio
+        return recurso
+
+    @property
+    def stop_words(self):
+        """Stopwords de NLTK (inglés) más stopwords_extra, cargadas en el primer uso."""
+        if self._stop_words is None:
+            self._stop_words = self._cargar_recurso("stopwords", ["stopwords"],
+                                                    lambda: set(stopwords.words('english'))) | self.stopwords_extra
+        return self._stop_words
+
+    @property
+    def stemmer(self):
+        """SnowballStemmer en inglés, creado en el primer uso."""
+        if self._stemmer is None:
+            self._stemmer = self._cargar_recurso("stemmer", [], lambda: SnowballStemmer("english"))
+        return self._stemmer
+
+    @property
+    def lematizer(self):
+        """WordNetLemmatizer con WordNet y el etiquetador POS ya cargados, en el primer uso."""
+        if self._lematizer is None:
+            def cargar():
+                lematizer = WordNetLemmatizer()
+                lematizer.lemmatize("test")
+                pos_tag(["test"])
+                return lematizer
+            self._lematizer = self._cargar_recurso("lematizer", ["wordnet", "averaged_perceptron_tagger_eng"], cargar)
+        return self._lematizer
+
+    @property
+    def lematizer_spacy(self):
+        """
+        Modelo spaCy 'en_core_web_sm' sin los componentes de componentes_spacy_excluidos,
+        cargado solo en el primer uso de lematizar_spacy.
+        """
+        if self._lematizer_spacy is None:
+            def cargar():
+                import spacy #muy lentoooo
+                try:
+                    return spacy.load("en_core_web_sm", exclude=self.componentes_spacy_excluidos)
+                except OSError:
+                    raise LookupError("Falta el modelo spaCy 'en_core_web_sm'. Instálelo una vez con: "
+                                      f"python -m {__package__}.preparar") from None
+            self._lematizer_spacy = self._cargar_recurso("lematizer_spacy", [], cargar)
+        return self._lematizer_spacy
+
+    def precargar(self, lmt=True):
+        """
+        Carga por adelantado los recursos que usa preprocesar_con_lmt (o preprocesar_con_stm
+        si lmt es False), por ejemplo para calentar un servidor antes de recibir consultas.
+
+        Returns
+        -------
+        dict
+            Tiempos de carga (segundos) de cada recurso cargado hasta ahora.
+        """
+        self.stop_words
+        if lmt:
+            self.lematizer
+        else:
+            self.stemmer
+        return dict(self.tiempos_carga)
+
     @classmethod
-    def descargar_paquetes_necesarios(cls):
+    def descargar_paquetes_necesarios(cls, incluir_spacy=True, directorio=None):
         """
         Descarga los recursos necesarios de NLTK y el modelo spaCy
             'en_core_web_sm' si no están disponibles localmente.
+            Es un paso de instalación que se ejecuta una sola vez (ver el módulo preparar);
+            el preprocesador nunca descarga recursos por sí mismo.
+
+        Parameters
+        ----------
+        incluir_spacy : bool
+            Si True, también instala el modelo spaCy.
+        directorio : str, optional
+            Directorio de datos de NLTK donde descargar (por defecto el de NLTK).
         """
-        spacy.cli.download("en_core_web_sm")
         for paquete in cls.paquetes_requeridos:
             try:
                 # Intenta encontrar el recurso localmente
-                find(f"{cls._resource_path(paquete)}")
+                find(cls._resource_path(paquete))
             except LookupError:
                 print(f"Descargando: {paquete}")
-                nltk.download(paquete)
+                nltk.download(paquete, download_dir=directorio)
+        if incluir_spacy:
+            import spacy
+            if not spacy.util.is_package("en_core_web_sm"):
+                spacy.cli.download("en_core_web_sm")
 
     def normalizar_tokenizar(self, doc):
         """
@@ -145,6 +304,7 @@ class Preprocesador ():
     def eliminar_stopwords(self,tokens):
         """
      Elimina las palabras vacías (stopwords) de una lista de tokens.
+     Se eliminan todas sus apariciones, no solo la primera.
 
         Parameters
         ----------
@@ -156,11 +316,28 @@ class Preprocesador ():
         list
             Lista de tokens sin stopwords.
     """
-        tokens = tokens.copy()
-        for token in self.stop_words:
-            if token in tokens:
-                tokens.remove(token)
-        return tokens
+        return [token for token in tokens if token not in self.stop_words]
+
+    def filtrar_tokens(self, tokens):
+        """
+     Filtra los tokens en una sola pasada: elimina todas las apariciones de las stopwords
+     (incluidas las de stopwords_extra) y los tokens cuya longitud está fuera de
+     [long_min, long_max]. El orden de los tokens que quedan se conserva.
+
+        Parameters
+        ----------
+        tokens : list
+            Lista de tokens.
+
+        Returns
+        -------
+        list
+            Lista de tokens filtrados.
+    """
+        stop_words = self.stop_words
+        long_min = self.long_min
+        long_max = self.long_max if self.long_max is not None else float("inf")
+        return [token for token in tokens if token not in stop_words and long_min <= len(token) <= long_max]
     
     
     def stemming (self, doc):
@@ -178,7 +355,7 @@ class Preprocesador ():
             Lista de tokens con stemming aplicado.
     """
         def steamming_doc (doc):
-            return [self.stemmer.stem(token) for token in doc]
+            return [self.cache_stems.obtener(token, self.stemmer.stem, token) for token in doc]
 
         return steamming_doc(doc)
 
@@ -196,6 +373,8 @@ class Preprocesador ():
         list
             Lista de lemas.
         """
+        # El lematizador comprueba (y carga) WordNet y el etiquetador POS antes de etiquetar.
+        lematizer = self.lematizer
         tagged = pos_tag(tokens)
 
         def get_wordnet_pos(tag):
@@ -209,10 +388,11 @@ class Preprocesador ():
                     return wordnet.ADV
                 return wordnet.NOUN
 
-        return [
-                self.lematizer.lemmatize(word, get_wordnet_pos(pos))
-                for word, pos in tagged
-            ]
+        lemas = []
+        for word, pos in tagged:
+            wordnet_pos = get_wordnet_pos(pos)
+            lemas.append(self.cache_lemas.obtener((word, wordnet_pos), lematizer.lemmatize, word, wordnet_pos))
+        return lemas
     
  
     def lematizar_spacy (self, tokens):
@@ -231,6 +411,30 @@ class Preprocesador ():
         """
       return     [token.lemma_ for token in self.lematizer_spacy(' '.join(tokens)) if not token.is_stop and not token.is_punct]
 
+    def lematizar_spacy_lote(self, lista_tokens, batch_size=1000, n_process=1):
+        """
+        Lematiza varias listas de tokens con spaCy pasándolas por nlp.pipe en lotes, en
+        lugar de llamar al modelo documento por documento.
+
+        Parameters
+        ----------
+        lista_tokens : iterable of list
+            Listas de tokens, una por documento.
+        batch_size : int
+            Número de documentos por lote de nlp.pipe.
+        n_process : int
+            Número de procesos de nlp.pipe.
+
+        Returns
+        -------
+        list
+            Lista de lemas de cada documento (mismo criterio que lematizar_spacy), en el
+            orden de entrada.
+        """
+        textos = (' '.join(tokens) for tokens in lista_tokens)
+        return [[token.lemma_ for token in doc if not token.is_stop and not token.is_punct]
+                for doc in self.lematizer_spacy.pipe(textos, batch_size=batch_size, n_process=n_process)]
+
     
     def preprocesar_con_lmt (self, doc):
         """
@@ -247,7 +451,7 @@ class Preprocesador ():
             Lista de lemas, excluyendo stopwords y signos de puntuación.
     """
         tokens = self.normalizar_tokenizar(doc)
-        wr_stopword = self.eliminar_stopwords(tokens)
+        wr_stopword = self.filtrar_tokens(tokens)
         return  ' '.join(self.lematizar(wr_stopword))
 
     
@@ -266,7 +470,7 @@ class Preprocesador ():
             Texto preprocesado.
     """
         tokens = self.normalizar_tokenizar(doc)
-        wr_stopword = self.eliminar_stopwords(tokens)
+        wr_stopword = self.filtrar_tokens(tokens)
         return  ' '.join(self.lematizar_spacy(wr_stopword))
     
 
@@ -285,11 +489,48 @@ class Preprocesador ():
             Texto preprocesado.
         """
         tokens = self.normalizar_tokenizar(doc)
-        wr_stopword = self.eliminar_stopwords(tokens)
+        wr_stopword = self.filtrar_tokens(tokens)
         return ' '.join(self.stemming(wr_stopword))
     
     
-    def preprocesar_corpus(self,corpus, attr, attr_new=attr_preprocesado,lmt=True):
+    def guardar_cache(self, ruta="cache_normalizacion.joblib"):
+        """
+        Guarda en disco las cachés de lemas y stems para reutilizarlas al reiniciar. Se
+        escribe en un archivo temporal propio del proceso y luego se reemplaza, así varios
+        procesos del servidor pueden guardar a la vez sin dejar el archivo corrupto.
+
+        Parameters
+        ----------
+        ruta : str
+            Archivo destino (joblib).
+        """
+        temporal = f"{ruta}.{os.getpid()}.tmp"
+        joblib.dump({"lemas": self.cache_lemas.entradas(), "stems": self.cache_stems.entradas()}, temporal)
+        os.replace(temporal, ruta)
+
+    def cargar_cache(self, ruta="cache_normalizacion.joblib"):
+        """
+        Carga las cachés de lemas y stems guardadas con guardar_cache, si el archivo existe.
+        Se conserva la capacidad configurada en este preprocesador.
+
+        Parameters
+        ----------
+        ruta : str
+            Archivo origen (joblib).
+
+        Returns
+        -------
+        bool
+            True si se cargó el archivo.
+        """
+        if not os.path.exists(ruta):
+            return False
+        caches = joblib.load(ruta)
+        self.cache_lemas.agregar_entradas(caches["lemas"])
+        self.cache_stems.agregar_entradas(caches["stems"])
+        return True
+
+    def preprocesar_corpus(self,corpus, attr, attr_new=attr_preprocesado,lmt=True, n_procesos=None, executor=None):
         """
          Preprocesa una columna de un DataFrame utilizando lematización o stemming.
 
@@ -303,12 +544,19 @@ class Preprocesador ():
             Nombre de la nueva columna con el texto preprocesado.
         lmt : bool
             Si True, se aplica lematización; si False, se aplica stemming.
+        n_procesos : int, optional
+            Si es mayor que 1, se usa preprocesar_corpus_paralelo con ese número de procesos.
+        executor : ProcessPoolExecutor, optional
+            Pool de crear_pool para reutilizar sus procesos entre llamadas (con n_procesos > 1).
 
         Returns
         -------
         pandas.DataFrame
             DataFrame con la columna nueva agregada.
          """
+        if n_procesos is not None and n_procesos > 1:
+            return self.preprocesar_corpus_paralelo(corpus, attr, attr_new, lmt, n_procesos, executor=executor)
+
         metodo = self.preprocesar_con_lmt
         if not lmt:
             metodo = self.preprocesar_con_stm
@@ -320,9 +568,77 @@ class Preprocesador ():
 
         return corpus
 
-    def preprocesar_corpus_spacy (self, corpus, attr, attr_new=attr_preprocesado + "_spacy", lmt=True):
+    def crear_pool(self, n_procesos=None):
+        """
+        Crea un pool de procesos trabajadores con la configuración de este preprocesador.
+        Cada trabajador carga sus recursos NLTK y llena su caché de normalización una sola
+        vez, así que conviene reutilizar el pool al preprocesar un corpus por lotes.
+
+        Returns
+        -------
+        concurrent.futures.ProcessPoolExecutor
+        """
+        return ProcessPoolExecutor(max_workers=n_procesos or os.cpu_count(), initializer=_iniciar_worker,
+                                   initargs=(self.attr_id, self.long_min, self.long_max, self.stopwords_extra,
+                                             self.cache_lemas.capacidad))
+
+    def preprocesar_corpus_paralelo(self, corpus, attr, attr_new=attr_preprocesado, lmt=True, n_procesos=None, tam_chunk=1000, reportar=True,
+                                    executor=None):
+        """
+        Preprocesa una columna de un DataFrame repartiendo bloques de documentos entre
+        varios procesos. Cada proceso inicializa sus recursos NLTK una sola vez y los
+        bloques se reúnen en el orden original, por lo que el resultado es el mismo que
+        el de preprocesar_corpus.
+
+        Parameters
+        ----------
+        corpus : pandas.DataFrame
+            DataFrame que contiene la columna de texto a procesar.
+        attr : str
+            Nombre de la columna de texto original.
+        attr_new : str
+            Nombre de la nueva columna con el texto preprocesado.
+        lmt : bool
+            Si True, se aplica lematización; si False, se aplica stemming.
+        n_procesos : int, optional
+            Número de procesos (por defecto os.cpu_count()).
+        tam_chunk : int
+            Número de documentos por bloque.
+        reportar : bool
+            Si True, imprime el avance y el rendimiento (documentos por segundo).
+        executor : ProcessPoolExecutor, optional
+            Pool de crear_pool a reutilizar; si no se indica, se crea uno solo para esta
+            llamada.
+
+        Returns
+        -------
+        pandas.DataFrame
+            DataFrame con la columna nueva agregada.
+        """
+        textos = corpus[attr].tolist()
+        chunks = [textos[i:i + tam_chunk] for i in range(0, len(textos), tam_chunk)]
+        resultado = []
+        inicio = time.perf_counter()
+
+        with nullcontext(executor) if executor is not None else self.crear_pool(n_procesos) as executor:
+            for procesados in executor.map(_preprocesar_chunk, chunks, [lmt] * len(chunks)):
+                resultado.extend(procesados)
+                if reportar:
+                    segundos = time.perf_counter() - inicio
+                    print(f"Preprocesados {len(resultado)}/{len(textos)} documentos "
+                          f"({len(resultado) / segundos:.1f} docs/s)")
+
+        corpus[attr_new] = resultado
+
+        if self.attr_id not in corpus.columns:
+            corpus[self.attr_id] = [str(i) for i in range(len(corpus))]
+
+        return corpus
+
+    def preprocesar_corpus_spacy (self, corpus, attr, attr_new=attr_preprocesado + "_spacy", lmt=True, batch_size=1000, n_process=1):
         """
         Preprocesa una columna de un DataFrame utilizando spaCy (lematización o stemming).
+        Con lematización, los documentos se pasan por spaCy en lotes (lematizar_spacy_lote).
 
             Parameters
             ----------
@@ -334,17 +650,22 @@ class Preprocesador ():
                 Nombre de la nueva columna con el texto preprocesado.
             lmt : bool
                 Si True, se aplica lematización; si False, se aplica stemming.
+            batch_size : int
+                Documentos por lote de nlp.pipe.
+            n_process : int
+                Procesos de nlp.pipe.
 
             Returns
             -------
             pandas.DataFrame
                 DataFrame con la columna nueva agregada.
         """
-        metodo = self.preprocesar_con_lmt_spacy
-        if not lmt:
-            metodo = self.preprocesar_con_stm
-
-        corpus[attr_new] = corpus[attr].apply(lambda x: metodo(x))
+        if lmt:
+            tokens = (self.filtrar_tokens(self.normalizar_tokenizar(doc)) for doc in corpus[attr])
+            lemas = self.lematizar_spacy_lote(tokens, batch_size, n_process)
+            corpus[attr_new] = [' '.join(doc) for doc in lemas]
+        else:
+            corpus[attr_new] = corpus[attr].apply(lambda x: self.preprocesar_con_stm(x))
 
         if self.attr_id not in corpus.columns:
             corpus[self.attr_id] = [str(i) for i in range(len(corpus))]
@@ -0,0 +1,85 @@
+"""
+Corpus, consultas y juicios de relevancia sintéticos para medir el rendimiento.
+
+Las palabras se forman con sílabas consonante-vocal a partir del id de término y su
+frecuencia sigue una ley de Zipf (``p(r) ~ 1 / r**s``), como el vocabulario de un corpus
+real: pocas palabras muy frecuentes y una cola larga de palabras raras. Cada consulta toma
+algunos términos de un documento elegido al azar, que queda como su único relevante. Con la
+misma semilla se generan exactamente los mismos datos.
+"""
+import numpy as np
+import pandas as pd
+
+CONSONANTES = list("bcdfghjklmnprstvz")
+VOCALES = list("aeiou")
+SILABAS = np.array([c + v for c in CONSONANTES for v in VOCALES])
+
+def generar_vocabulario(n_terminos):
+    """
+    Genera n_terminos palabras distintas de al menos dos sílabas (el id del término
+    escrito en base len(SILABAS)).
+    """
+    base = len(SILABAS)
+    palabras = []
+    for termino in range(base, n_terminos + base):
+        silabas = []
+        while termino > 0:
+            silabas.append(SILABAS[termino % base])
+            termino //= base
+        palabras.append("".join(reversed(silabas)))
+    return np.array(palabras, dtype=object)
+
+def probabilidades_zipf(n_terminos, s=1.1):
+    """
+    Probabilidad de cada rango del vocabulario según la ley de Zipf con exponente s.
+    """
+    pesos = 1 / np.arange(1, n_terminos + 1) ** s
+    return pesos / pesos.sum()
+
+def generar_corpus(n_docs, n_terminos=50000, long_media=80, s=1.1, semilla=0, tam_bloque=50000):
+    """
+    Genera un corpus sintético con longitudes de documento Poisson(long_media).
+
+    Parámetros:
+    - n_docs: número de documentos.
+    - n_terminos: tamaño del vocabulario.
+    - long_media: número medio de palabras por documento.
+    - s: exponente de la ley de Zipf.
+    - semilla: semilla del generador.
+    - tam_bloque: documentos que se muestrean a la vez (limita la memoria temporal).
+
+    Retorna:
+    - DataFrame con las columnas doc_id y text.
+    """
+    rng = np.random.default_rng(semilla)
+    palabras = generar_vocabulario(n_terminos)
+    acumulada = np.cumsum(probabilidades_zipf(n_terminos, s))
+    textos = []
+    for inicio in range(0, n_docs, tam_bloque):
+        largos = np.maximum(rng.poisson(long_media, min(tam_bloque, n_docs - inicio)), 1)
+        ids = np.minimum(np.searchsorted(acumulada, rng.random(largos.sum())), n_terminos - 1)
+        limites = np.concatenate([[0], np.cumsum(largos)])
+        tokens = palabras[ids]
+        textos.extend(" ".join(tokens[a:b]) for a, b in zip(limites[:-1], limites[1:]))
+    return pd.DataFrame({"doc_id": [f"d{i}" for i in range(n_docs)], "text": textos})
+
+def generar_consultas(corpus, n_consultas, min_terminos=2, max_terminos=5, semilla=0):
+    """
+    Genera consultas tomando entre min_terminos y max_terminos palabras de documentos
+    elegidos al azar; el documento de origen es el relevante de cada consulta.
+
+    Retorna:
+    - Tupla (queries, qrels): DataFrames con las columnas (query_id, text) y
+      (query_id, doc_id, relevance), como los de data/queries.zip y data/qrels.zip.
+    """
+    rng = np.random.default_rng(semilla + 1)
+    origenes = rng.integers(0, len(corpus), n_consultas)
+    textos = []
+    for origen in origenes:
+        palabras = corpus["text"].iat[origen].split()
+        n = min(len(palabras), rng.integers(min_terminos, max_terminos + 1))
+        textos.append(" ".join(rng.choice(palabras, n, replace=False)))
+    query_ids = [f"q{i}" for i in range(n_consultas)]
+    queries = pd.DataFrame({"query_id": query_ids, "text": textos})
+    qrels = pd.DataFrame({"query_id": query_ids, "doc_id": corpus["doc_id"].values[origenes], "relevance": 1})
+    return queries, qrels
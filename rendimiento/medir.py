@@ -0,0 +1,313 @@
+"""
+Mide el rendimiento del sistema sobre corpus sintéticos (ver corpus_sintetico.py) y
+escribe los resultados en JSON. Se ejecuta desde el directorio padre del proyecto:
+
+    python -m busqueda_ir.rendimiento.medir --docs 10000 100000 --salida rendimiento.json
+    python -m busqueda_ir.rendimiento.medir --docs 10000 --base rendimiento.json --tolerancia 0.1
+
+Para cada tamaño de corpus, en un proceso nuevo y en un directorio temporal:
+
+1. preprocesamiento del corpus (Preprocesador.preprocesar_corpus) y de las consultas;
+2. construcción de Tfidf y Bm25 y escritura del índice columnar y del almacén de documentos;
+3. evaluación de ambos modelos con Motor_evaluacion;
+4. latencia de Sri_app.buscar por métrica, en otro proceso y con la aplicación cargada
+   igual que en el servidor (índice mapeado, sin caché de resultados).
+
+Se reportan documentos y tokens por segundo, latencias p50/p95/p99, consultas por segundo
+y la memoria residente máxima del proceso después de cada etapa (la de la búsqueda es la
+del proceso que solo sirve consultas). Con --base se comparan
+los resultados con un JSON anterior y el comando termina con código 1 si alguna medida
+empeora más que la tolerancia.
+"""
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from .corpus_sintetico import generar_consultas, generar_corpus
+from ..preprocesamiento.preprocesador import Preprocesador
+from ..ir_models.tfidf.tf_idf import Tfidf
+from ..ir_models.bm25.bm25 import Bm25
+from ..ir_models.indice_columnar import guardar_indice
+from ..tools.almacen_documentos import AlmacenDocumentos
+from ..evaluacion.motor_evaluacion import Motor_evaluacion
+from ..sri import Sri_app
+
+VERSION_FORMATO = 1
+PERCENTILES = (50, 95, 99)
+METRICAS = ("sim_cos", "bm25_scores", "promedio")
+
+def rss_pico_mb():
+    """
+    Memoria residente máxima (MB) de este proceso y de sus procesos hijos ya terminados.
+    """
+    # ru_maxrss está en KB en Linux y en bytes en macOS.
+    escala = 1024 * 1024 if sys.platform == "darwin" else 1024
+    proceso = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / escala
+    if os.path.exists("/proc/self/status"):
+        # En Linux ru_maxrss se hereda a través de exec (un proceso "spawn" empieza con el
+        # máximo del padre); VmHWM es el del proceso actual.
+        with open("/proc/self/status") as estado:
+            for linea in estado:
+                if linea.startswith("VmHWM:"):
+                    proceso = int(linea.split()[1]) / 1024
+    return {"proceso": proceso, "hijos": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / escala}
+
+def resumir_latencias(tiempos):
+    """
+    Resume una lista de latencias (s) en milisegundos y consultas por segundo.
+    """
+    tiempos = np.asarray(tiempos) * 1000
+    resumen = {f"p{p}_ms": float(np.percentile(tiempos, p)) for p in PERCENTILES}
+    resumen["media_ms"] = float(tiempos.mean())
+    resumen["consultas_por_s"] = float(1000 / tiempos.mean())
+    return resumen
+
+def medir(n_docs, n_consultas=1000, k=10, n_terminos=50000, long_media=80, s=1.1, semilla=0,
+          n_procesos=None, calentamiento=20, directorio=None, proceso_busqueda=True):
+    """
+    Ejecuta todas las etapas para un tamaño de corpus.
+
+    Parámetros:
+    - n_docs, n_terminos, long_media, s, semilla: ver generar_corpus.
+    - n_consultas: consultas de la evaluación y de la medición de latencia.
+    - k: documentos por búsqueda.
+    - n_procesos: procesos para preprocesar el corpus (None = serial).
+    - calentamiento: búsquedas por métrica que no se miden (cargan las páginas del índice).
+    - directorio: directorio de trabajo (por defecto uno temporal que se borra al final).
+    - proceso_busqueda: medir la búsqueda en un proceso aparte, para que su memoria
+      residente máxima sea la de servir consultas y no la de construir el índice.
+
+    Retorna:
+    - dict con la configuración y las medidas de cada etapa.
+    """
+    configuracion = {"n_docs": n_docs, "n_consultas": n_consultas, "k": k, "n_terminos": n_terminos,
+                     "long_media": long_media, "s": s, "semilla": semilla, "n_procesos": n_procesos}
+    resultado = {"configuracion": configuracion, "etapas": {}}
+    etapas = resultado["etapas"]
+    temporal = directorio is None
+    directorio = os.path.abspath(tempfile.mkdtemp(prefix="sri_rendimiento_") if temporal else directorio)
+    os.makedirs(directorio, exist_ok=True)
+    # Sri_app y los modelos usan rutas relativas al directorio actual.
+    anterior = os.getcwd()
+    os.chdir(directorio)
+    try:
+        inicio = time.perf_counter()
+        corpus = generar_corpus(n_docs, n_terminos, long_media, s, semilla)
+        queries, qrels = generar_consultas(corpus, n_consultas, semilla=semilla)
+        etapas["generacion"] = {"segundos": time.perf_counter() - inicio}
+
+        preprocesador = Preprocesador()
+        atributo = preprocesador.attr_preprocesado
+        inicio = time.perf_counter()
+        preprocesador.preprocesar_corpus(corpus, "text", atributo, True, n_procesos)
+        segundos = time.perf_counter() - inicio
+        n_tokens = int(corpus["text"].str.count(" ").sum() + n_docs)
+        inicio = time.perf_counter()
+        queries[atributo] = queries["text"].apply(preprocesador.preprocesar_con_lmt)
+        etapas["preprocesamiento"] = {"segundos": segundos, "docs_por_s": n_docs / segundos,
+                                      "tokens_por_s": n_tokens / segundos,
+                                      "segundos_consultas": time.perf_counter() - inicio,
+                                      "rss_pico_mb": rss_pico_mb()}
+
+        textos = corpus[atributo].values
+        inicio = time.perf_counter()
+        modelo_tfidf = Tfidf(textos)
+        segundos_tfidf = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        modelo_bm25 = Bm25(textos)
+        segundos_bm25 = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        guardar_indice("indice", {"tfidf": modelo_tfidf, "bm25": modelo_bm25}, corpus["doc_id"].values)
+        AlmacenDocumentos.construir(os.path.join("indice", "documentos"), corpus)
+        segundos_escritura = time.perf_counter() - inicio
+        total = segundos_tfidf + segundos_bm25 + segundos_escritura
+        etapas["indexacion"] = {"segundos_tfidf": segundos_tfidf, "segundos_bm25": segundos_bm25,
+                                "segundos_escritura": segundos_escritura, "segundos": total,
+                                "docs_por_s": n_docs / total, "rss_pico_mb": rss_pico_mb()}
+
+        etapas["evaluacion"] = {}
+        for nombre, modelo, archivo in (("tfidf", modelo_tfidf, "metricas_modelo_tfidf_res"),
+                                        ("bm25", modelo_bm25, "metricas_modelo_bm25_res")):
+            inicio = time.perf_counter()
+            tabla = Motor_evaluacion(modelo, corpus, queries, qrels, key_query=atributo).evaluar()
+            etapas["evaluacion"][f"segundos_{nombre}"] = time.perf_counter() - inicio
+            # Sri_app(evaluacion=False) lee las métricas guardadas al iniciar.
+            Motor_evaluacion.resumen(tabla, 50).to_pickle(archivo)
+        etapas["evaluacion"]["segundos"] = etapas["evaluacion"]["segundos_tfidf"] + etapas["evaluacion"]["segundos_bm25"]
+        etapas["evaluacion"]["rss_pico_mb"] = rss_pico_mb()
+
+        consultas = list(queries["text"].values)
+        del corpus, textos, modelo_tfidf, modelo_bm25
+        gc.collect()
+        if proceso_busqueda:
+            etapas.update(en_proceso(medir_busqueda, directorio, consultas, k, calentamiento))
+        else:
+            etapas.update(medir_busqueda(directorio, consultas, k, calentamiento))
+    finally:
+        os.chdir(anterior)
+        if temporal:
+            shutil.rmtree(directorio, ignore_errors=True)
+    return resultado
+
+def medir_busqueda(directorio, consultas, k=10, calentamiento=20):
+    """
+    Carga Sri_app sobre el índice de directorio igual que el servidor (evaluacion=False,
+    índice mapeado, sin caché de resultados) y mide la latencia de Sri_app.buscar con
+    cada métrica.
+
+    Retorna:
+    - dict con las etapas "carga" y "busqueda".
+    """
+    anterior = os.getcwd()
+    os.chdir(directorio)
+    try:
+        inicio = time.perf_counter()
+        app = Sri_app(evaluacion=False, tam_cache_resultados=0)
+        etapas = {"carga": {"segundos": time.perf_counter() - inicio}, "busqueda": {}}
+        for metrica in METRICAS:
+            for query in consultas[:calentamiento]:
+                app.buscar(query, k, metrica)
+            tiempos = []
+            for query in consultas:
+                inicio = time.perf_counter()
+                app.buscar(query, k, metrica)
+                tiempos.append(time.perf_counter() - inicio)
+            etapas["busqueda"][metrica] = resumir_latencias(tiempos)
+        etapas["busqueda"]["rss_pico_mb"] = rss_pico_mb()
+    finally:
+        os.chdir(anterior)
+    return etapas
+
+def en_proceso(funcion, *argumentos, **parametros):
+    """
+    Ejecuta una función en un proceso nuevo, para que su memoria residente máxima no
+    incluya la de las etapas o corridas anteriores.
+    """
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(funcion, *argumentos, **parametros).result()
+
+def entorno():
+    """
+    Describe la máquina y las versiones con las que se midió.
+    """
+    import pandas
+    import scipy
+    import sklearn
+    return {"python": platform.python_version(), "plataforma": platform.platform(),
+            "procesador": platform.processor() or platform.machine(), "cpus": os.cpu_count(),
+            "numpy": np.__version__, "scipy": scipy.__version__, "pandas": pandas.__version__,
+            "sklearn": sklearn.__version__}
+
+# Medidas comparables: ruta dentro de las etapas -> True si un valor mayor es mejor.
+MEDIDAS = {
+    ("preprocesamiento", "docs_por_s"): True,
+    ("indexacion", "docs_por_s"): True,
+    ("indexacion", "rss_pico_mb", "proceso"): False,
+    ("evaluacion", "segundos"): False,
+    ("carga", "segundos"): False,
+    ("busqueda", "rss_pico_mb", "proceso"): False,
+    **{("busqueda", metrica, f"p{p}_ms"): False
+       for metrica in METRICAS for p in PERCENTILES},
+}
+
+def _valor(etapas, ruta):
+    for clave in ruta:
+        if not isinstance(etapas, dict) or clave not in etapas:
+            return None
+        etapas = etapas[clave]
+    return etapas
+
+def comparar(actual, base, tolerancia=0.1):
+    """
+    Compara dos resultados de medir (del mismo tamaño de corpus) medida a medida.
+
+    Parámetros:
+    - actual, base: dicts retornados por medir.
+    - tolerancia: empeoramiento relativo permitido (0.1 = 10 %).
+
+    Retorna:
+    - Lista de dicts (medida, base, actual, cambio, regresion), donde cambio es el
+      empeoramiento relativo (negativo si mejoró).
+    """
+    filas = []
+    for ruta, mayor_es_mejor in MEDIDAS.items():
+        valor_base, valor_actual = _valor(base["etapas"], ruta), _valor(actual["etapas"], ruta)
+        if valor_base is None or valor_actual is None or valor_base <= 0:
+            continue
+        cambio = (valor_base - valor_actual) / valor_base if mayor_es_mejor else (valor_actual - valor_base) / valor_base
+        filas.append({"medida": ".".join(ruta), "base": valor_base, "actual": valor_actual,
+                      "cambio": cambio, "regresion": cambio > tolerancia})
+    return filas
+
+def comparar_archivo(resultados, ruta_base, tolerancia=0.1):
+    """
+    Compara cada tamaño de corpus medido con el del mismo tamaño en un JSON anterior e
+    imprime el cambio de cada medida.
+
+    Retorna:
+    - True si hay alguna regresión mayor que la tolerancia.
+    """
+    with open(ruta_base, encoding="utf-8") as archivo:
+        base = {corrida["configuracion"]["n_docs"]: corrida for corrida in json.load(archivo)["corridas"]}
+    hay_regresion = False
+    for corrida in resultados["corridas"]:
+        n_docs = corrida["configuracion"]["n_docs"]
+        if n_docs not in base:
+            print(f"{n_docs} documentos: sin medición en la base")
+            continue
+        if corrida["configuracion"] != base[n_docs]["configuracion"]:
+            print(f"{n_docs} documentos: la configuración difiere de la base, la comparación es orientativa")
+        for fila in comparar(corrida, base[n_docs], tolerancia):
+            marca = "REGRESIÓN" if fila["regresion"] else "ok"
+            print(f"{n_docs:>9} {fila['medida']:<32} {fila['base']:>12.3f} -> {fila['actual']:>12.3f} "
+                  f"({fila['cambio']:+.1%}) {marca}")
+            hay_regresion |= fila["regresion"]
+    return hay_regresion
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide indexación, latencia de búsqueda y evaluación sobre corpus sintéticos.")
+    parser.add_argument("--docs", type=int, nargs="+", default=[10000], help="Tamaños de corpus (p. ej. 10000 100000 1000000).")
+    parser.add_argument("--consultas", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--terminos", type=int, default=50000, help="Tamaño del vocabulario.")
+    parser.add_argument("--long-media", type=int, default=80, help="Palabras por documento en promedio.")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Exponente de la ley de Zipf.")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--procesos", type=int, default=None, help="Procesos para preprocesar el corpus.")
+    parser.add_argument("--salida", default="rendimiento.json", help="Archivo JSON de resultados.")
+    parser.add_argument("--base", default=None, help="JSON anterior con el que comparar.")
+    parser.add_argument("--tolerancia", type=float, default=0.1, help="Empeoramiento relativo permitido.")
+    args = parser.parse_args()
+
+    resultados = {"version": VERSION_FORMATO, "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"), "entorno": entorno(), "corridas": []}
+    for n_docs in args.docs:
+        print(f"Midiendo {n_docs} documentos...")
+        corrida = en_proceso(medir, n_docs, n_consultas=args.consultas, k=args.k, n_terminos=args.terminos,
+                                   long_media=args.long_media, s=args.zipf, semilla=args.semilla, n_procesos=args.procesos)
+        etapas = corrida["etapas"]
+        print(f"  preprocesamiento {etapas['preprocesamiento']['docs_por_s']:.0f} docs/s, "
+              f"indexación {etapas['indexacion']['docs_por_s']:.0f} docs/s, "
+              f"evaluación {etapas['evaluacion']['segundos']:.2f} s")
+        for metrica in METRICAS:
+            latencias = etapas["busqueda"][metrica]
+            print(f"  {metrica}: p50 {latencias['p50_ms']:.2f} ms, p95 {latencias['p95_ms']:.2f} ms, "
+                  f"p99 {latencias['p99_ms']:.2f} ms")
+        resultados["corridas"].append(corrida)
+
+    with open(args.salida, "w", encoding="utf-8") as archivo:
+        json.dump(resultados, archivo, indent=2, ensure_ascii=False)
+    print(f"Resultados escritos en {args.salida}")
+    if args.base and comparar_archivo(resultados, args.base, args.tolerancia):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
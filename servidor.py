@@ -0,0 +1,52 @@
+"""
+Servidor con varios procesos que comparten el índice en memoria.
+
+Cada proceso de uvicorn crea su Sri_app, pero el índice columnar (indice/) y el almacén de
+documentos (indice/documentos/) se abren con np.load(mmap_mode="r"): todos los procesos
+mapean los mismos archivos de solo lectura y comparten sus páginas en la caché del sistema
+operativo, así que la memoria residente de cada proceso no crece con el corpus. Los
+procesos no cargan consultas ni qrels (SRI_EVALUACION=0).
+
+Con --fragmentos N, los fragmentos (indice_fragmentos/) se construyen una sola vez aquí,
+antes de iniciar los procesos del servidor, y cada proceso solo los abre. Cada proceso
+inicia sus propios N procesos de fragmento, así que conviene combinarlo con pocos workers.
+
+Se ejecuta desde el directorio padre del proyecto:
+
+    python -m busqueda_ir.servidor --workers 4 --port 8000
+"""
+import argparse
+import os
+import uvicorn
+from .ir_models.indice_columnar import existe_indice
+from .tools.almacen_documentos import AlmacenDocumentos
+from .sri import Sri_app
+
+def main():
+    parser = argparse.ArgumentParser(description="Sirve la API con varios procesos sobre el índice mapeado en memoria.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Número de procesos.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--hilos", type=int, default=None, help="Hilos de búsqueda por proceso (SRI_HILOS).")
+    parser.add_argument("--fragmentos", type=int, default=None,
+                        help="Fragmentos por consulta (SRI_FRAGMENTOS); se construyen antes de iniciar los procesos.")
+    args = parser.parse_args()
+
+    # Los artefactos (indice/, metricas_*) se buscan con rutas relativas al proyecto.
+    proyecto = os.path.dirname(os.path.abspath(__file__))
+    os.chdir(proyecto)
+    if not existe_indice("indice") or not AlmacenDocumentos.existe(os.path.join("indice", "documentos")):
+        raise SystemExit("No se encontró el índice columnar con su almacén de documentos en indice/. "
+                         f"Genérelo con: python -m {__package__}.tools.convertir_indice")
+
+    os.environ["SRI_EVALUACION"] = "0"
+    if args.hilos:
+        os.environ["SRI_HILOS"] = str(args.hilos)
+    fragmentos = args.fragmentos or int(os.environ.get("SRI_FRAGMENTOS", 0))
+    if fragmentos > 0:
+        os.environ["SRI_FRAGMENTOS"] = str(Sri_app(evaluacion=False).construir_fragmentos(fragmentos))
+    uvicorn.run(f"{__package__}.main:app", host=args.host, port=args.port, workers=args.workers,
+                app_dir=os.path.dirname(proyecto))
+
+if __name__ == "__main__":
+    main()
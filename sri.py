@@ -1,20 +1,48 @@
+import os
+import shutil
 import pandas as pd
 import numpy as np
+from scipy import sparse
+from typing import NamedTuple
 from .tools.herramienta import PklZipTools
+from .tools.almacen_documentos import AlmacenDocumentos
 from .preprocesamiento.preprocesador import Preprocesador
 from .ir_models.tfidf.tf_idf import Tfidf
 from .ir_models.bm25.bm25 import Bm25
-from .evaluacion.metrica_modelo import Metrica_modelo
-from sklearn.preprocessing import MinMaxScaler
+from .ir_models import indice_columnar
+from .ir_models.indice_incremental import IndiceIncremental
+from .ir_models.indice_fragmentado import IndiceFragmentado, fragmentar
+from .ir_models.indice_posicional import IndicePosicional, analizar_consulta
+from .ir_models import fusion as fusion_candidatos
+from .ir_models.poda import top_k_denso, top_k_filas
+from .evaluacion.motor_evaluacion import Motor_evaluacion
+from .cache_resultados import CacheResultados, huella_archivos
+from .telemetria import Telemetria
 from sklearn.feature_extraction.text import CountVectorizer
 
+class ResultadoBusqueda (NamedTuple):
+  """
+   Resultado de Sri_app.buscar_top_k: posiciones en el corpus, ids y puntajes normalizados
+   de los k documentos recuperados, ordenados de mayor a menor.
+  """
+  indices: np.ndarray
+  doc_ids: np.ndarray
+  scores: np.ndarray
+  metrica: str
+
+  def recortar(self, k):
+    """
+     Retorna los primeros k documentos del resultado.
+    """
+    return ResultadoBusqueda(self.indices[:k], self.doc_ids[:k], self.scores[:k], self.metrica)
+
 class Sri_app () :
   """
    Clase principal para la aplicación de Recuperación de Información (RI).
     Maneja el preprocesamiento, modelado (TF-IDF y BM25), evaluación y búsqueda en un corpus textual.
   """
 
-  def __init__(self,corpus=None, queries=None, qrels=None, preprocesar = False, procesar=False, attr_corpus="text",attr_id="doc_id", attr_query="text", lmt=True):
+  def __init__(self,corpus=None, queries=None, qrels=None, preprocesar = False, procesar=False, attr_corpus="text",attr_id="doc_id", attr_query="text", lmt=True, n_procesos=None, tam_cache_resultados=10000, ttl_cache_resultados=3600, evaluacion=True, posicional=False):
     """
     Inicializa la aplicación RI.
 
@@ -28,21 +56,45 @@ class Sri_app () :
         - attr_id: Nombre de la columna de identificadores únicos de documentos.
         - attr_query: Nombre de la columna de texto en las consultas.
         - lmt: Booleano para usar lematización (True) o stemming (False).
+        - n_procesos: número de procesos para preprocesar el corpus (None o 1 = serial).
+        - tam_cache_resultados: entradas de la caché de resultados de búsqueda.
+        - ttl_cache_resultados: segundos de vida de cada resultado en caché (None = sin vencimiento).
+        - evaluacion: si es False (modo servidor), no se cargan consultas ni qrels ni se
+          prepara la evaluación; solo se leen las métricas guardadas. Con el índice columnar
+          y el almacén de documentos, el proceso no guarda en memoria nada proporcional al
+          corpus además de lo que está mapeado desde disco.
+        - posicional: si es True, al construir los modelos (procesar=True) se construye
+          también el índice posicional para las consultas de frase ("...") y de
+          proximidad ("..."~N). Al cargar un índice columnar se usa si está guardado.
     """
     self.corpus = corpus
     self.queries = queries
     self.qrels = qrels
     self.preprocesador = Preprocesador()
+    self.cache_normalizacion_id = "cache_normalizacion.joblib"
+    self.preprocesador.cargar_cache(self.cache_normalizacion_id)
     self.attr_id = attr_id
     self.text_preprocessed_id = self.preprocesador.attr_preprocesado
     self.modelo_tfidf = None
     self.modelo_bm25 = None
+    self.indice_id = "indice"
+    self.documentos_id = os.path.join(self.indice_id, "documentos")
+    self.almacen = None
+    self.doc_ids = None
+    self.incremental = None
+    self.fragmentos_id = "indice_fragmentos"
+    self.fragmentado = None
+    self.posiciones_id = os.path.join(self.indice_id, "posiciones")
+    self.indice_posicional = None
+    self.cache_resultados = CacheResultados(tam_cache_resultados, ttl_cache_resultados)
+    # Histogramas de duración por etapa de búsqueda (ver telemetria.py y GET /metrics).
+    self.telemetria = Telemetria()
+    self.huella = None
     self.metrica_tfidf_id = "metricas_modelo_tfidf_res"
     self.metrica_bm25_id = "metricas_modelo_bm25_res"
     self.metricas_tfidf_res = None
     self.metricas_bm25_res = None
     self.metodo = self.preprocesador.preprocesar_con_lmt
-    self.scaler = MinMaxScaler()
     self.metricas_buscar = ['sim_cos', 'bm25_scores', "promedio"]
     self.vectorizer_cv = CountVectorizer()
     self.attr_query = attr_query
@@ -51,44 +103,310 @@ class Sri_app () :
           self.metodo = self.preprocesador.preprocesar_con_lmt
 
     if (preprocesar):
-        self.preprocesador.preprocesar_corpus(corpus, attr_corpus, self.text_preprocessed_id,lmt) #lmt o stm
+        self.preprocesador.preprocesar_corpus(corpus, attr_corpus, self.text_preprocessed_id,lmt, n_procesos) #lmt o stm
         if self.queries is not None and len(self.queries) > 0:
           self.queries[self.text_preprocessed_id] = queries[attr_query].apply(self.metodo)
+        self.guardar_cache_normalizacion()
     else: 
-      self.corpus = PklZipTools.read_pkl_from_zip('data/dataset.zip')
-      self.queries = PklZipTools.read_pkl_from_zip('data/queries.zip')
-      self.qrels = PklZipTools.read_pkl_from_zip('data/qrels.zip')
+      if not procesar and indice_columnar.existe_indice(self.indice_id) and AlmacenDocumentos.existe(self.documentos_id):
+        # El texto de los documentos se lee del almacén mapeado y los ids de la tabla mapeada;
+        # el DataFrame de ids solo se arma si se va a evaluar.
+        self.doc_ids = indice_columnar.cargar_doc_ids(self.indice_id)
+        self.almacen = AlmacenDocumentos(self.documentos_id)
+        if evaluacion:
+          self.corpus = pd.DataFrame({self.attr_id: self.doc_ids})
+      else:
+        self.corpus = PklZipTools.read_pkl_from_zip('data/dataset.zip')
+      if evaluacion:
+        self.queries = PklZipTools.read_pkl_from_zip('data/queries.zip')
+        self.qrels = PklZipTools.read_pkl_from_zip('data/qrels.zip')
+    if self.doc_ids is None:
+      self.doc_ids = self.corpus[self.attr_id].values
   
     if (procesar):
       self.modelo_tfidf = Tfidf(self.corpus[self.text_preprocessed_id].values)
       self.modelo_bm25 = Bm25(self.corpus[self.text_preprocessed_id].values)
+      if posicional:
+        self.indice_posicional = IndicePosicional.construir(self.corpus[self.text_preprocessed_id].values)
+      self.guardar_indice()
+    elif indice_columnar.existe_indice(self.indice_id):
+      self.modelo_tfidf = Tfidf(modelName=os.path.join(self.indice_id, "tfidf"))
+      self.modelo_bm25 = Bm25(modelName=os.path.join(self.indice_id, "bm25"))
+      # El índice posicional solo se carga si lo escribió la misma construcción: el manifiesto
+      # raíz lo lista y tiene los mismos documentos.
+      manifiesto = indice_columnar.leer_manifiesto(self.indice_id)
+      if ("posiciones" in manifiesto["modelos"] and manifiesto["n_docs"] == len(self.doc_ids)
+          and indice_columnar.existe_indice(self.posiciones_id)):
+        self.indice_posicional = IndicePosicional.cargar(self.posiciones_id)
     else: 
       self.modelo_tfidf = Tfidf()
       self.modelo_bm25 = Bm25()
+    self.actualizar_huella()
     
 
     # Métricas
-    if self.queries is not None and self.qrels is not None and len(self.queries) > 0 and len(self.qrels) > 0:
-      self.metrica_modelo_tfidf = Metrica_modelo(self.modelo_tfidf, self.corpus, self.queries, self.qrels)
-      self.metrica_modelo_bm25 = Metrica_modelo(self.modelo_bm25, self.corpus,self.queries, self.qrels)
+    if not evaluacion:
+      self.metricas_tfidf_res = self.carga_metrica(self.metrica_tfidf_id)
+      self.metricas_bm25_res = self.carga_metrica(self.metrica_bm25_id)
+    elif self.queries is not None and self.qrels is not None and len(self.queries) > 0 and len(self.qrels) > 0:
+      self.metrica_modelo_tfidf = Motor_evaluacion(self.modelo_tfidf, self.corpus, self.queries, self.qrels, key_query=self.text_preprocessed_id)
+      self.metrica_modelo_bm25 = Motor_evaluacion(self.modelo_bm25, self.corpus, self.queries, self.qrels, key_query=self.text_preprocessed_id)
       self.resultados_metricas()
 
 
-  def calcular_metrica(self, modelo, modelo_id):
+  def guardar_cache_normalizacion(self):
+    """
+    Guarda las cachés de lemas y stems del preprocesador junto a los modelos, para que
+    un servidor reiniciado no tenga que recalcularlas.
+    """
+    self.preprocesador.guardar_cache(self.cache_normalizacion_id)
+
+  def guardar_indice(self):
+    """
+    Guarda los modelos TF-IDF y BM25 (y el índice posicional, si se construyó) y la tabla
+    de ids de documento como índice columnar en self.indice_id, y el texto de los
+    documentos en su almacén (self.documentos_id); ambos se cargan mapeados en memoria al
+    iniciar la aplicación.
+    """
+    self.requerir_corpus()
+    modelos = {"tfidf": self.modelo_tfidf, "bm25": self.modelo_bm25}
+    if self.indice_posicional is not None:
+      modelos["posiciones"] = self.indice_posicional
+    else:
+      # Las posiciones de una construcción anterior no corresponden al corpus nuevo.
+      shutil.rmtree(self.posiciones_id, ignore_errors=True)
+    indice_columnar.guardar_indice(self.indice_id, modelos, self.corpus[self.attr_id].values)
+    self.doc_ids = self.corpus[self.attr_id].values
+    self.almacen = AlmacenDocumentos.construir(self.documentos_id, self.corpus)
+    self.actualizar_huella()
+
+  def requerir_corpus(self):
+    """
+    Comprueba que el texto preprocesado del corpus esté en memoria. Con el almacén de
+    documentos (modo servidor) el corpus es None o solo tiene los ids.
+    """
+    if self.corpus is None or self.text_preprocessed_id not in self.corpus.columns:
+      raise ValueError("El texto del corpus no está en memoria (se usa el almacén de documentos de "
+                       f"{self.documentos_id}); cree Sri_app con el corpus o con procesar=True")
+
+  def actualizar_huella(self):
+    """
+    Calcula la huella de los artefactos del índice cargado (índice columnar o archivos
+    joblib). La caché de resultados se vacía sola cuando la huella cambia.
+    """
+    if indice_columnar.existe_indice(self.indice_id):
+      rutas = [self.indice_id]
+    else:
+      rutas = [self.modelo_tfidf.modelName + ".joblib", "matriz_" + self.modelo_tfidf.modelName + ".joblib",
+               self.modelo_bm25.modelName + ".joblib"]
+    self.huella = huella_archivos(rutas)
+    if self.incremental is not None:
+      self.huella += f":{self.incremental.generacion}"
+
+  def activar_indexacion_incremental(self, max_segmentos=8):
     """
-            Calcula precisión, recall y MAP para un modelo dado.
+    Pasa la búsqueda a un IndiceIncremental construido sobre el índice BM25 cargado, que
+    admite agregar, actualizar y eliminar documentos sin reentrenar los modelos. Las
+    búsquedas usan desde entonces sus puntajes TF-IDF y BM25, que se mantienen iguales a
+    los de reconstruir ambos modelos con los documentos vigentes.
 
         Parámetros:
-        - modelo: instancia de Metrica_modelo.
-        - modelo_id: nombre del archivo donde guardar los resultados.
+        - max_segmentos: segmentos nuevos a partir de los cuales se fusionan en segundo plano.
+
+        Retorna:
+        - IndiceIncremental.
+    """
+    if self.fragmentado is not None:
+      raise ValueError("La indexación incremental no está disponible con el índice fragmentado")
+    if self.incremental is None:
+      self.incremental = IndiceIncremental(self.modelo_bm25.indice, self.doc_ids,
+                                           self.modelo_tfidf.tfidf_vectorizer.token_pattern, max_segmentos)
+      self.actualizar_huella()
+    return self.incremental
+
+  def construir_fragmentos(self, n_fragmentos=None):
+    """
+    Divide el índice en fragmentos en self.fragmentos_id, solo si no hay unos vigentes para
+    los modelos cargados. Se escriben en un directorio temporal que luego reemplaza al
+    anterior, así que otro proceso nunca abre fragmentos a medio escribir; si otro proceso
+    terminó antes unos vigentes, se usan los suyos.
+
+        Parámetros:
+        - n_fragmentos: número de fragmentos (por defecto, uno por CPU).
 
         Retorna:
-        - DataFrame con métricas calculadas.
+        - Número de fragmentos.
+    """
+    n_fragmentos = min(n_fragmentos or os.cpu_count(), len(self.doc_ids))
+    if IndiceFragmentado.vigente(self.fragmentos_id, n_fragmentos, self.huella):
+      return n_fragmentos
+    temporal = f"{self.fragmentos_id}.tmp{os.getpid()}"
+    shutil.rmtree(temporal, ignore_errors=True)
+    fragmentar(temporal, self.modelo_tfidf, self.modelo_bm25, self.doc_ids, n_fragmentos, self.huella)
+    if not IndiceFragmentado.vigente(self.fragmentos_id, n_fragmentos, self.huella):
+      shutil.rmtree(self.fragmentos_id, ignore_errors=True)
+      try:
+        os.rename(temporal, self.fragmentos_id)
+      except OSError:
+        # Otro proceso publicó los suyos entre medio.
+        if not IndiceFragmentado.vigente(self.fragmentos_id, n_fragmentos, self.huella):
+          raise
+    shutil.rmtree(temporal, ignore_errors=True)
+    return n_fragmentos
+
+  def activar_fragmentos(self, n_fragmentos=None, procesos=True):
+    """
+    Divide el índice en fragmentos (ver construir_fragmentos) y resuelve desde entonces
+    cada búsqueda en todos ellos en paralelo. Los puntajes usan las estadísticas del corpus
+    completo, así que el ranking es el del índice sin fragmentar (los puntajes pueden
+    diferir en el redondeo del último decimal).
+
+    Cada llamada inicia sus propios procesos de fragmento: con varios procesos de servidor
+    hay un juego de fragmentos por proceso (ver servidor.py).
+
+        Parámetros:
+        - n_fragmentos: número de fragmentos (por defecto, uno por CPU).
+        - procesos: True para atender cada fragmento en un proceso propio.
+
+        Retorna:
+        - IndiceFragmentado.
+    """
+    if self.incremental is not None:
+      raise ValueError("El índice fragmentado no está disponible con la indexación incremental")
+    self.construir_fragmentos(n_fragmentos)
+    self.desactivar_fragmentos()
+    self.fragmentado = IndiceFragmentado(self.fragmentos_id, procesos)
+    return self.fragmentado
+
+  def desactivar_fragmentos(self):
+    """
+    Detiene los procesos de los fragmentos y vuelve a buscar con los modelos completos.
+    """
+    if self.fragmentado is not None:
+      self.fragmentado.cerrar()
+      self.fragmentado = None
+
+  def preparar_documentos(self, documentos, attr_corpus="text"):
+    """
+    Preprocesa documentos nuevos y arma sus registros para hidratar resultados.
+
+        Retorna:
+        - (doc_ids, tokens de cada documento, registros).
+    """
+    documentos = documentos.copy()
+    documentos[self.text_preprocessed_id] = documentos[attr_corpus].apply(self.metodo)
+    attr = list(documentos.select_dtypes(exclude=['number']).columns)
+    if self.attr_id not in attr:
+      attr.append(self.attr_id)
+    registros = documentos[attr].to_dict("records")
+    return list(documentos[self.attr_id]), [texto.split() for texto in documentos[self.text_preprocessed_id]], registros
+
+  def agregar_documentos(self, documentos, attr_corpus="text"):
+    """
+    Agrega documentos al índice sin reentrenar los modelos (activa la indexación incremental).
+
+        Parámetros:
+        - documentos: DataFrame con la columna de id (attr_id) y la de texto.
+        - attr_corpus: nombre de la columna de texto.
+    """
+    self.activar_indexacion_incremental().agregar(*self.preparar_documentos(documentos, attr_corpus))
+    self.actualizar_huella()
+
+  def actualizar_documentos(self, documentos, attr_corpus="text"):
+    """
+    Reemplaza el texto de documentos ya indexados, identificados por su id.
+    """
+    self.activar_indexacion_incremental().actualizar(*self.preparar_documentos(documentos, attr_corpus))
+    self.actualizar_huella()
+
+  def eliminar_documentos(self, doc_ids):
+    """
+    Elimina documentos del índice por id; dejan de aparecer en las búsquedas y de contar
+    en las estadísticas de ambos modelos.
+    """
+    self.activar_indexacion_incremental().eliminar(doc_ids)
+    self.actualizar_huella()
+
+  def compactar_indice(self):
+    """
+    Escribe un índice columnar nuevo (modelos y almacén de documentos) con solo los
+    documentos vigentes, lo pone en lugar de self.indice_id y vuelve a cargarlo, dejando
+    la indexación incremental desactivada. Los documentos se hidratan todos en memoria
+    para escribir el almacén. El índice posicional no se reconstruye: las consultas de
+    frase vuelven a estar disponibles al reconstruir los modelos con posicional=True.
+    """
+    if self.incremental is None:
+      raise ValueError("No hay cambios que compactar: la indexación incremental no está activa")
+    bm25, vectorizador, matriz, posiciones, doc_ids = self.incremental.exportar()
+    nuevo = self.indice_id + ".nuevo"
+    anterior = self.indice_id + ".anterior"
+    indice_columnar.guardar_indice(nuevo, {"tfidf": Tfidf.desde_matriz(vectorizador, matriz),
+                                           "bm25": Bm25.desde_indice(bm25)}, doc_ids)
+    AlmacenDocumentos.construir(os.path.join(nuevo, "documentos"), self.hidratar(posiciones).reset_index(drop=True))
+    if os.path.isdir(self.indice_id):
+      shutil.rmtree(anterior, ignore_errors=True)
+      os.rename(self.indice_id, anterior)
+    os.rename(nuevo, self.indice_id)
+    shutil.rmtree(anterior, ignore_errors=True)
+
+    self.modelo_tfidf = Tfidf(modelName=os.path.join(self.indice_id, "tfidf"))
+    self.modelo_bm25 = Bm25(modelName=os.path.join(self.indice_id, "bm25"))
+    self.doc_ids = indice_columnar.cargar_doc_ids(self.indice_id)
+    self.almacen = AlmacenDocumentos(self.documentos_id)
+    self.indice_posicional = None
+    self.incremental = None
+    self.actualizar_huella()
+
+  def hidratar(self, indices):
+    """
+    Obtiene los campos de texto solo de los documentos recuperados, desde el almacén de
+    documentos si está disponible o, si no, desde el DataFrame del corpus.
+
+        Parámetros:
+        - indices: posiciones de los documentos en el corpus, en orden.
+
+        Retorna:
+        - DataFrame con una fila por documento.
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+    nuevos = indices >= self.incremental.n_base if self.incremental is not None else np.zeros(len(indices), dtype=bool)
+    if self.almacen is not None:
+      documentos = self.almacen.obtener(indices[~nuevos])
+    else:
+      attr = self.corpus.select_dtypes(exclude=['number']).columns.values
+      if self.attr_id not in attr:
+        attr = np.append(attr, self.attr_id)
+      documentos = self.corpus[attr].iloc[indices[~nuevos]].copy()
+    if not nuevos.any():
+      return documentos
+    # Documentos agregados con la indexación incremental: sus registros están en memoria.
+    # Se llevan a los campos del corpus (vacíos si no los traían) para que no queden NaN.
+    documentos.index = indices[~nuevos]
+    agregados = pd.DataFrame([self.incremental.documentos[i] for i in indices[nuevos]], index=indices[nuevos])
+    agregados = agregados.reindex(columns=documentos.columns, fill_value="")
+    return pd.concat([documentos, agregados]).loc[indices]
+
+  def calcular_metrica(self, modelo, modelo_id, k=50, n_procesos=None):
     """
-    pre_recall = modelo.obtener_precision_recall_modelo()
-    map_res = modelo.obtener_MAP_modelo()
+            Calcula precisión, recall y MAP para un modelo dado, recuperando cada consulta
+            una sola vez. La tabla completa (precision, recall, map, ndcg y mrr por corte)
+            queda en modelo.tabla_metricas.
 
-    pre_recall['map'] = [map_res]
+        Parámetros:
+        - modelo: instancia de Motor_evaluacion.
+        - modelo_id: nombre del archivo donde guardar los resultados.
+        - k: corte usado para las métricas guardadas.
+        - n_procesos: si es mayor que 1, reparte las consultas entre ese número de procesos
+          (el resultado es idéntico al de la ejecución serial).
+
+        Retorna:
+        - Series con recall, precision y map.
+    """
+    if n_procesos is not None and n_procesos > 1:
+      modelo.tabla_metricas = modelo.evaluar_paralelo(n_procesos)
+    else:
+      modelo.tabla_metricas = modelo.evaluar()
+    pre_recall = Motor_evaluacion.resumen(modelo.tabla_metricas, k)
     pre_recall.to_pickle(modelo_id)
     return pre_recall
   
@@ -104,65 +422,347 @@ class Sri_app () :
     """
     return pd.read_pickle(modelo_id)
   
-  def resultados_metricas(self, calcular=False):
+  def resultados_metricas(self, calcular=False, n_procesos=None):
       """
        Calcula o carga resultados de métricas para TF-IDF y BM25.
 
         Parámetros:
         - calcular: si es True, recalcula; si es False, carga de archivo.
+        - n_procesos: número de procesos para recalcular (ver calcular_metrica).
       """
+      if self.queries is None:
+          raise ValueError("No hay consultas cargadas (Sri_app con evaluacion=False)")
       if self.text_preprocessed_id not in self.queries.columns:
           self.queries[self.text_preprocessed_id] = self.queries[self.attr_query].apply(self.metodo)
 
       if calcular:
-        self.metricas_tfidf_res = self.calcular_metrica(self.metrica_modelo_tfidf, self.metrica_tfidf_id)
-        self.metricas_bm25_res = self.calcular_metrica(self.metrica_modelo_bm25, self.metrica_bm25_id)
+        self.metricas_tfidf_res = self.calcular_metrica(self.metrica_modelo_tfidf, self.metrica_tfidf_id, n_procesos=n_procesos)
+        self.metricas_bm25_res = self.calcular_metrica(self.metrica_modelo_bm25, self.metrica_bm25_id, n_procesos=n_procesos)
       else:
         self.metricas_tfidf_res = self.carga_metrica(self.metrica_tfidf_id)
         self.metricas_bm25_res = self.carga_metrica(self.metrica_bm25_id)
   
-  def buscar(self, query, k=10, metrica="promedio"):
+  def buscar(self, query, k=10, metrica="promedio", fusion=None, pesos=None):
     """
-    Realiza una búsqueda sobre el corpus con una consulta dada.
+    Realiza una búsqueda sobre el corpus con una consulta dada. No modifica ningún estado
+    compartido, así que puede llamarse desde varios hilos a la vez.
 
         Parámetros:
-        - query: texto de la consulta.
+        - query: texto de la consulta. Puede tener frases exactas ("...") y grupos de
+          términos cercanos ("..."~N, a lo sumo N palabras intermedias en cualquier
+          orden); solo se retornan documentos que los cumplen todos. Sin índice
+          posicional, las palabras de los operadores cuentan como términos comunes.
         - k: número de documentos a retornar.
         - metrica: métrica a usar para ordenar resultados ('sim_cos', 'bm25_scores', 'promedio').
+        - fusion: estrategia de buscar_fusion ('minmax', 'zscore', 'lineal', 'rrf'); solo
+          con 'promedio'. Si se indica fusion o pesos, 'promedio' se calcula sobre los
+          candidatos en lugar de todo el corpus.
+        - pesos: dict {'sim_cos': peso, 'bm25_scores': peso, 'proximidad': peso} para la
+          fusión; 'proximidad' (requiere el índice posicional) premia los documentos con
+          los términos de la consulta cerca entre sí.
 
         Retorna:
-        - DataFrame con los k documentos más relevantes ordenados.
+        - DataFrame con los k documentos más relevantes ordenados y una columna con el
+          puntaje normalizado (o fusionado) de la métrica.
     """
-    attr= self.corpus.select_dtypes(exclude=['number']).columns.values  # esto es para limpiar las selecciones :)
-    if self.attr_id not in attr:
-      attr = np.append(attr, self.attr_id)
-    
-    self.corpus = self.corpus[attr]
+    if fusion is None and pesos is None:
+      resultado = self.buscar_top_k(query, k, metrica)
+    elif metrica != self.metricas_buscar[2]:
+      raise ValueError(f"La fusión solo se aplica a la métrica '{self.metricas_buscar[2]}'")
+    else:
+      resultado = self.buscar_fusion(query, k, fusion or fusion_candidatos.ESTRATEGIAS[0], pesos)
+    with self.telemetria.medir("hidratacion"):
+      documentos = self.hidratar(resultado.indices)
+      documentos[metrica] = resultado.scores
+    return documentos
 
-    query_preprocesada = self.metodo(query)
-    sim_scores_df = pd.DataFrame({
-        self.metricas_buscar[0]: self.modelo_tfidf.obtener_similitud_coseno(query_preprocesada),
-        self.metricas_buscar[1]: self.modelo_bm25.obtener_scores(query_preprocesada)
-    }, index = self.corpus[self.attr_id].values)
-    
-    attr_num = sim_scores_df.select_dtypes(include="number").columns
-
-   # print(sim_scores_df.sort_values(by="bm25_scores", ascending=False))
-    sim_scores_df = pd.DataFrame(self.scaler.fit_transform(sim_scores_df[attr_num]), columns=attr_num, index=sim_scores_df.index)
-
-    sim_scores_df[self.metricas_buscar[2]] = sim_scores_df.mean(axis=1)
-    print(sim_scores_df.sort_values(by=self.metricas_buscar[0], ascending=False))
-    print(sim_scores_df.sort_values(by=self.metricas_buscar[1], ascending=False))
-    print(sim_scores_df.sort_values(by=self.metricas_buscar[2], ascending=False))
-    print('Resultados metrica tf-idf: ',self.metricas_tfidf_res)
-    print('Resultados metrica bm-25: ',self.metricas_bm25_res)
-    self.corpus[metrica] = sim_scores_df[metrica].values
-    
-    return self.corpus.sort_values(by=metrica, ascending=False).head(k)
+  def buscar_top_k(self, query, k=10, metrica="promedio"):
+    """
+    Recupera los k documentos de mayor puntaje sin hidratar su texto ni modificar el estado
+    de la aplicación. Los resultados se guardan en la caché por (consulta preprocesada,
+    métrica): un top-k ya calculado también responde pedidos con un k menor.
+
+        Parámetros:
+        - query: texto de la consulta (con operadores de frase y proximidad, ver buscar).
+        - k: número de documentos a retornar.
+        - metrica: 'sim_cos', 'bm25_scores' o 'promedio'.
+
+        Retorna:
+        - ResultadoBusqueda.
+    """
+    with self.telemetria.medir("preprocesamiento"):
+      query_preprocesada, operadores = self.preparar_consulta(query)
+    clave = (metrica, operadores) if operadores else metrica
+    resultado = self.cache_resultados.obtener(query_preprocesada, clave, k, self.huella)
+    if resultado is None:
+      if operadores:
+        # Los operadores se resuelven con los modelos completos, también con fragmentos.
+        permitidos = self.filtrar_operadores(operadores)
+        scores = self.puntuar(query_preprocesada, metrica)
+        with self.telemetria.medir("seleccion"):
+          indices = permitidos[top_k_denso(scores[permitidos], k)]
+          doc_ids = np.asarray(self.doc_ids[indices])
+          scores = scores[indices]
+      elif self.fragmentado is not None:
+        with self.telemetria.medir("fragmentos"):
+          indices, scores = self.fragmentado.top_k(query_preprocesada, k, metrica)
+          doc_ids = np.asarray(self.doc_ids[indices])
+      else:
+        scores = self.puntuar(query_preprocesada, metrica)
+        with self.telemetria.medir("seleccion"):
+          indices = top_k_denso(scores, k)
+          if self.incremental is not None:
+            # Los documentos eliminados tienen puntaje -inf y nunca entran al resultado.
+            indices = indices[np.isfinite(scores[indices])]
+            doc_ids = self.incremental.ids_de(indices)
+          else:
+            doc_ids = np.asarray(self.doc_ids[indices])
+          scores = scores[indices]
+      resultado = ResultadoBusqueda(indices, doc_ids, scores, metrica)
+      self.cache_resultados.guardar(query_preprocesada, clave, k, resultado, self.huella)
+    return resultado
+
+  def preparar_consulta(self, query):
+    """
+    Preprocesa la consulta y sus operadores de frase y proximidad (ver
+    indice_posicional.analizar_consulta). Los operadores que quedan sin términos después
+    del preprocesamiento (solo palabras vacías) se descartan. Sin índice posicional (o con
+    la indexación incremental activa) los operadores se ignoran: sus palabras cuentan como
+    términos comunes de la consulta.
+
+        Retorna:
+        - Tupla (consulta preprocesada, operadores): cada operador es (tupla de términos
+          preprocesados, distancia o None para las frases exactas).
+    """
+    texto, operadores = analizar_consulta(query)
+    if self.indice_posicional is None or self.incremental is not None:
+      return self.metodo(texto), ()
+    preprocesados = tuple((tuple(self.metodo(frase).split()), distancia) for frase, distancia in operadores)
+    return self.metodo(texto), tuple(operador for operador in preprocesados if operador[0])
+
+  def filtrar_operadores(self, operadores):
+    """
+    Documentos que cumplen todos los operadores de frase y proximidad, intersecando las
+    listas de posiciones de los documentos que tienen todos sus términos.
+
+        Retorna:
+        - Arreglo ordenado de posiciones de documento.
+    """
+    if self.indice_posicional is None:
+      raise ValueError("Las consultas de frase y proximidad requieren el índice posicional (Sri_app(posicional=True))")
+    if self.incremental is not None:
+      raise ValueError("Las consultas de frase y proximidad no están disponibles con la indexación incremental")
+    with self.telemetria.medir("posiciones"):
+      return self.indice_posicional.filtrar([(self.indice_posicional.ids(terminos), distancia)
+                                             for terminos, distancia in operadores])
+
+  def buscar_fusion(self, query, k=10, estrategia="minmax", pesos=None, n_candidatos=100):
+    """
+    Recupera los k documentos de mayor puntaje fusionado de TF-IDF y BM25 calculando solo
+    los puntajes de la unión del top-n de cada modelo (ver ir_models/fusion.py), sin
+    arreglos del tamaño del corpus. Solo se retornan documentos con algún término de la
+    consulta. Los resultados se guardan en la caché con la estrategia y los pesos.
+
+        Con operadores de frase o proximidad en la consulta, los candidatos son los n de
+        mayor puntaje BM25 entre los documentos que los cumplen.
 
-    #docs_recuperados = self.dataset[self.dataset['doc_id'].isin(docs_id)]
-    #docs_recuperados['doc_id'] = pd.Categorical(docs_recuperados ['doc_id'], categories = docs_id, ordered=True)
-    #return docs_recuperados.sort_values('doc_id')
+        Parámetros:
+        - query: texto de la consulta (con operadores de frase y proximidad, ver buscar).
+        - k: número de documentos a retornar.
+        - estrategia: 'minmax', 'zscore', 'lineal' o 'rrf'.
+        - pesos: dict {'sim_cos': peso, 'bm25_scores': peso, 'proximidad': peso}; por
+          defecto, pesos iguales de los dos modelos y sin proximidad.
+        - n_candidatos: documentos que aporta cada modelo (al menos k).
+
+        Retorna:
+        - ResultadoBusqueda con metrica 'promedio'.
+    """
+    if estrategia not in fusion_candidatos.ESTRATEGIAS:
+      raise ValueError(f"Estrategia de fusión no soportada: {estrategia}")
+    vector_pesos = fusion_candidatos.leer_pesos(pesos)
+    proximidad = vector_pesos[-1] > 0
+    if proximidad and self.indice_posicional is None:
+      raise ValueError("La señal de proximidad requiere el índice posicional (Sri_app(posicional=True))")
+    if proximidad and self.incremental is not None:
+      raise ValueError("La señal de proximidad no está disponible con la indexación incremental")
+    n = max(k, n_candidatos)
+    with self.telemetria.medir("preprocesamiento"):
+      query_preprocesada, operadores = self.preparar_consulta(query)
+    clave = (self.metricas_buscar[2], estrategia, tuple(vector_pesos.tolist()), n, operadores)
+    resultado = self.cache_resultados.obtener(query_preprocesada, clave, k, self.huella)
+    if resultado is None:
+      permitidos = self.filtrar_operadores(operadores) if operadores else None
+      with self.telemetria.medir("candidatos"):
+        posiciones, scores = self.candidatos_fusion(query_preprocesada, n, permitidos)
+      if proximidad:
+        with self.telemetria.medir("proximidad"):
+          terminos = self.indice_posicional.ids(query_preprocesada.split())
+          scores = np.column_stack([scores, self.indice_posicional.cercania(terminos, posiciones)])
+      with self.telemetria.medir("fusion"):
+        fusionados = fusion_candidatos.fusionar(scores, estrategia, vector_pesos)
+      with self.telemetria.medir("seleccion"):
+        # Las posiciones están ordenadas, así que los empates se resuelven por posición.
+        seleccion = top_k_denso(fusionados, k)
+        indices = posiciones[seleccion]
+        doc_ids = self.incremental.ids_de(indices) if self.incremental is not None else np.asarray(self.doc_ids[indices])
+      resultado = ResultadoBusqueda(indices, doc_ids, fusionados[seleccion], self.metricas_buscar[2])
+      self.cache_resultados.guardar(query_preprocesada, clave, k, resultado, self.huella)
+    return resultado
+
+  def candidatos_fusion(self, query_preprocesada, n, permitidos=None):
+    """
+    Unión del top-n de cada modelo y sus puntajes crudos, con el índice que esté activo
+    (fragmentos, incremental o columnar). Si se indican los documentos permitidos (los que
+    cumplen los operadores de la consulta), los candidatos son los n de mayor puntaje BM25
+    entre ellos.
+
+        Retorna:
+        - Tupla (posiciones ordenadas, matriz de puntajes n_candidatos x 2).
+    """
+    if permitidos is not None:
+      bm25 = self.modelo_bm25.obtener_scores_docs(query_preprocesada, permitidos)
+      seleccion = np.sort(top_k_denso(bm25, n))
+      posiciones = permitidos[seleccion]
+      return posiciones, np.column_stack([self.modelo_tfidf.obtener_similitud_docs(query_preprocesada, posiciones),
+                                          bm25[seleccion]])
+    if self.fragmentado is not None:
+      return self.fragmentado.candidatos(query_preprocesada, n)
+    if self.incremental is None:
+      return fusion_candidatos.candidatos(self.modelo_tfidf, self.modelo_bm25, query_preprocesada, n)
+    # El índice incremental solo puntúa todo el corpus; los eliminados quedan en 0 y se descartan.
+    estado = self.incremental.estado
+    columnas = [np.where(estado.vivos, self.incremental.puntuar_tfidf(query_preprocesada, estado), 0),
+                np.where(estado.vivos, self.incremental.puntuar_bm25(query_preprocesada, estado), 0)]
+    posiciones = np.unique(np.concatenate([top_k_denso(columna, n) for columna in columnas]))
+    return fusion_candidatos.seleccionar(posiciones, np.column_stack([columna[posiciones] for columna in columnas]), n)
+
+  def puntuar(self, query_preprocesada, metrica="promedio"):
+    """
+    Calcula el puntaje de todos los documentos para una consulta, normalizado al rango
+    [0, 1] con el mínimo y el máximo de esta consulta ('promedio' es la media de los
+    puntajes normalizados de TF-IDF y BM25).
+
+        Parámetros:
+        - query_preprocesada: consulta ya preprocesada.
+        - metrica: 'sim_cos', 'bm25_scores' o 'promedio'.
+
+        Retorna:
+        - Arreglo con un puntaje por documento (-inf para los documentos eliminados con
+          la indexación incremental).
+    """
+    if metrica not in self.metricas_buscar:
+      raise ValueError(f"Métrica no soportada: {metrica}")
+    if self.incremental is not None:
+      # Una sola instantánea para ambos modelos, aunque haya escrituras concurrentes.
+      estado = self.incremental.estado
+      vivos = estado.vivos
+      tfidf = lambda: self.incremental.puntuar_tfidf(query_preprocesada, estado)
+      bm25 = lambda: self.incremental.puntuar_bm25(query_preprocesada, estado)
+    else:
+      vivos = None
+      tfidf = lambda: self.modelo_tfidf.obtener_similitud_coseno(query_preprocesada)
+      bm25 = lambda: self.modelo_bm25.obtener_scores(query_preprocesada)
+    crudos = []
+    if metrica != self.metricas_buscar[1]:
+      with self.telemetria.medir("tfidf"):
+        crudos.append(tfidf())
+    if metrica != self.metricas_buscar[0]:
+      with self.telemetria.medir("bm25"):
+        crudos.append(bm25())
+    with self.telemetria.medir("normalizacion"):
+      if len(crudos) == 1:
+        return self.normalizar(crudos[0], vivos)
+      return (self.normalizar(crudos[0], vivos) + self.normalizar(crudos[1], vivos)) / 2
+
+  @staticmethod
+  def normalizar(scores, vivos=None):
+    """
+    Escala un arreglo de puntajes al rango [0, 1] con su mínimo y su máximo, igual que
+    MinMaxScaler (si todos los puntajes son iguales, el resultado es 0). Si se indica la
+    máscara vivos, el mínimo y el máximo son los de esos documentos y el resto queda en -inf.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    if vivos is not None:
+      normalizados = np.full_like(scores, -np.inf)
+      normalizados[vivos] = Sri_app.normalizar(scores[vivos])
+      return normalizados
+    if len(scores) == 0:
+      return scores
+    minimo = scores.min()
+    rango = scores.max() - minimo
+    return (scores - minimo) / rango if rango > 0 else np.zeros_like(scores)
+
+  def buscar_batch(self, queries, k=10, metrica="promedio"):
+    """
+    Realiza varias búsquedas a la vez, puntuando todas las consultas con una sola
+    operación matricial por modelo.
+
+        Parámetros:
+        - queries: lista de textos de consulta.
+        - k: número de documentos a retornar por consulta.
+        - metrica: métrica a usar para ordenar resultados ('sim_cos', 'bm25_scores', 'promedio').
+
+        Retorna:
+        - Lista de DataFrames (uno por consulta) con los k documentos más relevantes ordenados.
+          Con la indexación incremental o los fragmentos activos, cada consulta se
+          resuelve con buscar.
+    """
+    if self.incremental is not None or self.fragmentado is not None:
+      return [self.buscar(query, k, metrica) for query in queries]
+    queries_preprocesadas = [self.metodo(query) for query in queries]
+    n_docs = len(self.doc_ids)
+
+    # Igual que en buscar, los puntajes se reportan normalizados al rango [0, 1].
+    if metrica == self.metricas_buscar[0]:
+      scores = self.normalizar_filas(self.modelo_tfidf.obtener_scores_batch(queries_preprocesadas))
+    elif metrica == self.metricas_buscar[1]:
+      scores = self.normalizar_filas(self.modelo_bm25.obtener_scores_batch(queries_preprocesadas))
+    else:
+      sim_cos = self.normalizar_filas(self.modelo_tfidf.obtener_scores_batch(queries_preprocesadas))
+      bm25_scores = self.normalizar_filas(self.modelo_bm25.obtener_scores_batch(queries_preprocesadas))
+      scores = (sim_cos + bm25_scores) / 2
+    indices, scores = top_k_filas(scores, k, n_docs)
+
+    resultados = []
+    for indices_query, scores_query in zip(indices, scores):
+      resultado = self.hidratar(indices_query)
+      resultado[metrica] = scores_query
+      resultados.append(resultado)
+    return resultados
+
+  @staticmethod
+  def normalizar_filas(scores):
+    """
+    Normaliza cada fila de una matriz dispersa de puntajes al rango [0, 1], como
+    MinMaxScaler sobre todo el corpus: si la fila no puntúa todos los documentos, el
+    mínimo es el 0 implícito de los documentos sin coincidencias. Si una fila tiene
+    puntajes negativos (el piso epsilon del IDF de BM25 puede serlo), sus ceros implícitos
+    dejan de ser el mínimo y la fila se normaliza densa, igual que en normalizar.
+
+        Parámetros:
+        - scores: matriz scipy.sparse (n_consultas x n_docs) de puntajes.
+
+        Retorna:
+        - Matriz CSR normalizada (los documentos con puntaje normalizado 0 pueden quedar
+          implícitos).
+    """
+    scores = scores.tocsr().astype(np.float64)
+    densas = {}
+    for fila in range(scores.shape[0]):
+      inicio, fin = scores.indptr[fila], scores.indptr[fila + 1]
+      if fin == inicio:
+        continue
+      valores = scores.data[inicio:fin]
+      if fin - inicio < scores.shape[1] and valores.min() < 0:
+        densas[fila] = Sri_app.normalizar(scores[fila].toarray().ravel())
+        continue
+      minimo = valores.min() if fin - inicio == scores.shape[1] else min(valores.min(), 0)
+      rango = max(valores.max(), 0) - minimo
+      scores.data[inicio:fin] = (valores - minimo) / (rango if rango > 0 else 1)
+    if densas:
+      scores = sparse.vstack([sparse.csr_matrix(densas[fila].reshape(1, -1)) if fila in densas else scores[fila]
+                              for fila in range(scores.shape[0])], format="csr")
+    return scores
 
   def obtener_diccionario (self, calcular=False):
     """
@@ -176,6 +776,7 @@ class Sri_app () :
     """
     diccionario = None
     if calcular:
+      self.requerir_corpus()
       X = self.vectorizer_cv.fit_transform(self.corpus[self.text_preprocessed_id].values)
       diccionario = pd.DataFrame(X.toarray(), columns=self.vectorizer_cv.get_feature_names_out(), index=self.corpus[self.attr_id])
       diccionario.to_pickle("diccionario.pkl")
@@ -0,0 +1,122 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Límites superiores (s) de los buckets de los histogramas de latencia.
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histograma:
+    """
+    Histograma acumulado de duraciones con buckets fijos, como los de Prometheus: cuenta
+    de observaciones menores o iguales a cada límite, suma y total.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.cuentas = [0] * len(buckets)
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, segundos):
+        for i, limite in enumerate(self.buckets):
+            if segundos <= limite:
+                self.cuentas[i] += 1
+        self.suma += segundos
+        self.total += 1
+
+
+class Telemetria:
+    """
+    Mide la duración de las etapas de una búsqueda y las acumula en un histograma por
+    etapa dentro del proceso.
+
+    Las etapas se marcan con ``with telemetria.medir("bm25"):``. Además, un hilo puede
+    recolectar las duraciones de sus propias etapas (``with telemetria.recolectar() as
+    tiempos``) para reportarlas en la respuesta de una consulta; como cada búsqueda corre
+    completa en un hilo del despachador, las etapas de consultas concurrentes no se mezclan.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.histogramas = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def registrar(self, etapa, segundos):
+        """
+        Agrega una duración al histograma de la etapa y, si el hilo está recolectando, a
+        sus tiempos (las etapas repetidas se suman).
+        """
+        with self._lock:
+            if etapa not in self.histogramas:
+                self.histogramas[etapa] = Histograma(self.buckets)
+            self.histogramas[etapa].observar(segundos)
+        tiempos = getattr(self._local, "tiempos", None)
+        if tiempos is not None:
+            tiempos[etapa] = tiempos.get(etapa, 0.0) + segundos
+
+    @contextmanager
+    def medir(self, etapa):
+        """
+        Mide la duración del bloque y la registra en la etapa, aunque el bloque falle.
+        """
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(etapa, time.perf_counter() - inicio)
+
+    @contextmanager
+    def recolectar(self):
+        """
+        Recolecta en un dict (etapa -> segundos) las etapas medidas en este hilo dentro
+        del bloque.
+        """
+        anteriores = getattr(self._local, "tiempos", None)
+        self._local.tiempos = {}
+        try:
+            yield self._local.tiempos
+        finally:
+            self._local.tiempos = anteriores
+
+    def instantanea(self):
+        """
+        Copia de los histogramas: etapa -> (cuentas acumuladas por bucket, suma, total).
+        """
+        with self._lock:
+            return {etapa: (list(h.cuentas), h.suma, h.total) for etapa, h in self.histogramas.items()}
+
+
+def _etiquetas(etiquetas):
+    if not etiquetas:
+        return ""
+    return "{" + ",".join(f'{clave}="{valor}"' for clave, valor in etiquetas.items()) + "}"
+
+def formato_prometheus(telemetria, contadores=(), medidores=()):
+    """
+    Genera la exposición en formato de texto de Prometheus.
+
+    Parámetros:
+    - telemetria: Telemetria cuyos histogramas se exponen como ``sri_etapa_segundos``.
+    - contadores: lista de (nombre, ayuda, valor) de valores que solo crecen; valor puede
+      ser un número o una lista de (dict de etiquetas, número).
+    - medidores: igual que contadores, para valores que suben y bajan.
+
+    Retorna:
+    - str con una métrica por línea.
+    """
+    lineas = ["# HELP sri_etapa_segundos Duración de cada etapa de la búsqueda.",
+              "# TYPE sri_etapa_segundos histogram"]
+    for etapa, (cuentas, suma, total) in sorted(telemetria.instantanea().items()):
+        for limite, cuenta in zip(telemetria.buckets, cuentas):
+            lineas.append(f'sri_etapa_segundos_bucket{{etapa="{etapa}",le="{limite}"}} {cuenta}')
+        lineas.append(f'sri_etapa_segundos_bucket{{etapa="{etapa}",le="+Inf"}} {total}')
+        lineas.append(f'sri_etapa_segundos_sum{{etapa="{etapa}"}} {suma}')
+        lineas.append(f'sri_etapa_segundos_count{{etapa="{etapa}"}} {total}')
+    for tipo, metricas in (("counter", contadores), ("gauge", medidores)):
+        for nombre, ayuda, valor in metricas:
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} {tipo}")
+            for etiquetas, numero in (valor if isinstance(valor, list) else [({}, valor)]):
+                lineas.append(f"{nombre}{_etiquetas(etiquetas)} {numero}")
+    return "\n".join(lineas) + "\n"
@@ -0,0 +1,30 @@
+"""
+Corpus sintético y modelos en memoria compartidos por las pruebas.
+"""
+import os
+import pytest
+from ..ir_models.bm25.bm25 import Bm25
+from ..ir_models.tfidf.tf_idf import Tfidf
+from ..rendimiento.corpus_sintetico import generar_corpus, generar_consultas
+
+N_DOCS = 1500
+K = 10
+
+@pytest.fixture(scope="session")
+def corpus():
+    return generar_corpus(N_DOCS, n_terminos=800, long_media=30, semilla=7)
+
+@pytest.fixture(scope="session")
+def consultas(corpus):
+    queries, _ = generar_consultas(corpus, 20, semilla=7)
+    return list(queries["text"]) + ["termino_ausente"]
+
+@pytest.fixture(scope="session")
+def modelos(corpus, tmp_path_factory):
+    # Tfidf y Bm25 guardan sus archivos en el directorio actual.
+    anterior = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("modelos"))
+    try:
+        yield Tfidf(corpus["text"].values), Bm25([texto.split() for texto in corpus["text"]])
+    finally:
+        os.chdir(anterior)
@@ -0,0 +1,29 @@
+"""
+Construcción del índice por corridas frente a los modelos construidos en memoria.
+"""
+import os
+import numpy as np
+from ..ir_models.bm25.bm25 import Bm25
+from ..ir_models.tfidf.tf_idf import Tfidf
+from ..tools.construir_indice import ConstructorIndice
+from .conftest import N_DOCS
+
+def test_construccion_por_corridas_igual_que_en_memoria(modelos, corpus, consultas, tmp_path):
+    directorio = str(tmp_path / "indice")
+    # Un presupuesto mínimo obliga a escribir varias corridas y a fusionarlas.
+    constructor = ConstructorIndice(directorio, memoria_mb=0.05)
+    for inicio in range(0, N_DOCS, 200):
+        lote = corpus.iloc[inicio:inicio + 200]
+        constructor.agregar(list(lote["doc_id"]), list(lote["text"]))
+    assert len(constructor.corridas) > 1
+    constructor.cerrar()
+
+    modelo_tfidf, modelo_bm25 = modelos
+    bm25 = Bm25(modelName=os.path.join(directorio, "bm25"))
+    for atributo in ("indptr", "docs", "tfs", "doc_len", "idf"):
+        assert np.array_equal(getattr(bm25.indice, atributo), getattr(modelo_bm25.indice, atributo))
+    assert np.array_equal(bm25.indice.valores(), modelo_bm25.indice.valores())
+    tfidf = Tfidf(modelName=os.path.join(directorio, "tfidf"))
+    for query in consultas:
+        assert np.allclose(tfidf.obtener_similitud_coseno(query), modelo_tfidf.obtener_similitud_coseno(query),
+                           rtol=1e-9, atol=1e-12)
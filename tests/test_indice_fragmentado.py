@@ -0,0 +1,28 @@
+"""
+Índice fragmentado frente al índice completo.
+"""
+import numpy as np
+from ..ir_models.indice_fragmentado import IndiceFragmentado, fragmentar, METRICAS
+from .conftest import K
+
+def normalizar(scores):
+    rango = scores.max() - scores.min()
+    return (scores - scores.min()) / rango if rango > 0 else np.zeros_like(scores)
+
+def test_fragmentos_igual_que_indice_completo(modelos, corpus, consultas, tmp_path):
+    modelo_tfidf, modelo_bm25 = modelos
+    fragmentar(str(tmp_path), modelo_tfidf, modelo_bm25, corpus["doc_id"].values, 4)
+    fragmentado = IndiceFragmentado(str(tmp_path), procesos=False)
+    try:
+        for query in consultas:
+            completos = {METRICAS[0]: normalizar(modelo_tfidf.obtener_similitud_coseno(query)),
+                         METRICAS[1]: normalizar(modelo_bm25.obtener_scores(query))}
+            completos[METRICAS[2]] = (completos[METRICAS[0]] + completos[METRICAS[1]]) / 2
+            for metrica, scores in completos.items():
+                indices, obtenidos = fragmentado.top_k(query, K, metrica)
+                esperados = -np.sort(-scores)[:K]
+                # Los empates pueden ordenarse distinto; cada documento debe tener su puntaje.
+                assert np.allclose(obtenidos, esperados, rtol=1e-12, atol=1e-12)
+                assert np.allclose(scores[indices], obtenidos, rtol=1e-12, atol=1e-12)
+    finally:
+        fragmentado.cerrar()
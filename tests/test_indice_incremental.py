@@ -0,0 +1,36 @@
+"""
+Índice incremental frente a reconstruir los modelos con los documentos vivos.
+"""
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from ..ir_models.bm25.indice_bm25 import IndiceBm25
+from ..ir_models.indice_incremental import IndiceIncremental
+
+def test_incremental_igual_que_reconstruir(corpus, consultas):
+    documentos = dict(zip(corpus["doc_id"], (texto.split() for texto in corpus["text"])))
+    ids = list(documentos)
+    incremental = IndiceIncremental(IndiceBm25.construir(list(documentos.values())), ids, max_segmentos=3)
+    rng = np.random.default_rng(0)
+    textos = list(documentos.values())
+    for paso in range(8):
+        nuevos = {f"nuevo_{paso}_{i}": textos[rng.integers(len(textos))][::-1] for i in range(5)}
+        incremental.agregar(list(nuevos), list(nuevos.values()))
+        documentos.update(nuevos)
+        borrados = list(rng.choice(list(documentos), 3, replace=False))
+        incremental.eliminar(borrados)
+        for doc_id in borrados:
+            documentos.pop(doc_id)
+        cambiados = list(rng.choice(list(documentos), 2, replace=False))
+        reemplazos = [textos[rng.integers(len(textos))] for _ in cambiados]
+        incremental.actualizar(cambiados, reemplazos)
+        documentos.update(zip(cambiados, reemplazos))
+    vivos = list(documentos)
+    posiciones = [incremental.posiciones[doc_id] for doc_id in vivos]
+    reconstruido = IndiceBm25.construir([documentos[doc_id] for doc_id in vivos])
+    vectorizador = TfidfVectorizer()
+    matriz = vectorizador.fit_transform([" ".join(documentos[doc_id]) for doc_id in vivos])
+    for query in consultas:
+        assert np.allclose(incremental.puntuar_bm25(query)[posiciones], reconstruido.puntuar(query.split()),
+                           rtol=1e-12, atol=1e-12)
+        esperado = (matriz @ vectorizador.transform([query]).T).toarray().ravel()
+        assert np.allclose(incremental.puntuar_tfidf(query)[posiciones], esperado, rtol=1e-9, atol=1e-12)
@@ -0,0 +1,47 @@
+"""
+Top-k con poda y disperso frente al ranking denso.
+"""
+import numpy as np
+import pytest
+from ..ir_models.bm25.bm25 import Bm25
+
+# Corpus pequeño y homogéneo: el idf medio es negativo y el piso epsilon de BM25Okapi deja
+# idf negativos, así que los documentos sin el término (puntaje 0) quedan primeros.
+DOCS_IDF_NEGATIVO = [["c", "a", "a", "c"], ["a", "a", "c", "b"], ["c", "a"], ["b", "b"]]
+
+@pytest.fixture
+def modelo_idf_negativo(tmp_path, monkeypatch):
+    # Bm25 guarda sus archivos en el directorio actual.
+    monkeypatch.chdir(tmp_path)
+    return Bm25(DOCS_IDF_NEGATIVO)
+
+@pytest.mark.parametrize("modo", ["bmw", "wand", "disperso"])
+@pytest.mark.parametrize("query", [["a"], ["a", "b"], ["c", "a", "a"]])
+def test_bm25_idf_negativo_igual_que_denso(modelo_idf_negativo, modo, query):
+    assert (modelo_idf_negativo.indice.idf < 0).any()
+    for k in range(1, len(DOCS_IDF_NEGATIVO) + 1):
+        esperados = modelo_idf_negativo.obtener_top_k(query, k, "denso")
+        for obtenido, esperado in zip(modelo_idf_negativo.obtener_top_k(query, k, modo), esperados):
+            assert np.array_equal(obtenido, esperado)
+
+@pytest.mark.parametrize("modo", ["bmw", "wand", "disperso"])
+@pytest.mark.parametrize("query", [["a"], ["a", "b"], ["c", "a", "a"]])
+def test_bm25_comprimido_idf_negativo_igual_que_denso(modelo_idf_negativo, modo, query):
+    comprimido = modelo_idf_negativo.comprimir(tam_bloque=2)
+    for k in range(1, len(DOCS_IDF_NEGATIVO) + 1):
+        esperados = modelo_idf_negativo.obtener_top_k(query, k, "denso")
+        for obtenido, esperado in zip(comprimido.obtener_top_k(query, k, modo), esperados):
+            assert np.array_equal(obtenido, esperado)
+
+def test_bm25_idf_negativo_ordenado(modelo_idf_negativo):
+    indices, scores = modelo_idf_negativo.obtener_top_k(["a"], 4)
+    assert indices.tolist() == [3, 2, 0, 1]
+    assert (np.diff(scores) <= 0).all()
+
+def test_bm25_batch_idf_negativo_igual_que_denso(modelo_idf_negativo):
+    queries = [["a"], ["a", "b"], ["b"]]
+    indices, scores = modelo_idf_negativo.obtener_docs_relevantes_batch(queries, k=3)
+    for fila, query in enumerate(queries):
+        esperados, esperados_scores = modelo_idf_negativo.obtener_top_k(query, 3, "denso")
+        assert np.array_equal(indices[fila], esperados)
+        assert np.array_equal(scores[fila], esperados_scores)
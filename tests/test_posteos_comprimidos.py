@@ -0,0 +1,66 @@
+"""
+Listas de posteo comprimidas frente a las listas sin comprimir.
+"""
+import numpy as np
+import pytest
+from ..ir_models.bm25.bm25 import Bm25
+from ..rendimiento.corpus_sintetico import generar_corpus
+from .conftest import K, N_DOCS
+
+MODOS = ("bmw", "wand", "disperso", "denso")
+
+def comparar_bm25(indice, comprimido, consultas, candidatos):
+    for query in consultas:
+        tokens = query.split()
+        assert np.array_equal(comprimido.puntuar(tokens), indice.puntuar(tokens))
+        assert np.array_equal(comprimido.puntuar_docs(tokens, candidatos), indice.puntuar_docs(tokens, candidatos))
+        for modo in MODOS:
+            for obtenido, esperado in zip(comprimido.top_k(tokens, K, modo), indice.top_k(tokens, K, modo)):
+                assert np.array_equal(obtenido, esperado)
+
+def test_bm25_comprimido_identico(modelos, consultas):
+    indice = modelos[1].indice
+    comparar_bm25(indice, indice.comprimir(), consultas, np.arange(0, N_DOCS, 7))
+
+def test_bm25_comprimido_idf_negativo(tmp_path, monkeypatch):
+    # Con un vocabulario de pocos términos casi todos aparecen en más de la mitad de los
+    # documentos: el idf medio es negativo y el piso epsilon deja idf negativos.
+    monkeypatch.chdir(tmp_path)
+    corpus = generar_corpus(300, n_terminos=8, long_media=10, semilla=3)
+    indice = Bm25([texto.split() for texto in corpus["text"]]).indice
+    assert (indice.idf < 0).any()
+    vocabulario = sorted(set(" ".join(corpus["text"]).split()))
+    consultas = vocabulario + [" ".join(vocabulario[:3]), " ".join(vocabulario[-2:])]
+    comprimido = indice.comprimir(tam_bloque=16)
+    comparar_bm25(indice, comprimido, consultas, np.arange(0, 300, 5))
+    # Los documentos sin los términos (puntaje 0) pueden superar a los que los contienen.
+    for query in consultas:
+        tokens = query.split()
+        scores = indice.puntuar(tokens)
+        for modo in MODOS:
+            indices, obtenidos = comprimido.top_k(tokens, K, modo)
+            assert np.array_equal(obtenidos, -np.sort(-scores)[:K])
+            assert np.array_equal(scores[indices], obtenidos)
+
+def test_tfidf_comprimido_dentro_de_la_cota(modelos, consultas):
+    modelo = modelos[0]
+    comprimido = modelo.comprimir(bits=8)
+    niveles = 2 ** 8 - 1
+    maximos = modelo.listas_terminos().max(axis=0).toarray().ravel()
+    coincidencias = []
+    for query in consultas:
+        exactos = modelo.obtener_similitud_coseno(query)
+        aproximados = comprimido.obtener_similitud_coseno(query)
+        vector = modelo.tfidf_vectorizer.transform([query])
+        # Cada peso cuantizado difiere a lo sumo máximo_bloque / (2 * niveles) del original.
+        cota = (vector.data * maximos[vector.indices]).sum() / (2 * niveles) + 1e-12
+        assert np.abs(aproximados - exactos).max() <= cota
+
+        esperados, _ = modelo.obtener_top_k(query, K, "denso")
+        por_modo = [comprimido.obtener_top_k(query, K, modo) for modo in MODOS]
+        for indices, scores in por_modo:
+            assert np.allclose(scores, por_modo[-1][1], rtol=1e-12, atol=1e-12)
+            # Ningún documento recuperado queda más de dos cotas por debajo del k-ésimo exacto.
+            assert exactos[indices].min() >= exactos[esperados].min() - 2 * cota
+        coincidencias.append(len(np.intersect1d(por_modo[0][0], esperados)) / len(esperados))
+    assert np.mean(coincidencias) >= 0.9
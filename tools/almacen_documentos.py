@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+from ..ir_models.indice_columnar import EscritorArreglo, cargar_arreglos, escribir_manifiesto, existe_indice, leer_manifiesto
+
+class AlmacenDocumentos:
+    """
+    Almacén de documentos en disco para hidratar resultados de búsqueda sin tener el corpus
+    en memoria.
+
+    Cada campo de texto se guarda como un único blob UTF-8 (``<campo>.npy``, uint8) y un
+    arreglo de desplazamientos (``<campo>_offsets.npy``, n_docs + 1): el texto del documento
+    en la posición ``i`` es ``blob[offsets[i]:offsets[i+1]]``. Ambos se abren con
+    ``np.load(mmap_mode="r")``, así que leer k documentos solo toca sus páginas y la memoria
+    residente no crece con el tamaño del corpus.
+
+    Parámetros:
+    - directorio: directorio del almacén (con su manifest.json).
+    - mmap_mode: modo de np.load de los arreglos.
+    """
+
+    def __init__(self, directorio, mmap_mode="r"):
+        manifiesto = leer_manifiesto(directorio)
+        self.directorio = directorio
+        self.campos = manifiesto["campos"]
+        self.n_docs = manifiesto["n_docs"]
+        self.arreglos = cargar_arreglos(directorio, manifiesto["arreglos"], mmap_mode)
+
+    @staticmethod
+    def existe(directorio):
+        """
+        Indica si el directorio contiene un almacén de documentos.
+        """
+        return existe_indice(directorio)
+
+    @classmethod
+    def construir(cls, directorio, corpus_df, campos=None):
+        """
+        Escribe el almacén a partir de un DataFrame del corpus.
+
+        Parámetros:
+        - directorio: directorio del almacén (se crea si no existe).
+        - corpus_df: DataFrame con un documento por fila, en el orden de las posiciones del índice.
+        - campos: columnas a guardar (por defecto, todas las no numéricas).
+
+        Retorna:
+        - AlmacenDocumentos abierto sobre el directorio.
+        """
+        escritor = EscritorAlmacen(directorio, campos)
+        escritor.agregar(corpus_df)
+        return escritor.cerrar()
+
+    def __len__(self):
+        return self.n_docs
+
+    def texto(self, campo, posicion):
+        """
+        Retorna el valor de un campo de un documento. Solo se copia su tramo del blob.
+        """
+        offsets = self.arreglos[campo + "_offsets"]
+        return self.arreglos[campo][offsets[posicion]:offsets[posicion + 1]].tobytes().decode("utf-8")
+
+    def obtener(self, posiciones, campos=None):
+        """
+        Hidrata los documentos de las posiciones dadas.
+
+        Parámetros:
+        - posiciones: posiciones de documento en el índice, en el orden deseado.
+        - campos: campos a leer (por defecto, todos).
+
+        Retorna:
+        - DataFrame con una fila por posición (índice = posición) y una columna por campo.
+        """
+        posiciones = np.asarray(posiciones, dtype=np.int64)
+        campos = campos or self.campos
+        return pd.DataFrame({campo: [self.texto(campo, posicion) for posicion in posiciones] for campo in campos},
+                            index=posiciones, columns=campos)
+
+
+class EscritorAlmacen:
+    """
+    Escribe un almacén de documentos por lotes, sin tener el corpus completo en memoria
+    (mismo formato que AlmacenDocumentos.construir).
+
+    Parámetros:
+    - directorio: directorio del almacén (se crea si no existe).
+    - campos: columnas a guardar (por defecto, las no numéricas del primer lote).
+    """
+
+    def __init__(self, directorio, campos=None):
+        self.directorio = directorio
+        self.campos = campos
+        self.n_docs = 0
+        self._escritores = None
+        self._finales = None
+
+    def agregar(self, lote_df):
+        """
+        Agrega los documentos de un DataFrame, en orden, a continuación de los anteriores.
+        """
+        if self._escritores is None:
+            if self.campos is None:
+                self.campos = list(lote_df.select_dtypes(exclude=['number']).columns)
+            self._escritores = {}
+            for campo in self.campos:
+                self._escritores[campo] = EscritorArreglo(self.directorio, campo, np.uint8)
+                self._escritores[campo + "_offsets"] = EscritorArreglo(self.directorio, campo + "_offsets", np.int64)
+                self._escritores[campo + "_offsets"].agregar([0])
+            self._finales = dict.fromkeys(self.campos, 0)
+        for campo in self.campos:
+            textos = [("" if pd.isna(valor) else str(valor)).encode("utf-8") for valor in lote_df[campo].values]
+            offsets = self._finales[campo] + np.cumsum([len(texto) for texto in textos], dtype=np.int64)
+            self._escritores[campo].agregar(np.frombuffer(b"".join(textos), dtype=np.uint8))
+            self._escritores[campo + "_offsets"].agregar(offsets)
+            if len(offsets):
+                self._finales[campo] = int(offsets[-1])
+        self.n_docs += len(lote_df)
+
+    def cerrar(self):
+        """
+        Escribe los arreglos y el manifiesto del almacén.
+
+        Retorna:
+        - AlmacenDocumentos abierto sobre el directorio.
+        """
+        escritores = self._escritores or {}
+        escribir_manifiesto(self.directorio, {
+            "contenido": "documentos",
+            "n_docs": self.n_docs,
+            "campos": self.campos or [],
+            "arreglos": {nombre: escritor.cerrar() for nombre, escritor in escritores.items()},
+        })
+        return AlmacenDocumentos(self.directorio)
@@ -0,0 +1,75 @@
+"""
+Reescribe un índice columnar con las listas de posteo comprimidas por bloques (ver
+ir_models/posteos_comprimidos) y muestra el tamaño por término y la razón de compresión
+de cada modelo. Se ejecuta desde el directorio raíz del proyecto:
+
+    python -m busqueda_ir.tools.comprimir_indice [--origen indice] [--destino indice_comprimido] [--bits 8]
+
+BM25 se comprime sin pérdida (los puntajes no cambian); los pesos TF-IDF se cuantizan a
+``--bits`` bits por bloque, así que las similitudes pasan a ser aproximadas. Para servir
+el índice destino, se reemplaza ``indice/`` por ese directorio.
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+from ..ir_models.bm25.bm25 import Bm25
+from ..ir_models.indice_columnar import cargar_doc_ids, guardar_indice
+from ..ir_models.poda import TAM_BLOQUE
+from ..ir_models.posteos_comprimidos import reporte
+from ..ir_models.tfidf.tf_idf import Tfidf
+
+def comprimir(origen="indice", destino="indice_comprimido", bits=8, tam_bloque=TAM_BLOQUE, n_terminos=10):
+    """
+    Comprime los modelos del índice ``origen`` y los guarda en ``destino`` con la misma
+    tabla de ids y una copia del almacén de documentos.
+
+    Retorna:
+    - dict modelo -> reporte del tamaño (ver posteos_comprimidos.reporte). El tamaño
+      original cuenta los arreglos de las listas sin comprimir: docs y pesos (TF-IDF) o
+      docs, tfs y valores (BM25).
+    """
+    tfidf = Tfidf(modelName=os.path.join(origen, "tfidf"))
+    bm25 = Bm25(modelName=os.path.join(origen, "bm25"))
+    tfidf_comprimido = tfidf.comprimir(bits, tam_bloque)
+    bm25_comprimido = bm25.comprimir(tam_bloque)
+    guardar_indice(destino, {"tfidf": tfidf_comprimido, "bm25": bm25_comprimido}, cargar_doc_ids(origen))
+    documentos = os.path.join(origen, "documentos")
+    if os.path.isdir(documentos):
+        shutil.copytree(documentos, os.path.join(destino, "documentos"), dirs_exist_ok=True)
+
+    csc = tfidf.listas_terminos()
+    docs, tfs = bm25.indice.listas()
+    return {
+        "tfidf": reporte(tfidf_comprimido.comprimidas, csc.indices.nbytes + csc.data.nbytes,
+                         tfidf.tfidf_vectorizer.vocabulario.terminos, n_terminos),
+        "bm25": reporte(bm25_comprimido.indice.comprimidas, docs.nbytes + tfs.nbytes + bm25.indice.valores().nbytes,
+                        bm25.indice.vocabulario.terminos, n_terminos),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Comprime las listas de posteo de un índice columnar.")
+    parser.add_argument("--origen", default="indice", help="Directorio del índice a comprimir.")
+    parser.add_argument("--destino", default="indice_comprimido", help="Directorio del índice comprimido.")
+    parser.add_argument("--bits", type=int, default=8, help="Bits por peso TF-IDF cuantizado.")
+    parser.add_argument("--tam-bloque", type=int, default=TAM_BLOQUE, help="Entradas por bloque.")
+    parser.add_argument("--terminos", type=int, default=10, help="Términos más grandes a listar.")
+    parser.add_argument("--json", action="store_true", help="Imprimir el reporte completo en JSON.")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    reportes = comprimir(args.origen, args.destino, args.bits, args.tam_bloque, args.terminos)
+    if args.json:
+        print(json.dumps(reportes, indent=2, ensure_ascii=False))
+    else:
+        for modelo, datos in reportes.items():
+            print(f"{modelo}: {datos['bytes_original'] / 2**20:.1f} MB -> {datos['bytes'] / 2**20:.1f} MB "
+                  f"(x{datos['razon_compresion']:.2f}, {datos['bytes_por_entrada']:.2f} bytes por entrada, "
+                  f"{datos['bytes_por_termino_medio']:.1f} bytes por término en promedio)")
+            for termino in datos["terminos_mayores"]:
+                print(f"  {termino['termino']}: {termino['bytes']} bytes, {termino['entradas']} entradas")
+    print(f"Índice comprimido escrito en {args.destino} en {time.perf_counter() - inicio:.2f} s")
+
+if __name__ == "__main__":
+    main()
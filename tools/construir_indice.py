@@ -0,0 +1,374 @@
+"""
+Construye el índice columnar (TF-IDF, BM25, tabla de ids y almacén de documentos) a partir
+de un archivo JSONL o Parquet leído por lotes, para corpus que no caben en memoria. Se
+ejecuta desde el directorio raíz del proyecto:
+
+    python -m busqueda_ir.tools.construir_indice corpus.jsonl [--directorio indice] [--memoria-mb 512]
+
+Cada lote se preprocesa y sus listas de posteo se acumulan en un búfer; cuando el búfer
+supera el presupuesto de memoria se ordena por término y se escribe a disco como una
+corrida. Al final las corridas se fusionan directamente en los arreglos mapeados del
+índice y los pesos TF-IDF se calculan en una pasada más, por bloques del mismo tamaño.
+"""
+import argparse
+import os
+import re
+import shutil
+import time
+from contextlib import nullcontext
+import numpy as np
+import pandas as pd
+from .almacen_documentos import EscritorAlmacen
+from ..preprocesamiento.preprocesador import Preprocesador
+from ..ir_models.indice_columnar import EscritorArreglo, VocabularioOrdenado, cargar_arreglos, escribir_manifiesto, guardar_arreglos
+from ..ir_models.bm25.indice_bm25 import IndiceBm25
+
+# Estimaciones de memoria del búfer: por token (id de término, posición, clave y
+# temporales del ordenamiento) y por término distinto de la corrida (cadena + diccionario).
+BYTES_POR_TOKEN = 48
+BYTES_POR_TERMINO = 120
+
+def leer_lotes(ruta, tam_lote=10000, columnas=None):
+    """
+    Lee un archivo JSONL (un documento por línea) o Parquet por lotes.
+
+    Parámetros:
+    - ruta: archivo ``.jsonl``/``.json``/``.ndjson`` o ``.parquet`` (requiere pyarrow).
+    - tam_lote: documentos por lote.
+    - columnas: columnas a leer (por defecto, todas).
+
+    Retorna:
+    - Generador de DataFrames.
+    """
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension in (".jsonl", ".json", ".ndjson"):
+        # dtype=False conserva los ids como vienen (por ejemplo "007" no pasa a 7).
+        for lote in pd.read_json(ruta, lines=True, chunksize=tam_lote, dtype=False):
+            yield lote if columnas is None else lote[columnas]
+    elif extension == ".parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as error:
+            raise ImportError("Para leer Parquet por lotes se necesita pyarrow (pip install pyarrow)") from error
+        for lote in pq.ParquetFile(ruta).iter_batches(batch_size=tam_lote, columns=columnas):
+            yield lote.to_pandas()
+    else:
+        raise ValueError(f"Formato no soportado: {ruta} (se espera .jsonl o .parquet)")
+
+def _crear_arreglo(directorio, nombre, dtype, n):
+    """
+    Crea ``<nombre>.npy`` con n elementos y lo retorna mapeado para escribirlo por partes.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    ruta = os.path.join(directorio, nombre + ".npy")
+    if n == 0:
+        np.save(ruta, np.zeros(0, dtype=dtype))
+        return np.zeros(0, dtype=dtype)
+    return np.lib.format.open_memmap(ruta, mode="w+", dtype=dtype, shape=(n,))
+
+def _descripcion(arreglo):
+    return {"dtype": arreglo.dtype.str, "shape": list(arreglo.shape)}
+
+
+class ConstructorIndice:
+    """
+    Construye las listas de posteo de TF-IDF y BM25 de un corpus que llega por lotes,
+    con memoria acotada.
+
+    Los tokens de cada lote se agregan a un búfer (ids de término de la corrida y posición
+    del documento). Cuando el búfer supera ``memoria_mb`` se cuentan las frecuencias, se
+    ordenan por término y documento y se escriben como una corrida en
+    ``directorio/corridas/``. Al cerrar, las corridas se fusionan con una fusión de k vías
+    por bloques de términos (ver _fusionar_corridas) que escribe de forma secuencial en los
+    ``.npy`` mapeados del índice, y luego se calculan IDF, valores BM25, normas y pesos TF-IDF
+    recorriendo las listas por bloques. Además del búfer, solo quedan en memoria el
+    vocabulario y dos arreglos por documento (normalización BM25 y norma TF-IDF).
+
+    El resultado tiene el mismo formato y los mismos valores que ``Tfidf(corpus)`` +
+    ``Bm25(corpus)`` guardados con indice_columnar.guardar_indice. Como el texto
+    preprocesado son tokens alfabéticos separados por espacios, las frecuencias de TF-IDF
+    se toman de las mismas listas (solo los términos que cumplen ``token_pattern``).
+
+    Parámetros:
+    - directorio: directorio donde se escribe el índice.
+    - memoria_mb: presupuesto del búfer de posteos (y tamaño de los bloques al fusionar).
+    - k1, b, epsilon: parámetros de BM25Okapi.
+    - token_pattern: patrón de tokens de TfidfVectorizer.
+    """
+
+    def __init__(self, directorio, memoria_mb=512, k1=1.5, b=0.75, epsilon=0.25, token_pattern=r"(?u)\b\w\w+\b"):
+        self.directorio = directorio
+        self.dir_corridas = os.path.join(directorio, "corridas")
+        self.limite = int(memoria_mb * 2 ** 20)
+        self.tam_bloque = max(self.limite // BYTES_POR_TOKEN, 1)
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.token_pattern = token_pattern
+        self.n_docs = 0
+        self.corridas = []
+        self._doc_len = EscritorArreglo(os.path.join(directorio, "bm25"), "doc_len", np.int64)
+        self._doc_ids = EscritorArreglo(directorio, "doc_ids", str)
+        self._reiniciar_bufer()
+
+    def _reiniciar_bufer(self):
+        self._vocabulario = {}
+        self._terminos = []
+        self._posiciones = []
+        self._inicio = self.n_docs
+        self._tokens = 0
+
+    def memoria_bufer(self):
+        """
+        Memoria estimada del búfer actual, en bytes.
+        """
+        return self._tokens * BYTES_POR_TOKEN + len(self._vocabulario) * BYTES_POR_TERMINO
+
+    def agregar(self, doc_ids, textos):
+        """
+        Agrega un lote de documentos ya preprocesados (texto con tokens separados por espacios).
+        Si el búfer supera el presupuesto, se escribe una corrida.
+        """
+        listas = [texto.split() for texto in textos]
+        largos = np.fromiter((len(lista) for lista in listas), dtype=np.int64, count=len(listas))
+        vocabulario = self._vocabulario
+        ids = np.fromiter((vocabulario.setdefault(token, len(vocabulario)) for lista in listas for token in lista),
+                          dtype=np.int64, count=int(largos.sum()))
+        self._terminos.append(ids)
+        self._posiciones.append(np.repeat(np.arange(self.n_docs, self.n_docs + len(listas), dtype=np.int64), largos))
+        self._doc_len.agregar(largos)
+        self._doc_ids.agregar([str(doc_id) for doc_id in doc_ids])
+        self.n_docs += len(listas)
+        self._tokens += len(ids)
+        if self.memoria_bufer() > self.limite:
+            self.escribir_corrida()
+
+    def escribir_corrida(self):
+        """
+        Escribe el búfer como una corrida ordenada por término (en UTF-8) y documento.
+        """
+        if self.n_docs == self._inicio:
+            return
+        n = self.n_docs - self._inicio
+        terminos = np.array([termino.encode("utf-8") for termino in self._vocabulario], dtype=bytes)
+        orden = np.argsort(terminos)
+        rango = np.empty(len(terminos), dtype=np.int64)
+        rango[orden] = np.arange(len(terminos))
+        # Igual que en IndiceBm25.construir: cada par (término, documento) se codifica en un
+        # entero. Las partes del búfer se liberan a medida que se usan para no duplicarlo.
+        claves = rango[np.concatenate(self._terminos)]
+        self._terminos = []
+        claves *= n
+        posiciones = np.concatenate(self._posiciones)
+        self._posiciones = []
+        posiciones -= self._inicio
+        claves += posiciones
+        del posiciones
+        claves, tfs = np.unique(claves, return_counts=True)
+        indptr = np.zeros(len(terminos) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(claves // n, minlength=len(terminos)), out=indptr[1:])
+        ruta = os.path.join(self.dir_corridas, f"{len(self.corridas):05d}")
+        descripcion = guardar_arreglos(ruta, {"terminos": terminos[orden], "indptr": indptr,
+                                              "docs": claves % n + self._inicio, "tfs": tfs.astype(np.int32)})
+        self.corridas.append((ruta, descripcion))
+        self._reiniciar_bufer()
+
+    def _terminos_bloque(self, indptr, inicio, fin):
+        return np.searchsorted(indptr, np.arange(inicio, fin), side="right") - 1
+
+    def _fusionar_corridas(self, corridas, vocabulario, indptr, docs, tfs):
+        """
+        Fusión de k vías de las corridas, en orden de término: cada paso toma un rango de
+        términos con unas ``tam_bloque`` entradas, lee de cada corrida el tramo contiguo de
+        esos términos, los intercala en memoria y escribe el bloque a continuación del
+        anterior. Las corridas se leen y el índice se escribe de forma secuencial; como las
+        corridas cubren rangos de documentos consecutivos, dentro de cada término los
+        documentos quedan crecientes al tomar las corridas en orden.
+        """
+        # Ids globales de los términos de cada corrida (crecientes: ambos están ordenados).
+        globales = [np.searchsorted(vocabulario, corrida["terminos"]) for corrida in corridas]
+        cursores = [0] * len(corridas)
+        n_terminos = len(vocabulario)
+        desde = 0
+        while desde < n_terminos:
+            hasta = int(np.searchsorted(indptr, indptr[desde] + self.tam_bloque, side="right")) - 1
+            hasta = min(max(hasta, desde + 1), n_terminos)
+            base = int(indptr[desde])
+            bloque_docs = np.empty(int(indptr[hasta]) - base, dtype=np.int32)
+            bloque_tfs = np.empty(len(bloque_docs), dtype=np.int32)
+            llenado = indptr[desde:hasta] - base
+            for i, corrida in enumerate(corridas):
+                inicio = cursores[i]
+                fin = int(np.searchsorted(globales[i], hasta))
+                if fin > inicio:
+                    terminos = globales[i][inicio:fin] - desde
+                    punteros = np.asarray(corrida["indptr"][inicio:fin + 1])
+                    largos = np.diff(punteros)
+                    destino = np.repeat(llenado[terminos] - (punteros[:-1] - punteros[0]), largos) + np.arange(punteros[-1] - punteros[0])
+                    bloque_docs[destino] = corrida["docs"][punteros[0]:punteros[-1]]
+                    bloque_tfs[destino] = corrida["tfs"][punteros[0]:punteros[-1]]
+                    llenado[terminos] += largos
+                cursores[i] = fin
+            docs[base:base + len(bloque_docs)] = bloque_docs
+            tfs[base:base + len(bloque_tfs)] = bloque_tfs
+            desde = hasta
+
+    def cerrar(self):
+        """
+        Fusiona las corridas y escribe los modelos BM25 y TF-IDF, la tabla de ids y el
+        manifiesto raíz (al final, como guardar_indice). Borra las corridas.
+
+        Retorna:
+        - Manifiesto raíz escrito.
+        """
+        self.escribir_corrida()
+        arreglos_bm25 = {"doc_len": self._doc_len.cerrar()}
+        arreglos_raiz = {"doc_ids": self._doc_ids.cerrar()}
+        corridas = [cargar_arreglos(ruta, descripcion) for ruta, descripcion in self.corridas]
+        dir_bm25 = os.path.join(self.directorio, "bm25")
+        dir_tfidf = os.path.join(self.directorio, "tfidf")
+        n = self.n_docs
+
+        # Fusión: cada corrida copia sus listas a continuación de las de las corridas anteriores.
+        vocabulario = np.unique(np.concatenate([c["terminos"] for c in corridas])) if corridas else np.zeros(0, dtype="S1")
+        df = np.zeros(len(vocabulario), dtype=np.int64)
+        for corrida in corridas:
+            df[np.searchsorted(vocabulario, corrida["terminos"])] += np.diff(corrida["indptr"])
+        indptr = np.zeros(len(vocabulario) + 1, dtype=np.int64)
+        np.cumsum(df, out=indptr[1:])
+        nnz = int(indptr[-1])
+        docs = _crear_arreglo(dir_bm25, "docs", np.int32, nnz)
+        tfs = _crear_arreglo(dir_bm25, "tfs", np.int32, nnz)
+        self._fusionar_corridas(corridas, vocabulario, indptr, docs, tfs)
+        del corridas
+
+        # BM25: IDF y normalización como IndiceBm25; valores por bloques.
+        doc_len = np.load(os.path.join(dir_bm25, "doc_len.npy"), mmap_mode="r")
+        indice = IndiceBm25(VocabularioOrdenado(vocabulario), indptr, docs, tfs, doc_len, k1=self.k1, b=self.b, epsilon=self.epsilon)
+        valores = _crear_arreglo(dir_bm25, "valores", np.float64, nnz)
+        for inicio in range(0, nnz, self.tam_bloque):
+            fin = min(inicio + self.tam_bloque, nnz)
+            valores[inicio:fin] = tfs[inicio:fin] * (self.k1 + 1) / (tfs[inicio:fin] + indice.normas(docs[inicio:fin]))
+        arreglos_bm25.update(guardar_arreglos(dir_bm25, {"vocabulario": vocabulario, "indptr": indptr, "idf": indice.idf}))
+        arreglos_bm25.update({"docs": _descripcion(docs), "tfs": _descripcion(tfs), "valores": _descripcion(valores)})
+        parametros = {"k1": self.k1, "b": self.b, "epsilon": self.epsilon, "avgdl": float(indice.avgdl)}
+        manifiesto_bm25 = {"modelo": "bm25", "n_docs": n, "parametros": parametros, "arreglos": arreglos_bm25}
+
+        # TF-IDF: idf suavizado y norma L2 por documento, como TfidfVectorizer.
+        patron = re.compile(self.token_pattern)
+        es_tfidf = np.fromiter((patron.fullmatch(termino.decode("utf-8")) is not None for termino in vocabulario),
+                               dtype=bool, count=len(vocabulario))
+        idf = np.zeros(len(vocabulario))
+        idf[es_tfidf] = np.log((1 + n) / (1 + df[es_tfidf])) + 1
+        norma = np.zeros(n)
+        for inicio in range(0, nnz, self.tam_bloque):
+            fin = min(inicio + self.tam_bloque, nnz)
+            pesos = tfs[inicio:fin] * idf[self._terminos_bloque(indptr, inicio, fin)]
+            norma += np.bincount(docs[inicio:fin], pesos ** 2, minlength=n)
+        norma = np.sqrt(norma)
+        nnz_tfidf = int(df[es_tfidf].sum())
+        docs_tfidf = _crear_arreglo(dir_tfidf, "docs", np.int32, nnz_tfidf)
+        pesos_tfidf = _crear_arreglo(dir_tfidf, "pesos", np.float64, nnz_tfidf)
+        cursor = 0
+        for inicio in range(0, nnz, self.tam_bloque):
+            fin = min(inicio + self.tam_bloque, nnz)
+            terminos = self._terminos_bloque(indptr, inicio, fin)
+            mascara = es_tfidf[terminos]
+            docs_bloque = docs[inicio:fin][mascara]
+            docs_tfidf[cursor:cursor + len(docs_bloque)] = docs_bloque
+            pesos_tfidf[cursor:cursor + len(docs_bloque)] = tfs[inicio:fin][mascara] * idf[terminos[mascara]] / norma[docs_bloque]
+            cursor += len(docs_bloque)
+        # Mismo tipo de punteros que la matriz de scikit-learn, para que scipy no los copie al cargar.
+        indptr_tfidf = np.zeros(int(es_tfidf.sum()) + 1, dtype=np.int32 if nnz_tfidf < 2 ** 31 else np.int64)
+        np.cumsum(df[es_tfidf], out=indptr_tfidf[1:])
+        arreglos_tfidf = guardar_arreglos(dir_tfidf, {"vocabulario": vocabulario[es_tfidf], "idf": idf[es_tfidf], "indptr": indptr_tfidf})
+        arreglos_tfidf.update({"docs": _descripcion(docs_tfidf), "pesos": _descripcion(pesos_tfidf)})
+        manifiesto_tfidf = {"modelo": "tfidf", "n_docs": n, "parametros": {"token_pattern": self.token_pattern, "lowercase": True},
+                            "arreglos": arreglos_tfidf}
+
+        for arreglo in (docs, tfs, valores, docs_tfidf, pesos_tfidf):
+            if isinstance(arreglo, np.memmap):
+                arreglo.flush()
+        escribir_manifiesto(dir_bm25, manifiesto_bm25)
+        escribir_manifiesto(dir_tfidf, manifiesto_tfidf)
+        manifiesto = {"n_docs": n, "arreglos": arreglos_raiz, "modelos": {"tfidf": manifiesto_tfidf, "bm25": manifiesto_bm25}}
+        escribir_manifiesto(self.directorio, manifiesto)
+        shutil.rmtree(self.dir_corridas, ignore_errors=True)
+        return manifiesto
+
+
+def construir(entrada, directorio="indice", attr_corpus="text", attr_id="doc_id", lmt=True, tam_lote=10000,
+              memoria_mb=512, n_procesos=None, documentos=True):
+    """
+    Lee el corpus por lotes, lo preprocesa y escribe el índice columnar y el almacén de
+    documentos. Se construye en ``directorio + ".construyendo"`` y al terminar reemplaza
+    a ``directorio``, así que un índice existente sigue disponible mientras tanto.
+
+    Parámetros:
+    - entrada: archivo JSONL o Parquet con el corpus.
+    - directorio: directorio del índice.
+    - attr_corpus: columna de texto.
+    - attr_id: columna de id de documento (si falta, se numeran los documentos).
+    - lmt: lematización (True) o stemming (False).
+    - tam_lote: documentos por lote leído.
+    - memoria_mb: presupuesto del búfer de posteos. La memoria total es aproximadamente
+      este valor más un lote, el vocabulario y 16 bytes por documento.
+    - n_procesos: procesos para preprocesar los lotes, en un solo pool para toda la construcción
+      (ver Preprocesador.crear_pool).
+    - documentos: si es True, escribe también el almacén de documentos.
+    """
+    temporal = directorio + ".construyendo"
+    shutil.rmtree(temporal, ignore_errors=True)
+    preprocesador = Preprocesador(attr_id=attr_id)
+    preprocesador.cargar_cache("cache_normalizacion.joblib")
+    attr_preprocesado = preprocesador.attr_preprocesado
+    constructor = ConstructorIndice(temporal, memoria_mb)
+    almacen = EscritorAlmacen(os.path.join(temporal, "documentos")) if documentos else None
+
+    inicio = time.perf_counter()
+    # Un solo pool para todos los lotes: los trabajadores cargan NLTK y llenan su caché una vez.
+    paralelo = n_procesos is not None and n_procesos > 1
+    with preprocesador.crear_pool(n_procesos) if paralelo else nullcontext() as pool:
+        for lote in leer_lotes(entrada, tam_lote):
+            lote = lote.reset_index(drop=True)
+            if attr_id not in lote.columns:
+                lote[attr_id] = [str(i) for i in range(constructor.n_docs, constructor.n_docs + len(lote))]
+            preprocesador.preprocesar_corpus(lote, attr_corpus, attr_preprocesado, lmt, n_procesos, executor=pool)
+            constructor.agregar(lote[attr_id].values, lote[attr_preprocesado].values)
+            if almacen is not None:
+                almacen.agregar(lote)
+            segundos = time.perf_counter() - inicio
+            print(f"Indexados {constructor.n_docs} documentos ({constructor.n_docs / segundos:.1f} docs/s, "
+                  f"{len(constructor.corridas)} corridas en disco)")
+
+    if almacen is not None:
+        almacen.cerrar()
+    constructor.cerrar()
+    preprocesador.guardar_cache("cache_normalizacion.joblib")
+
+    if os.path.isdir(directorio):
+        shutil.rmtree(directorio + ".anterior", ignore_errors=True)
+        os.rename(directorio, directorio + ".anterior")
+    os.rename(temporal, directorio)
+    shutil.rmtree(directorio + ".anterior", ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Construye el índice columnar leyendo el corpus por lotes.")
+    parser.add_argument("entrada", help="Archivo JSONL o Parquet con el corpus.")
+    parser.add_argument("--directorio", default="indice", help="Directorio del índice a crear.")
+    parser.add_argument("--attr-corpus", default="text")
+    parser.add_argument("--attr-id", default="doc_id")
+    parser.add_argument("--stm", action="store_true", help="Usar stemming en lugar de lematización.")
+    parser.add_argument("--tam-lote", type=int, default=10000, help="Documentos por lote.")
+    parser.add_argument("--memoria-mb", type=int, default=512, help="Presupuesto del búfer de posteos.")
+    parser.add_argument("--procesos", type=int, default=None, help="Procesos para preprocesar cada lote.")
+    parser.add_argument("--sin-documentos", action="store_true", help="No escribir el almacén de documentos.")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    construir(args.entrada, args.directorio, args.attr_corpus, args.attr_id, not args.stm, args.tam_lote,
+              args.memoria_mb, args.procesos, not args.sin_documentos)
+    print(f"Índice columnar escrito en {args.directorio} en {time.perf_counter() - inicio:.2f} s")
+
+if __name__ == "__main__":
+    main()
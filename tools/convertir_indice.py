@@ -0,0 +1,45 @@
+"""
+Convierte los artefactos actuales (modelo_tfidf.joblib, matriz_modelo_tfidf.joblib,
+modelo_bm25.joblib y data/dataset.zip) al índice columnar y al almacén de documentos,
+sin reentrenar. Se ejecuta
+desde el directorio raíz del proyecto (donde están los .joblib):
+
+    python -m busqueda_ir.tools.convertir_indice [--directorio indice]
+"""
+import argparse
+import os
+import time
+from .herramienta import PklZipTools
+from .almacen_documentos import AlmacenDocumentos
+from ..ir_models.indice_columnar import guardar_indice
+from ..ir_models.tfidf.tf_idf import Tfidf
+from ..ir_models.bm25.bm25 import Bm25
+
+def convertir(directorio="indice", modelo_tfidf="modelo_tfidf", modelo_bm25="modelo_bm25", dataset="data/dataset.zip", attr_id="doc_id"):
+    """
+    Carga los modelos guardados con joblib y la tabla de ids del corpus y los escribe como
+    índice columnar en ``directorio``, junto con el almacén de documentos
+    (``directorio/documentos``) para hidratar resultados sin cargar el corpus.
+    """
+    corpus = PklZipTools.read_pkl_from_zip(dataset)
+    doc_ids = corpus[attr_id].values if attr_id in corpus.columns else [str(i) for i in range(len(corpus))]
+    guardar_indice(directorio, {"tfidf": Tfidf(modelName=modelo_tfidf), "bm25": Bm25(modelName=modelo_bm25)}, doc_ids)
+    if attr_id not in corpus.columns:
+        corpus[attr_id] = doc_ids
+    AlmacenDocumentos.construir(os.path.join(directorio, "documentos"), corpus)
+
+def main():
+    parser = argparse.ArgumentParser(description="Convierte los modelos joblib al índice columnar.")
+    parser.add_argument("--directorio", default="indice", help="Directorio del índice a crear.")
+    parser.add_argument("--modelo-tfidf", default="modelo_tfidf")
+    parser.add_argument("--modelo-bm25", default="modelo_bm25")
+    parser.add_argument("--dataset", default="data/dataset.zip")
+    parser.add_argument("--attr-id", default="doc_id")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    convertir(args.directorio, args.modelo_tfidf, args.modelo_bm25, args.dataset, args.attr_id)
+    print(f"Índice columnar escrito en {args.directorio} en {time.perf_counter() - inicio:.2f} s")
+
+if __name__ == "__main__":
+    main()